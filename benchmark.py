@@ -0,0 +1,451 @@
+"""
+Benchmark suite for the TLF pipeline scripts
+
+Generates deterministic synthetic inputs (MOSAIC CSV, people_management and
+tfl_status workbooks), times each tool on them and writes the timings as
+JSON. With --baseline the run is compared against a stored result and
+scenarios slower than the tolerance are reported as regressions.
+
+Usage:
+    python benchmark.py [--outputs 500] [--repeat 3] [--json results.json]
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from mosaic_convert import mosaic_convert
+from generate_batch_xml import XMLGenerator, DEFAULT_HEADER, DEFAULT_FILE_LOCATION
+from fill_tlf_template import fill_tlf_template
+from fill_tlf_status import fill_tlf_status, QC_STATUS_COL
+from extract_programs import analyze_programs, write_run_scripts
+
+
+DEFAULT_RESULTS_PATH = 'benchmark_results.json'
+
+# A scenario is a regression when its median is this much slower than the baseline
+DEFAULT_TOLERANCE = 0.20
+
+# (sect_num, sect_ttl, title4 output kind)
+SECTIONS = [
+    ('14.1', 'Study Population', 'Table'),
+    ('14.2', 'Efficacy', 'Table'),
+    ('14.2', 'Efficacy', 'Figure'),
+    ('14.3', 'Safety', 'Table'),
+    ('16.2', 'Subject Data Listings', 'Appendix'),
+]
+
+# Parms every output has; the rest of parms_per_output are footnotes
+BASE_PARMS = ['outfile', 'outtype', 'azsolid', 'tocnumber', 'title1', 'title2', 'title4', 'title5']
+MAX_FOOTNOTES = 9
+
+# Outputs sharing one program (extract_programs groups tocnumbers by program)
+OUTPUTS_PER_PROGRAM = 4
+
+# Non-latin1 characters inserted into titles and footnotes
+NON_LATIN1_CHARS = ['≥', '≤', '–', '’', 'μ', '中']
+
+PEOPLE_HEADERS = ['Section # ', 'Section Title', 'Output Type (Table, Listing, Figure)', 'Output # ',
+                  'Title', 'Standard Template Reference', 'Program Name', 'Output Name',
+                  'Programmer', 'QC Program', 'QC Programmer', QC_STATUS_COL]
+
+
+def output_keys(outputs):
+    """(program, suffix) of each synthetic output, shared by all generators"""
+    return [(f"t_prog{(number - 1) // OUTPUTS_PER_PROGRAM + 1}", f"s{number}")
+            for number in range(1, outputs + 1)]
+
+
+def _with_non_latin1(rng, text, rate):
+    """Insert one non-latin1 character into text with probability rate"""
+    if rng.random() >= rate:
+        return text
+    position = rng.randrange(len(text) + 1)
+    return text[:position] + rng.choice(NON_LATIN1_CHARS) + text[position:]
+
+
+def generate_mosaic_csv(path, outputs=500, parms_per_output=14, non_latin1_rate=0.01,
+                        duplicate_rate=0.0, seed=0):
+    """
+    Write a synthetic TiFo/MOSAIC CSV export
+
+    Parameters:
+    -----------
+    path : str
+        CSV file to write (UTF-8)
+    outputs : int
+        Number of tables/listings/figures
+    parms_per_output : int
+        Parm rows per output: the 8 base parms plus up to 9 footnotes
+    non_latin1_rate : float
+        Probability that a title or footnote value contains a non-latin1 character
+    duplicate_rate : float
+        Probability that an output reuses an earlier PROGRAM+SUFFIX
+        (tocnumbers stay unique, duplicates of those abort the conversion)
+    seed : int
+        Random seed; the same arguments always produce the same file
+
+    Returns:
+    --------
+    int : number of data rows written
+    """
+    rng = random.Random(seed)
+    n_footnotes = max(0, min(parms_per_output - len(BASE_PARMS), MAX_FOOTNOTES))
+    keys = output_keys(outputs)
+
+    rows = []
+    for number, (program, suffix) in enumerate(keys, start=1):
+        if number > 1 and rng.random() < duplicate_rate:
+            program, suffix = keys[rng.randrange(number - 1)]
+        sect_num, sect_ttl, kind = SECTIONS[(number - 1) % len(SECTIONS)]
+        tocnumber = f"{sect_num}.{number}"
+        values = [
+            ('outfile', f"{program}_{suffix}"),
+            ('outtype', 'rtf'),
+            ('azsolid', f"AZTONC{number % 97:04d}"),
+            ('tocnumber', tocnumber),
+            ('title1', "j=L 'AstraZeneca' j=R 'Page x of y' "),
+            ('title2', "j=L 'Study number D0000C00001 Synthetic Benchmark, <<Data cut-off ddmmmyyyy>>' "),
+            ('title4', f"j=C '{kind} {tocnumber}' "),
+            ('title5', f"j=C '{_with_non_latin1(rng, f'Synthetic output {number} by treatment arm', non_latin1_rate)}' "),
+        ]
+        for footnote in range(1, n_footnotes + 1):
+            text = _with_non_latin1(rng, f"[{footnote}] Footnote {footnote} of output {number}.", non_latin1_rate)
+            values.append((f"footnote{footnote}", f'j=L "{text}" '))
+        rows.extend((sect_num, sect_ttl, program, suffix, parm, value) for parm, value in values)
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['sect_num', 'sect_ttl', 'program', 'suffix', 'parm', 'value'])
+        writer.writerows(rows)
+    return len(rows)
+
+
+def generate_people_workbook(path, outputs=500, match_rate=0.9, seed=0):
+    """
+    Write a synthetic people_management workbook (Cover and TLF sheets)
+
+    The TLF sheet has a title row, the header row (row 2) and one row per
+    output. Rows not matched by Output Name keep their Program Name, so the
+    fallback match tier of fill_tlf_template is exercised too.
+
+    Parameters:
+    -----------
+    path : str
+        Workbook to write
+    outputs : int
+        Number of tracker rows
+    match_rate : float
+        Probability that a row's Output Name matches the MOSAIC output
+    seed : int
+        Random seed
+    """
+    rng = random.Random(seed)
+    wb = Workbook()
+    cover = wb.active
+    cover.title = 'Cover'
+    cover['A1'] = 'Synthetic people_management tracker for benchmarking'
+
+    ws = wb.create_sheet('TLF')
+    ws.append(['TLF Tracker'])
+    ws.append(PEOPLE_HEADERS)
+    for cell in ws[2]:
+        cell.font = Font(bold=True)
+
+    for number, (program, suffix) in enumerate(output_keys(outputs), start=1):
+        sect_num, sect_ttl, kind = SECTIONS[(number - 1) % len(SECTIONS)]
+        output_name = f"{program}_{suffix}" if rng.random() < match_rate else f"{program}_old{number}"
+        ws.append([sect_num, sect_ttl, kind, f"{sect_num}.{number}", f"Synthetic output {number}",
+                   f"AZTONC{number % 97:04d}", program, output_name,
+                   f"dev{number % 7}", f"q_{program}", f"qc{number % 5}", 'Not Started'])
+    wb.save(path)
+
+
+def generate_status_workbook(path, outputs=500, coverage=0.8, mismatch_rate=0.1, seed=0):
+    """
+    Write a synthetic tfl_status workbook (Overview sheet)
+
+    Parameters:
+    -----------
+    path : str
+        Workbook to write
+    outputs : int
+        Number of outputs in the study
+    coverage : float
+        Probability that an output has a comparison result
+    mismatch_rate : float
+        Probability that a comparison result is Mismatch
+    seed : int
+        Random seed
+    """
+    rng = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Overview'
+    ws.append(['Dataset', 'Comparison Status'])
+    for program, suffix in output_keys(outputs):
+        if rng.random() < coverage:
+            ws.append([f"{program}_{suffix}", 'Mismatch' if rng.random() < mismatch_rate else 'Match'])
+    wb.save(path)
+
+
+def prepare_inputs(work_dir, config):
+    """
+    Generate all benchmark inputs in work_dir
+
+    The MOSAIC Index workbook used by the downstream scenarios is converted
+    once here, so every scenario can run on its own.
+
+    Returns:
+    --------
+    dict : input name -> path
+    """
+    inputs = {
+        'csv': os.path.join(work_dir, 'bench_mosaic.csv'),
+        'people': os.path.join(work_dir, 'bench_people_management.xlsx'),
+        'status': os.path.join(work_dir, 'bench_tfl_status.xlsx'),
+        'index': os.path.join(work_dir, 'bench_MOSAIC_CONVERT.xlsx'),
+    }
+    generate_mosaic_csv(inputs['csv'], config['outputs'], config['parms_per_output'],
+                        config['non_latin1_rate'], config['duplicate_rate'], config['seed'])
+    generate_people_workbook(inputs['people'], config['outputs'], seed=config['seed'])
+    generate_status_workbook(inputs['status'], config['outputs'], seed=config['seed'])
+    with contextlib.redirect_stdout(io.StringIO()):
+        mosaic_convert(inputs['csv'], inputs['index'])
+    return inputs
+
+
+def run_mosaic_convert(inputs, out_dir):
+    mosaic_convert(inputs['csv'], os.path.join(out_dir, 'mosaic_convert.xlsx'))
+
+
+def run_generate_xml(inputs, out_dir):
+    # load_excel + generate_xml, as one generate_batch_xml run
+    generator = XMLGenerator(non_latin1_action='continue')
+    generator.load_excel(inputs['index'])
+    generator.generate_xml(DEFAULT_HEADER, DEFAULT_FILE_LOCATION,
+                           os.path.join(out_dir, 'batch.xml'), 'benchmark')
+
+
+def run_fill_tlf_template(inputs, out_dir):
+    if not fill_tlf_template(inputs['index'], inputs['people'], os.path.join(out_dir, 'people_filled.xlsx')):
+        raise RuntimeError("fill_tlf_template failed")
+
+
+def run_fill_tlf_status(inputs, out_dir):
+    if not fill_tlf_status(inputs['people'], inputs['status'], os.path.join(out_dir, 'people_status.xlsx')):
+        raise RuntimeError("fill_tlf_status failed")
+
+
+def run_extract_programs(inputs, out_dir):
+    program_stats = analyze_programs(inputs['index'])
+    if program_stats is None:
+        raise RuntimeError("analyze_programs failed")
+    if not write_run_scripts(program_stats, os.path.join(out_dir, 'run_all_pgm.txt'), n_scripts=4):
+        raise RuntimeError("write_run_scripts failed")
+
+
+SCENARIOS = OrderedDict([
+    ('mosaic_convert', run_mosaic_convert),
+    ('generate_xml', run_generate_xml),
+    ('fill_tlf_template', run_fill_tlf_template),
+    ('fill_tlf_status', run_fill_tlf_status),
+    ('extract_programs', run_extract_programs),
+])
+
+
+def time_scenario(scenario, inputs, out_dir, repeat):
+    """
+    Run one scenario repeat times with its output captured
+
+    Returns:
+    --------
+    dict : 'runs' (seconds), 'min', 'median' and 'mean'
+    """
+    runs = []
+    for _ in range(repeat):
+        captured = io.StringIO()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(captured):
+                scenario(inputs, out_dir)
+        except Exception:
+            sys.stdout.write(captured.getvalue()[-2000:])
+            raise
+        runs.append(time.perf_counter() - start)
+    return {
+        'runs': [round(seconds, 6) for seconds in runs],
+        'min': round(min(runs), 6),
+        'median': round(statistics.median(runs), 6),
+        'mean': round(statistics.mean(runs), 6),
+    }
+
+
+def run_benchmarks(config, scenario_names=None, work_dir=None):
+    """
+    Generate the inputs and time the selected scenarios
+
+    Parameters:
+    -----------
+    config : dict
+        outputs, parms_per_output, non_latin1_rate, duplicate_rate, seed, repeat
+    scenario_names : list, optional
+        Scenarios to run (default: all of SCENARIOS)
+    work_dir : str, optional
+        Folder for inputs and outputs (default: a temporary folder)
+
+    Returns:
+    --------
+    dict : JSON-serializable results
+    """
+    scenario_names = scenario_names or list(SCENARIOS)
+    with contextlib.ExitStack() as stack:
+        if work_dir is None:
+            work_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='tlf_bench_'))
+        os.makedirs(work_dir, exist_ok=True)
+
+        print(f"[1] Generating inputs ({config['outputs']} outputs) in {work_dir}...")
+        inputs = prepare_inputs(work_dir, config)
+
+        print(f"[2] Timing {len(scenario_names)} scenario(s), {config['repeat']} run(s) each...")
+        scenarios = OrderedDict()
+        for name in scenario_names:
+            scenarios[name] = time_scenario(SCENARIOS[name], inputs, work_dir, config['repeat'])
+            print(f"  - {name:20s} median {scenarios[name]['median']:8.3f}s")
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'openpyxl': openpyxl.__version__,
+        },
+        'config': config,
+        'scenarios': scenarios,
+    }
+
+
+def compare_results(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare scenario medians against a baseline result
+
+    Returns:
+    --------
+    list : (scenario, baseline median, current median, ratio, status) with
+        status 'SLOWER' (regression), 'FASTER', 'OK' or 'NEW'
+    """
+    rows = []
+    for name, timing in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            rows.append((name, None, timing['median'], None, 'NEW'))
+            continue
+        ratio = timing['median'] / base['median'] if base['median'] > 0 else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'SLOWER'
+        elif ratio < 1 - tolerance:
+            status = 'FASTER'
+        else:
+            status = 'OK'
+        rows.append((name, base['median'], timing['median'], ratio, status))
+    return rows
+
+
+def print_comparison(rows, current, baseline):
+    """Print the baseline comparison table"""
+    # Run count only affects the statistics; sizes and rates must match
+    sizes = {key: value for key, value in current['config'].items() if key != 'repeat'}
+    base_sizes = {key: value for key, value in baseline.get('config', {}).items() if key != 'repeat'}
+    if sizes != base_sizes:
+        print("WARN: Benchmark configuration differs from the baseline, timings are not comparable")
+    print(f"\n{'Scenario':20s} {'Baseline':>10s} {'Current':>10s} {'Ratio':>7s}  Status")
+    print("-" * 60)
+    for name, base, cur, ratio, status in rows:
+        base_text = '-' if base is None else f"{base:.3f}s"
+        ratio_text = '-' if ratio is None else f"{ratio:.2f}x"
+        print(f"{name:20s} {base_text:>10s} {cur:>9.3f}s {ratio_text:>7s}  {status}")
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark the TLF pipeline scripts on synthetic data")
+    parser.add_argument('--outputs', type=int, default=500, help="Tables/listings/figures (default: 500)")
+    parser.add_argument('--parms', type=int, default=14, help="Parm rows per output (default: 14)")
+    parser.add_argument('--non-latin1', type=float, default=0.01,
+                        help="Share of titles/footnotes with a non-latin1 character (default: 0.01)")
+    parser.add_argument('--duplicates', type=float, default=0.0,
+                        help="Share of outputs reusing an earlier PROGRAM+SUFFIX (default: 0)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario (default: 3)")
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument('--work-dir', help="Keep generated inputs and outputs in this folder")
+    parser.add_argument('--json', default=DEFAULT_RESULTS_PATH, dest='json_path',
+                        help=f"Results file (default: {DEFAULT_RESULTS_PATH})")
+    parser.add_argument('--baseline', help="Baseline results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before a scenario is a regression (default: 0.2)")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Also write the results as a new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Run the benchmark suite
+
+    Returns:
+    --------
+    int : exit code (1 when a scenario regressed against the baseline)
+    """
+    args = parse_args(argv)
+    config = {
+        'outputs': args.outputs,
+        'parms_per_output': args.parms,
+        'non_latin1_rate': args.non_latin1,
+        'duplicate_rate': args.duplicates,
+        'seed': args.seed,
+        'repeat': args.repeat,
+    }
+    results = run_benchmarks(config, args.scenario, args.work_dir)
+
+    for path in filter(None, [args.json_path, args.save_baseline]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"OK: Results written to {path}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare_results(results, baseline, args.tolerance)
+    print_comparison(rows, results, baseline)
+    regressions = [row[0] for row in rows if row[4] == 'SLOWER']
+    if regressions:
+        print(f"\nWARN: {len(regressions)} scenario(s) slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\nOK: No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
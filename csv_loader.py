@@ -0,0 +1,134 @@
+"""
+Shared CSV loader with one-read encoding detection
+
+Reads the file bytes once (memory-mapped), picks the encoding from the BOM,
+a strict-decode probe on a bounded sample and a strict decode of the whole
+buffer, then parses the decoded text from memory. Replaces the pattern of
+calling pd.read_csv once per candidate encoding, which re-parses the whole
+file each time a late byte fails to decode.
+Used by generate_batch_xml.py and mosaic_convert.py.
+"""
+import codecs
+import io
+import mmap
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+
+# Tried in order when there is no BOM; latin1 decodes any byte sequence
+CANDIDATE_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'latin1']
+
+# Bytes probed before decoding the whole buffer
+SAMPLE_SIZE = 64 * 1024
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+CsvLoadInfo = namedtuple('CsvLoadInfo', ['encoding', 'method', 'size', 'detect_seconds', 'parse_seconds'])
+
+
+def _read_buffer(file_path):
+    """Return the file content as a read-only buffer (mmap, or bytes for empty files)"""
+    with open(file_path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return f.read()
+
+
+def _probe_sample(buffer, encoding, sample_size=SAMPLE_SIZE):
+    """Strict-decode the first sample_size bytes, tolerating a cut multi-byte character"""
+    decoder = codecs.getincrementaldecoder(encoding)('strict')
+    try:
+        decoder.decode(buffer[:sample_size], final=len(buffer) <= sample_size)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_encoding(buffer, candidates=CANDIDATE_ENCODINGS, sample_size=SAMPLE_SIZE):
+    """
+    Detect the encoding of a byte buffer and decode it
+
+    Parameters:
+    -----------
+    buffer : bytes-like
+        File content
+    candidates : list
+        Encodings tried in order when there is no BOM
+    sample_size : int
+        Bytes probed before a candidate is used on the whole buffer
+
+    Returns:
+    --------
+    (text, encoding, method) :
+        decoded text, the encoding used and how it was chosen
+        ('bom', 'sample' when the sample was the whole buffer, 'full')
+    """
+    head = buffer[:4]
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return str(buffer, encoding), encoding, 'bom'
+
+    for encoding in candidates:
+        if not _probe_sample(buffer, encoding, sample_size):
+            continue
+        try:
+            text = str(buffer, encoding)
+        except UnicodeDecodeError:
+            # Sample decoded but a later byte did not
+            continue
+        method = 'sample' if len(buffer) <= sample_size else 'full'
+        return text, encoding, method
+
+    raise ValueError("Unable to read CSV file with any supported encoding")
+
+
+def read_csv_sniffed(file_path, candidates=CANDIDATE_ENCODINGS, **read_csv_kwargs):
+    """
+    Read a CSV file with a single read and automatic encoding detection
+
+    Parameters:
+    -----------
+    file_path : str or Path
+        CSV file to read
+    candidates : list
+        Encodings tried in order when there is no BOM
+    **read_csv_kwargs :
+        Passed to pd.read_csv (encoding is chosen here and must not be given)
+
+    Returns:
+    --------
+    (df, info) :
+        parsed DataFrame and a CsvLoadInfo with the detected encoding,
+        detection method, file size in bytes and detection/parse timings
+    """
+    start = time.perf_counter()
+    buffer = _read_buffer(file_path)
+    try:
+        text, encoding, method = detect_encoding(buffer, candidates)
+        size = len(buffer)
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+    detect_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = pd.read_csv(io.StringIO(text), **read_csv_kwargs)
+    parse_seconds = time.perf_counter() - start
+
+    return df, CsvLoadInfo(encoding, method, size, detect_seconds, parse_seconds)
+
+
+def describe_load(info):
+    """One-line summary of a CsvLoadInfo for progress output"""
+    return (
+        f"{info.encoding} encoding (detected by {info.method} in {info.detect_seconds * 1000:.1f} ms, "
+        f"parsed in {info.parse_seconds * 1000:.1f} ms)"
+    )
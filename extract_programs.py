@@ -11,9 +11,78 @@ Features:
 
 import pandas as pd
 import os
+import re
+import sys
+import heapq
+import argparse
 import tkinter as tk
 from tkinter import filedialog
 
+from runtime_store import RuntimeStore, DEFAULT_DB_PATH
+import profiling
+
+
+STATS_COLUMNS = ['PROGRAM', 'tocnumber_count', 'tocnumber_list', 'order']
+
+APPEARANCE_ORDER_NOTE = "Programs ordered by first appearance in Excel file"
+LONGEST_ORDER_NOTE = "Programs ordered by estimated runtime, longest first"
+
+
+def natural_sort_key(text):
+    """
+    Sort key that orders embedded numbers numerically (14.2.2 before 14.2.10)
+    
+    Number and text parts are tagged so mixed values always compare.
+    """
+    return tuple(
+        (0, int(part), '') if part.isdigit() else (1, 0, part)
+        for part in re.split(r'(\d+)', text) if part
+    )
+
+
+def summarize_programs(df):
+    """
+    Per-PROGRAM tocnumber statistics from an Index frame in one groupby pass
+    
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        MOSAIC Index data with PROGRAM and tocnumber columns
+    
+    Returns:
+    --------
+    program_stats : pandas.DataFrame
+        One row per non-empty PROGRAM in first-appearance order, with
+        tocnumber_count (unique non-missing tocnumbers), tocnumber_list
+        (naturally sorted, comma separated) and order (0-based)
+    """
+    missing = [col for col in ['PROGRAM', 'tocnumber'] if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    
+    programs = df['PROGRAM']
+    data = df.loc[programs.notna() & (programs != ''), ['PROGRAM', 'tocnumber']]
+    
+    program_stats = pd.DataFrame({'PROGRAM': pd.unique(data['PROGRAM'])})
+    
+    # Unique tocnumbers per program, grouped once
+    toc_groups = (
+        data.dropna(subset=['tocnumber'])
+        .drop_duplicates()
+        .groupby('PROGRAM', sort=False)['tocnumber']
+        .agg(list)
+    )
+    toc_counts = toc_groups.map(len)
+    toc_lists = toc_groups.map(
+        lambda tocs: ', '.join(sorted((str(toc) for toc in tocs), key=natural_sort_key))
+    )
+    
+    program_stats['tocnumber_count'] = program_stats['PROGRAM'].map(toc_counts).fillna(0).astype(int)
+    program_stats['tocnumber_list'] = program_stats['PROGRAM'].map(toc_lists).fillna('')
+    program_stats['order'] = range(len(program_stats))
+    
+    return program_stats[STATS_COLUMNS]
+
 
 def analyze_programs(excel_file):
     """
@@ -50,38 +119,7 @@ def analyze_programs(excel_file):
         print("ERROR: tocnumber column not found")
         return None
     
-    # Count tocnumber for each PROGRAM
-    program_data = []
-    
-    # Use dictionary to maintain first occurrence order
-    seen_programs = {}
-    order_index = 0
-    
-    for program in df['PROGRAM']:
-        if pd.isna(program) or program == '':
-            continue
-        
-        if program not in seen_programs:
-            seen_programs[program] = order_index
-            order_index += 1
-    
-    # Process each program in first occurrence order
-    for program in seen_programs.keys():
-        # Get all tocnumbers corresponding to this program
-        toc_numbers = df[df['PROGRAM'] == program]['tocnumber'].dropna().unique()
-        toc_count = len(toc_numbers)
-        toc_list = ', '.join(sorted(str(t) for t in toc_numbers))
-        
-        program_data.append({
-            'PROGRAM': program,
-            'tocnumber_count': toc_count,
-            'tocnumber_list': toc_list,
-            'order': seen_programs[program]
-        })
-    
-    # Create DataFrame and sort by first occurrence order
-    program_stats = pd.DataFrame(program_data)
-    program_stats = program_stats.sort_values('order')
+    program_stats = summarize_programs(df)
     
     print(f"\nOK: Statistics complete")
     print(f"  - Total unique PROGRAM values: {len(program_stats)}")
@@ -90,7 +128,7 @@ def analyze_programs(excel_file):
     return program_stats
 
 
-def generate_sas_script(program_stats):
+def generate_sas_script(program_stats, header_notes=None, order_note=APPEARANCE_ORDER_NOTE):
     """
     Generate SAS run script format text
     
@@ -98,6 +136,10 @@ def generate_sas_script(program_stats):
     -----------
     program_stats : pandas.DataFrame
         Program statistical data
+    header_notes : list, optional
+        Extra comment lines for the header (e.g. split script number)
+    order_note : str
+        Comment describing the program order
         
     Returns:
     --------
@@ -108,7 +150,9 @@ def generate_sas_script(program_stats):
     
     # Add comment header
     script_lines.append("/* Generated SAS Program Execution Script */")
-    script_lines.append("/* Programs ordered by first appearance in Excel file */")
+    for note in header_notes or []:
+        script_lines.append(f"/* {note} */")
+    script_lines.append(f"/* {order_note} */")
     script_lines.append("")
     script_lines.append("/* Program Statistics: */")
     
@@ -175,6 +219,211 @@ def print_statistics(program_stats):
     print("=" * 80)
 
 
+def load_runtime_csv(runtime_file):
+    """
+    Read historical program runtimes
+    
+    Parameters:
+    -----------
+    runtime_file : str
+        CSV with a program column (PROGRAM/program/pgm) and a runtime column
+        in seconds (seconds/runtime/runtime_seconds)
+    
+    Returns:
+    --------
+    dict : program -> seconds (last row wins for repeated programs)
+    """
+    df = pd.read_csv(runtime_file)
+    columns = {col.strip().lower(): col for col in df.columns}
+    program_col = next((columns[c] for c in ['program', 'pgm'] if c in columns), None)
+    seconds_col = next((columns[c] for c in ['seconds', 'runtime', 'runtime_seconds'] if c in columns), None)
+    if program_col is None or seconds_col is None:
+        raise ValueError("Runtime CSV needs a PROGRAM and a seconds/runtime column")
+    
+    df = df[[program_col, seconds_col]].dropna()
+    seconds = pd.to_numeric(df[seconds_col], errors='coerce')
+    df = df[seconds.notna()]
+    return dict(zip(df[program_col].astype(str).str.strip(), seconds[seconds.notna()]))
+
+
+def estimate_weights(program_stats, runtimes=None):
+    """
+    Estimated cost of each program for load balancing
+    
+    Parameters:
+    -----------
+    program_stats : pandas.DataFrame
+        Output of summarize_programs
+    runtimes : dict, optional
+        program -> historical seconds. Programs without history are estimated
+        from the median seconds per table of the programs that have one
+    
+    Returns:
+    --------
+    (weights, unit) :
+        float Series aligned to program_stats and 'seconds' or 'tables'
+    """
+    tables = program_stats['tocnumber_count'].clip(lower=1).astype(float)
+    if not runtimes:
+        return tables, 'tables'
+    
+    known = program_stats['PROGRAM'].astype(str).map(runtimes)
+    has_history = known.notna()
+    per_table = (known[has_history] / tables[has_history]).median() if has_history.any() else 1.0
+    return known.where(has_history, tables * per_table).astype(float), 'seconds'
+
+
+def balance_programs(program_stats, n_scripts, weights):
+    """
+    Split programs into n_scripts groups with longest-processing-time-first packing
+    
+    Programs are taken heaviest first and each goes to the group with the
+    smallest estimated total so far.
+    
+    Parameters:
+    -----------
+    program_stats : pandas.DataFrame
+        Output of summarize_programs
+    n_scripts : int
+        Number of run scripts
+    weights : pandas.Series
+        Estimated cost per program, aligned to program_stats
+    
+    Returns:
+    --------
+    (groups, totals) :
+        list of program_stats subsets (first-appearance order kept inside
+        each group) and the estimated total of each group
+    """
+    n_scripts = max(1, min(n_scripts, len(program_stats)))
+    heap = [(0.0, script) for script in range(n_scripts)]
+    assignment = {}
+    
+    # Stable on ties: equal weights keep first-appearance order
+    for position in weights.sort_values(ascending=False, kind='stable').index:
+        total, script = heapq.heappop(heap)
+        assignment[position] = script
+        heapq.heappush(heap, (total + weights[position], script))
+    
+    script_of = pd.Series(assignment).reindex(program_stats.index)
+    groups = [program_stats[script_of == script] for script in range(n_scripts)]
+    totals = [float(weights[group.index].sum()) for group in groups]
+    return groups, totals
+
+
+def split_script_paths(output_file, n_scripts):
+    """run_all.txt -> run_all_1.txt ... run_all_N.txt (unchanged for a single script)"""
+    if n_scripts <= 1:
+        return [output_file]
+    base, ext = os.path.splitext(output_file)
+    return [f"{base}_{script}{ext}" for script in range(1, n_scripts + 1)]
+
+
+def print_balance_summary(paths, groups, totals, unit):
+    """
+    Print the estimated load of each run script
+    """
+    print("\n" + "=" * 80)
+    print("Run script load balance (longest processing time first)")
+    print("=" * 80)
+    print(f"{'Script':<40} {'Programs':>10} {'Tables':>10} {'Estimated ' + unit:>18}")
+    print("-" * 80)
+    for path, group, total in zip(paths, groups, totals):
+        print(f"{os.path.basename(path):<40} {len(group):>10} {int(group['tocnumber_count'].sum()):>10} {total:>18.1f}")
+    print("-" * 80)
+    print(f"Longest script: {max(totals):.1f} {unit} (total {sum(totals):.1f} {unit})")
+    print("=" * 80)
+
+
+def print_prediction(totals, weights, unit):
+    """
+    Print the predicted batch time: the slowest script, and the lower bound
+    set by the longest single program (critical path)
+    """
+    print(f"\nPredicted batch time: {max(totals):.1f} {unit}")
+    print(f"  - Critical path (longest single program): {weights.max():.1f} {unit}")
+    print(f"  - Ideal split: {sum(totals) / len(totals):.1f} {unit} per script")
+
+
+def write_run_scripts(program_stats, output_file, n_scripts=1, runtimes=None, order='appearance'):
+    """
+    Generate and save one run script, or n_scripts load-balanced scripts
+    
+    Parameters:
+    -----------
+    program_stats : pandas.DataFrame
+        Output of summarize_programs
+    output_file : str
+        Script path; split scripts get _1 ... _N suffixes
+    n_scripts : int
+        Number of parallel run scripts
+    runtimes : dict, optional
+        program -> historical seconds used as weights (default: table count)
+    order : str
+        'appearance' (first appearance in Excel) or 'longest' (estimated
+        runtime, longest first) inside each script
+    
+    Returns:
+    --------
+    list : saved script paths, or None if saving failed
+    """
+    weights, unit = estimate_weights(program_stats, runtimes)
+    order_note = APPEARANCE_ORDER_NOTE
+    if order == 'longest':
+        program_stats = program_stats.loc[weights.sort_values(ascending=False, kind='stable').index]
+        order_note = LONGEST_ORDER_NOTE
+    
+    if n_scripts <= 1:
+        script_lines = generate_sas_script(program_stats, order_note=order_note)
+        print(f"OK: Generated {len(script_lines)} lines of script")
+        if not save_script_file(script_lines, output_file):
+            return None
+        if unit == 'seconds':
+            print_prediction([weights.sum()], weights, unit)
+        return [output_file]
+    
+    groups, totals = balance_programs(program_stats, n_scripts, weights)
+    paths = split_script_paths(output_file, len(groups))
+    
+    for number, (path, group, total) in enumerate(zip(paths, groups, totals), start=1):
+        notes = [f"Run script {number} of {len(groups)}: estimated {total:.1f} {unit}"]
+        if not save_script_file(generate_sas_script(group, notes, order_note), path):
+            return None
+    
+    print_balance_summary(paths, groups, totals, unit)
+    print_prediction(totals, weights, unit)
+    return paths
+
+
+def load_runtimes(runtime_file=None, db_path=None, programs=None):
+    """
+    Historical runtimes from the runtime store and/or a runtime CSV
+    
+    Parameters:
+    -----------
+    runtime_file : str, optional
+        Runtime CSV; its values override the store
+    db_path : str, optional
+        Runtime store database; used only if the file exists
+    programs : iterable, optional
+        Programs to read from the store (default: all stored programs)
+    
+    Returns:
+    --------
+    dict : program -> seconds (empty if no history is available)
+    """
+    runtimes = {}
+    if db_path and os.path.exists(db_path):
+        with RuntimeStore(db_path) as store:
+            runtimes.update(store.estimates(programs=programs))
+        print(f"OK: Runtime history for {len(runtimes)} programs ({db_path})")
+    if runtime_file:
+        csv_runtimes = load_runtime_csv(runtime_file)
+        runtimes.update(csv_runtimes)
+        print(f"OK: Loaded runtimes for {len(csv_runtimes)} programs ({runtime_file})")
+    return runtimes
+
+
 def main():
     """Main function"""
     print("=" * 80)
@@ -210,10 +459,19 @@ def main():
     # Print statistics
     print_statistics(program_stats)
     
-    # Generate script
-    print("\n[3] Generating SAS run script...")
-    script_lines = generate_sas_script(program_stats)
-    print(f"OK: Generated {len(script_lines)} lines of script")
+    # Number of parallel run scripts
+    print("\n[3] Run script split...")
+    n_scripts = 1
+    answer = input("Number of parallel SAS sessions (press Enter for 1 script): ").strip()
+    if answer:
+        try:
+            n_scripts = max(1, int(answer))
+        except ValueError:
+            print(f"WARN: '{answer}' is not a number, generating 1 script")
+    runtime_file = None
+    if n_scripts > 1:
+        runtime_file = input("Historical runtime CSV (press Enter to use the runtime store or table count): ").strip().strip('"')
+    runtimes = load_runtimes(runtime_file or None, DEFAULT_DB_PATH, program_stats['PROGRAM'].astype(str))
     
     # Select output file
     print("\n[4] Select output file location...")
@@ -234,12 +492,15 @@ def main():
         print("WARN: No output file selected, exiting program")
         return
     
-    # Save file
-    if save_script_file(script_lines, output_file):
+    # Generate and save script(s)
+    print("\n[5] Generating SAS run script...")
+    paths = write_run_scripts(program_stats, output_file, n_scripts, runtimes)
+    if paths:
         print("\n" + "=" * 80)
         print("Complete!")
         print("=" * 80)
-        print(f"Output file: {output_file}")
+        for path in paths:
+            print(f"Output file: {path}")
         print(f"Total programs: {len(program_stats)}")
         print("=" * 80)
     else:
@@ -247,8 +508,59 @@ def main():
         exit(1)
 
 
+def parse_args(argv=None):
+    """Parse command line arguments for non-interactive mode"""
+    parser = argparse.ArgumentParser(
+        description="Extract SAS program list from a MOSAIC_CONVERT Excel file"
+    )
+    parser.add_argument('--input', required=True, help="MOSAIC_CONVERT Excel file (Index sheet)")
+    parser.add_argument('--output', help="Script file (default: run_all_pgm_generated.txt next to the input)")
+    parser.add_argument('--scripts', type=int, default=1,
+                        help="Split into N load-balanced run scripts (default: 1)")
+    parser.add_argument('--runtimes', help="Historical runtime CSV (program, seconds) used to balance scripts")
+    parser.add_argument('--runtime-db', default=DEFAULT_DB_PATH,
+                        help="Runtime store imported from SAS logs (see runtime_store.py)")
+    parser.add_argument('--no-history', action='store_true', help="Ignore the runtime store")
+    parser.add_argument('--order', choices=['appearance', 'longest'], default='appearance',
+                        help="Program order inside each script (default: appearance)")
+    profiling.add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def command_line_mode(argv):
+    """
+    Run without dialogs
+    
+    Returns:
+    --------
+    int : exit code
+    """
+    args = parse_args(argv)
+    output_file = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(args.input)), "run_all_pgm_generated.txt"
+    )
+    with profiling.profile_context(args, output_file):
+        return _run_command_line(args, output_file)
+
+
+def _run_command_line(args, output_file):
+    """Analyze the input and write the run script(s); returns the exit code"""
+    program_stats = analyze_programs(args.input)
+    if program_stats is None or len(program_stats) == 0:
+        print("ERROR: Analysis failed or no valid PROGRAM data found")
+        return 1
+    print_statistics(program_stats)
+    
+    runtimes = load_runtimes(args.runtimes, None if args.no_history else args.runtime_db,
+                             program_stats['PROGRAM'].astype(str))
+    paths = write_run_scripts(program_stats, output_file, args.scripts, runtimes, args.order)
+    return 0 if paths else 1
+
+
 if __name__ == "__main__":
     try:
+        if len(sys.argv) > 1:
+            sys.exit(command_line_mode(sys.argv[1:]))
         main()
     except Exception as e:
         print("\n" + "=" * 80)
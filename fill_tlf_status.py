@@ -11,6 +11,9 @@ This script will:
 6. Preserve all other columns and sheets without any changes
 7. Generate a new Excel file and save to user-specified location
 8. Display statistics (total count, Pass count, Fail count, empty count)
+
+Command line (no dialogs):
+    python fill_tlf_status.py --people <people_management.xlsx> --status <tfl_status.xlsx> --output <xlsx> [--stage-timing] [--profile]
 """
 
 import pandas as pd
@@ -22,8 +25,14 @@ import os
 import tkinter as tk
 from tkinter import filedialog
 import sys
+import argparse
 import time
 
+from xlsx_patch import XlsxColumnPatcher, ColumnPatchError
+import stage_timer
+from stage_timer import stage
+import profiling
+
 
 def select_file(title, file_types):
     """
@@ -81,8 +90,100 @@ def save_file(title, default_filename, file_types):
     return file_path if file_path else None
 
 
-def fill_tlf_status():
-    """Main program: Merge Comparison Status from TFL Status to QC Status column in People Management"""
+QC_STATUS_COL = 'QC Status (Not Started, Ongoing, QC Pending, Fail, Pass)'
+
+# tfl_status Comparison Status -> QC Status; other values are kept as they are
+COMPARISON_TO_QC = {'Match': 'Pass', 'Mismatch': 'Fail'}
+
+
+def merge_qc_status(people_df, status_df, qc_status_col=QC_STATUS_COL):
+    """
+    Map QC Status onto the TLF rows by Output Name == Dataset in one join
+    
+    Parameters:
+    -----------
+    people_df : pandas.DataFrame
+        TLF sheet data; must contain 'Output Name'
+    status_df : pandas.DataFrame
+        Overview sheet data with 'Dataset' and preprocessed 'QC Status'
+    qc_status_col : str
+        Column of people_df that receives the status (created if missing)
+    
+    Returns:
+    --------
+    (people_df, stats) :
+        people_df with qc_status_col replaced (object dtype, None where
+        unmatched) and a dict with 'mappings', 'total', 'matched', 'pass',
+        'fail' and 'empty' counts
+    """
+    # Dataset → QC Status; last row wins for duplicate datasets (same as dict(zip(...)))
+    lookup = status_df.drop_duplicates('Dataset', keep='last').set_index('Dataset')['QC Status']
+    
+    output_names = people_df['Output Name']
+    matched = output_names.notna() & output_names.isin(lookup.index)
+    qc_status = output_names.map(lookup).astype('object').where(matched, None)
+    people_df[qc_status_col] = qc_status
+    
+    # Pass/Fail/empty from one value count of the new column
+    counts = qc_status.value_counts(dropna=False)
+    stats = {
+        'mappings': len(lookup),
+        'total': len(people_df),
+        'matched': int(matched.sum()),
+        'pass': int(counts.get('Pass', 0)),
+        'fail': int(counts.get('Fail', 0)),
+        'empty': int(counts[counts.index.isna()].sum()),
+    }
+    return people_df, stats
+
+
+def read_sheet_headers(xlsx_path, sheet_name, header_row):
+    """
+    Read one header row with openpyxl (fallback when column patching is not available)
+    
+    Returns:
+    --------
+    dict : header -> 1-based column index
+    """
+    wb = load_workbook(xlsx_path, read_only=True)
+    try:
+        ws = wb[sheet_name]
+        headers = {}
+        for row in ws.iter_rows(min_row=header_row, max_row=header_row, values_only=True):
+            for col_idx, header in enumerate(row, start=1):
+                if header:
+                    headers[header] = col_idx
+        return headers
+    finally:
+        wb.close()
+
+
+def write_column_openpyxl(xlsx_path, output_path, sheet_name, col_idx, values, first_row):
+    """
+    Rewrite one column by loading and saving the full workbook with openpyxl
+    (fallback for worksheets XlsxColumnPatcher does not handle)
+    """
+    wb = load_workbook(xlsx_path)
+    ws = wb[sheet_name]
+    for row_idx, value in enumerate(values, start=first_row):
+        ws.cell(row=row_idx, column=col_idx).value = value
+    wb.save(output_path)
+
+
+@stage_timer.run('fill_tlf_status')
+def fill_tlf_status(people_file=None, status_file=None, output_file=None):
+    """
+    Main program: Merge Comparison Status from TFL Status to QC Status column in People Management
+    
+    Parameters:
+    -----------
+    people_file, status_file, output_file : str, optional
+        File paths; a file dialog is shown for each one not given
+    
+    Returns:
+    --------
+    bool : True on success
+    """
     
     print("=" * 80)
     print("TLF Status Filler - Fill TLF Status")
@@ -90,7 +191,7 @@ def fill_tlf_status():
     
     # Step 1: Select people_management file
     print("\n[1] Please select the modified people_management.xlsx file...")
-    people_file = select_file(
+    people_file = people_file or select_file(
         "Select people_management.xlsx file",
         [("Excel files", "*.xlsx"), ("All files", "*.*")]
     )
@@ -102,7 +203,7 @@ def fill_tlf_status():
     
     # Step 2: Select tfl_status file
     print("\n[2] Please select the tfl_status.xlsx file...")
-    status_file = select_file(
+    status_file = status_file or select_file(
         "Select tfl_status.xlsx file",
         [("Excel files", "*.xlsx"), ("All files", "*.*")]
     )
@@ -123,9 +224,10 @@ def fill_tlf_status():
             try:
                 # Read TLF sheet (header at row 2, index 1)
                 # Use data_only=True to ignore formulas, only read values
-                xl_people = pd.ExcelFile(people_file, engine='openpyxl')
-                people_df = pd.read_excel(xl_people, sheet_name='TLF', header=1)
-                xl_people.close()
+                with stage('read people_management'):
+                    xl_people = pd.ExcelFile(people_file, engine='openpyxl')
+                    people_df = pd.read_excel(xl_people, sheet_name='TLF', header=1)
+                    xl_people.close()
                 print(f"✓ Read {len(people_df)} rows of data")
                 break
             except PermissionError:
@@ -176,9 +278,10 @@ def fill_tlf_status():
         while retry_count < max_retries and status_df is None:
             try:
                 # Read Overview sheet
-                xl_status = pd.ExcelFile(status_file, engine='openpyxl')
-                status_df = pd.read_excel(xl_status, sheet_name='Overview')
-                xl_status.close()
+                with stage('read tfl_status'):
+                    xl_status = pd.ExcelFile(status_file, engine='openpyxl')
+                    status_df = pd.read_excel(xl_status, sheet_name='Overview')
+                    xl_status.close()
                 print(f"✓ Read {len(status_df)} rows of status data")
                 break
             except PermissionError:
@@ -231,10 +334,7 @@ def fill_tlf_status():
         return False
     
     # Preprocessing: Match→Pass, Mismatch→Fail
-    status_df['QC Status'] = status_df['Comparison Status'].replace({
-        'Match': 'Pass',
-        'Mismatch': 'Fail'
-    })
+    status_df['QC Status'] = status_df['Comparison Status'].replace(COMPARISON_TO_QC)
     
     match_count = (status_df['Comparison Status'] == 'Match').sum()
     mismatch_count = (status_df['Comparison Status'] == 'Mismatch').sum()
@@ -247,41 +347,24 @@ def fill_tlf_status():
         print("❌ Error: 'Output Name' column not found in TLF sheet of people_management file")
         return False
     
-    # Create Dataset→QC Status mapping dictionary
-    status_lookup = dict(zip(status_df['Dataset'], status_df['QC Status']))
-    
-    print(f"  - Found {len(status_lookup)} status mappings")
-    
     # Check if QC Status column exists, create if not
-    qc_status_col = 'QC Status (Not Started, Ongoing, QC Pending, Fail, Pass)'
+    qc_status_col = QC_STATUS_COL
     if qc_status_col not in people_df.columns:
-        people_df[qc_status_col] = None
         print(f"  - Created new column: {qc_status_col}")
     
-    # Convert QC Status column to object dtype to allow string values
-    people_df[qc_status_col] = people_df[qc_status_col].astype('object')
-    print(f"  - Converted QC Status column to object dtype")
-    
-    # Perform matching and merging
-    matched_count = 0
-    for idx in people_df.index:
-        output_name = people_df.loc[idx, 'Output Name']
-        if pd.notna(output_name) and output_name in status_lookup:
-            people_df.loc[idx, qc_status_col] = status_lookup[output_name]
-            matched_count += 1
-        else:
-            # Set unmatched rows to None
-            people_df.loc[idx, qc_status_col] = None
+    with stage('merge QC status'):
+        people_df, stats = merge_qc_status(people_df, status_df, qc_status_col)
+    print(f"  - Found {stats['mappings']} status mappings")
+    print(f"  ✓ Successfully matched {stats['matched']} rows")
     
-    print(f"  ✓ Successfully matched {matched_count} rows")
-    
-    # Step 7: Calculate QC Status statistics
+    # Step 7: QC Status statistics (computed during the merge)
     print("\n[7] Calculating QC Status statistics...")
     
-    total_count = len(people_df)
-    pass_count = (people_df[qc_status_col] == 'Pass').sum()
-    fail_count = (people_df[qc_status_col] == 'Fail').sum()
-    empty_count = people_df[qc_status_col].isna().sum()
+    total_count = stats['total']
+    matched_count = stats['matched']
+    pass_count = stats['pass']
+    fail_count = stats['fail']
+    empty_count = stats['empty']
     
     print(f"  - Total TLF count: {total_count}")
     print(f"  - Pass count: {pass_count}")
@@ -292,18 +375,15 @@ def fill_tlf_status():
     print("\n[8] Preparing output file...")
     
     try:
-        # Load workbook (preserve all sheets and formats)
-        wb = load_workbook(people_file)
-        ws_tlf = wb['TLF']
-        
-        # Get headers (row 2)
-        headers = {}
-        max_col = ws_tlf.max_column
-        
-        for col_idx in range(1, max_col + 1):
-            header = ws_tlf.cell(row=2, column=col_idx).value
-            if header:
-                headers[header] = col_idx
+        # Only the TLF sheet XML is rewritten; other sheets and styles are copied through
+        with stage('read headers'):
+            try:
+                patcher = XlsxColumnPatcher(people_file, 'TLF')
+                headers = patcher.headers(header_row=2)
+            except ColumnPatchError as e:
+                print(f"  ⚠️ Column patching not available ({e}), using full workbook update")
+                patcher = None
+                headers = read_sheet_headers(people_file, 'TLF', header_row=2)
         
         print(f"  - Found {len(headers)} column headers")
         
@@ -315,21 +395,13 @@ def fill_tlf_status():
             print(f"❌ Error: '{qc_status_col}' column not found in Excel")
             return False
         
-        # Update QC Status column values
-        print(f"  - Updating {len(people_df)} rows of QC Status data...")
-        
-        for data_row_idx, (_, row_data) in enumerate(people_df.iterrows(), start=3):
-            value = row_data[qc_status_col]
-            if pd.isna(value):
-                value = None
-            else:
-                # Ensure value is string type (if not None)
-                value = str(value) if value is not None else None
-            ws_tlf.cell(row=data_row_idx, column=qc_col_idx).value = value
+        # QC Status values as text, None for empty cells
+        qc_values = [None if pd.isna(value) else str(value) for value in people_df[qc_status_col]]
+        print(f"  - Updating {len(qc_values)} rows of QC Status data...")
         
         # Step 9: User selects save location
         print("\n[9] Please select output file save location...")
-        output_file = save_file(
+        output_file = output_file or save_file(
             "Save output file",
             "people_management_with_status.xlsx",
             [("Excel files", "*.xlsx"), ("All files", "*.*")]
@@ -341,8 +413,17 @@ def fill_tlf_status():
         
         # Save file
         print(f"  - Saving file to: {output_file}")
-        wb.save(output_file)
-        print(f"✓ File saved: {output_file}")
+        start_time = time.perf_counter()
+        with stage('write QC Status column'):
+            try:
+                if patcher is None:
+                    raise ColumnPatchError("patcher not available")
+                patcher.patch(output_file, qc_col_idx, qc_values, first_row=3)
+            except ColumnPatchError as e:
+                if patcher is not None:
+                    print(f"  ⚠️ Column patching failed ({e}), using full workbook update")
+                write_column_openpyxl(people_file, output_file, 'TLF', qc_col_idx, qc_values, first_row=3)
+        print(f"✓ File saved: {output_file} ({time.perf_counter() - start_time:.2f}s)")
         
     except Exception as e:
         print(f"❌ Failed to update Excel file: {e}")
@@ -367,8 +448,38 @@ def fill_tlf_status():
     return True
 
 
+def parse_args(argv=None):
+    """Parse command line arguments for non-interactive mode"""
+    parser = argparse.ArgumentParser(
+        description="Fill the QC Status column of people_management from tfl_status (command line mode)"
+    )
+    parser.add_argument('--people', required=True, help="people_management.xlsx (TLF sheet)")
+    parser.add_argument('--status', required=True, help="tfl_status.xlsx (Overview sheet)")
+    parser.add_argument('--output', required=True, help="Output Excel file")
+    stage_timer.add_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def command_line_mode(argv):
+    """
+    Run without dialogs
+    
+    Returns:
+    --------
+    int : exit code
+    """
+    args = parse_args(argv)
+    stage_timer.enable_from_args(args)
+    with profiling.profile_context(args, args.output):
+        success = fill_tlf_status(args.people, args.status, args.output)
+    return 0 if success else 1
+
+
 if __name__ == "__main__":
     try:
+        if len(sys.argv) > 1:
+            sys.exit(command_line_mode(sys.argv[1:]))
         success = fill_tlf_status()
         sys.exit(0 if success else 1)
     except Exception as e:
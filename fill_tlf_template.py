@@ -9,6 +9,9 @@ This script will:
 4. Preserve all sheets and columns from people_management
 5. Update merged data in corresponding sheet
 6. Generate new Excel file and save to user-specified location
+
+Command line (no dialogs):
+    python fill_tlf_template.py --mosaic <MOSAIC_CONVERT.xlsx> --people <people_management.xlsx> --output <xlsx> [--stage-timing] [--profile]
 """
 
 import pandas as pd
@@ -20,7 +23,14 @@ import os
 import tkinter as tk
 from tkinter import filedialog
 import sys
+import argparse
 import time
+from collections import OrderedDict
+from copy import copy
+
+import stage_timer
+from stage_timer import stage
+import profiling
 
 
 def select_file(title, file_types):
@@ -79,8 +89,229 @@ def save_file(title, default_filename, file_types):
     return file_path if file_path else None
 
 
-def fill_tlf_template():
-    """Main program: Merge MOSAIC data into people_management file"""
+# Key columns for the cascading people match, in priority order. Each tier only
+# fills rows no earlier tier matched; add e.g. 'Output # ' (tocnumber) as a third tier.
+MATCH_TIERS = ['Output Name', 'Program Name']
+
+# Columns copied from people_management for matched rows
+PEOPLE_COLUMNS = ['Programmer', 'QC Program', 'QC Programmer']
+
+
+def cascade_match(target_df, source_df, tiers, value_columns):
+    """
+    Cascading join: fill value_columns of target_df from source_df, tier by tier
+    
+    Parameters:
+    -----------
+    target_df : pandas.DataFrame
+        Rows to fill (MOSAIC data)
+    source_df : pandas.DataFrame
+        Lookup rows (people_management data); must contain value_columns
+    tiers : list
+        Key columns in priority order; a tier is a column name present in both
+        frames or a (target_column, source_column) tuple. Tiers whose key is
+        missing from either frame match nothing
+    value_columns : list
+        Columns taken from source_df
+    
+    Returns:
+    --------
+    (values, masks) :
+        DataFrame of value_columns aligned to target_df (empty where no tier
+        matched) and an OrderedDict of target key -> boolean Series marking
+        the rows each tier matched
+    
+    Notes:
+    ------
+    Within a tier, missing keys never match and the first source row wins
+    for duplicate keys (dropna + drop_duplicates(keep='first')).
+    """
+    values = pd.DataFrame(None, index=target_df.index, columns=value_columns, dtype=object)
+    matched = pd.Series(False, index=target_df.index)
+    masks = OrderedDict()
+    
+    for tier in tiers:
+        target_key, source_key = (tier, tier) if isinstance(tier, str) else tier
+        if target_key not in target_df.columns or source_key not in source_df.columns:
+            masks[target_key] = pd.Series(False, index=target_df.index)
+            continue
+        
+        lookup = (
+            source_df[[source_key] + value_columns]
+            .dropna(subset=[source_key])
+            .drop_duplicates(subset=[source_key], keep='first')
+            .set_index(source_key)
+        )
+        keys = target_df[target_key]
+        mask = ~matched & keys.notna() & keys.isin(lookup.index)
+        if mask.any():
+            values.loc[mask, value_columns] = lookup.reindex(keys[mask]).to_numpy()
+        
+        masks[target_key] = mask
+        matched |= mask
+    
+    return values, masks
+
+
+def rewrite_data_rows(ws, rows, first_row, row_fills=()):
+    """
+    Replace every row from first_row down with new rows in one pass
+    
+    The old data region is dropped with a single delete_rows instead of
+    clearing cell by cell; new rows are appended as whole tuples. Cells keep
+    the per-column formatting of the old first data row (without its fill).
+    
+    Parameters:
+    -----------
+    ws : openpyxl.worksheet.worksheet.Worksheet
+        Target sheet
+    rows : iterable
+        Row tuples of values in column order, starting at column 1
+    first_row : int
+        1-based Excel row of the first data row
+    row_fills : list
+        (fill, row_positions, col_indices) tuples; row_positions are 0-based
+        positions in rows, later entries win for the same cell
+    """
+    # Per-column formatting template from the current first data row
+    templates = {}
+    if ws.max_row >= first_row:
+        for cell in ws[first_row]:
+            if cell.has_style:
+                style = copy(cell._style)
+                style.fillId = 0
+                templates[cell.column] = style
+        ws.delete_rows(first_row, ws.max_row - first_row + 1)
+    
+    # row position -> {column: fill}
+    fills = {}
+    for fill, positions, columns in row_fills:
+        for position in positions:
+            fills.setdefault(position, {}).update(dict.fromkeys(columns, fill))
+    
+    for position, values in enumerate(rows):
+        ws.append(values)
+        if not templates and position not in fills:
+            continue
+        row_idx = first_row + position
+        for col_idx, style in templates.items():
+            ws.cell(row=row_idx, column=col_idx)._style = copy(style)
+        for col_idx, fill in fills.get(position, {}).items():
+            ws.cell(row=row_idx, column=col_idx).fill = fill
+
+
+# MOSAIC Index column -> people_management TLF column
+COLUMN_MAP = {
+    'Output Type (Table, Listing, Figure)': 'Output Type (Table, Listing, Figure)',
+    'tocnumber': 'Output # ',
+    'Title': 'Title',
+    'sect_num': 'Section # ',
+    'sect_ttl': 'Section Title',
+    'azsolid': 'Standard Template Reference',
+    'PROGRAM': 'Program Name',
+    'OUTFILE': 'Output Name'
+}
+
+# Highlight of the people columns: no tier matched / matched by a fallback tier
+UNMATCHED_FILL = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
+FALLBACK_FILL = PatternFill(start_color='C6EFCE', end_color='C6EFCE', fill_type='solid')
+
+
+def build_merge_frame(mosaic_df):
+    """
+    TLF rows from the MOSAIC Index data, with people_management column names
+    
+    Parameters:
+    -----------
+    mosaic_df : pandas.DataFrame
+        Index sheet data of a MOSAIC_CONVERT output
+    
+    Returns:
+    --------
+    pandas.DataFrame : one row per Index row, columns COLUMN_MAP values
+    """
+    merge_frame = pd.DataFrame()
+    for src_col, tgt_col in COLUMN_MAP.items():
+        if src_col in mosaic_df.columns:
+            merge_frame[tgt_col] = mosaic_df[src_col].values
+        else:
+            print(f"⚠️ Warning: Column {src_col} not found in source file")
+            merge_frame[tgt_col] = None
+    return merge_frame
+
+
+def match_people(merge_frame, people_df):
+    """
+    Fill PEOPLE_COLUMNS of merge_frame (in place) with the cascading match
+    
+    Returns:
+    --------
+    (tier_masks, unmatched_rows, fallback_rows) :
+        cascade_match masks and the row positions matched by no tier / by a
+        fallback tier
+    """
+    match_values, tier_masks = cascade_match(merge_frame, people_df, MATCH_TIERS, PEOPLE_COLUMNS)
+    for col_name in PEOPLE_COLUMNS:
+        merge_frame[col_name] = match_values[col_name]
+    
+    masks = list(tier_masks.values())
+    matched_any = np.logical_or.reduce([mask.to_numpy() for mask in masks])
+    matched_fallback = np.logical_or.reduce([mask.to_numpy() for mask in masks[1:]] or [np.zeros(len(merge_frame), dtype=bool)])
+    return tier_masks, np.flatnonzero(~matched_any).tolist(), np.flatnonzero(matched_fallback).tolist()
+
+
+def fill_target_sheet(ws_target, merge_frame, unmatched_rows, fallback_rows):
+    """
+    Replace the data rows (row 3 onwards) of the TLF sheet with merge_frame
+    
+    Columns of the sheet (headers in row 2) without data in merge_frame are
+    emptied; the people columns of unmatched / fallback rows are highlighted.
+    """
+    # Get headers (row 2)
+    headers = {}
+    for cell in ws_target[2]:
+        if cell.value:
+            headers[cell.value] = cell.column
+    
+    print(f"  - Found {len(headers)} column headers")
+    
+    # Row tuples in sheet column order; columns without MOSAIC data stay empty
+    last_col = max(headers.values(), default=0)
+    column_names = [None] * last_col
+    for col_name, col_idx in headers.items():
+        if col_name in merge_frame.columns:
+            column_names[col_idx - 1] = col_name
+    row_frame = merge_frame.reindex(columns=column_names).astype(object)
+    row_frame = row_frame.where(row_frame.notna(), None)
+    
+    # Highlight fills by row position
+    target_cols = [headers[col_name] for col_name in PEOPLE_COLUMNS if col_name in headers]
+    row_fills = [
+        (UNMATCHED_FILL, unmatched_rows, target_cols),
+        (FALLBACK_FILL, fallback_rows, target_cols),
+    ]
+    
+    # Replace data rows from row 3 onwards (preserve first two header rows)
+    print(f"  - Rewriting data rows in '{ws_target.title}' sheet (preserve headers)...")
+    print(f"  - Filling {len(row_frame)} rows of data and applying highlight colors...")
+    with stage('rewrite data rows'):
+        rewrite_data_rows(ws_target, row_frame.itertuples(index=False, name=None), 3, row_fills)
+
+
+@stage_timer.run('fill_tlf_template')
+def fill_tlf_template(mosaic_file=None, people_file=None, output_file=None):
+    """
+    Main program: Merge MOSAIC data into people_management file
+    
+    Parameters:
+    -----------
+    mosaic_file, people_file, output_file : str, optional
+        File paths; a file dialog is shown for each one not given
+    
+    Returns:
+    --------
+    bool : True on success
+    """
     
     print("=" * 80)
     print("TLF Template Filler - Fill TLF Template")
@@ -88,7 +319,7 @@ def fill_tlf_template():
     
     # Step 1: Select input file
     print("\n[1] Please select MOSAIC_CONVERT output Excel file...")
-    mosaic_file = select_file(
+    mosaic_file = mosaic_file or select_file(
         "Select MOSAIC_CONVERT Output Excel File",
         [("Excel files", "*.xlsx"), ("All files", "*.*")]
     )
@@ -99,7 +330,7 @@ def fill_tlf_template():
     print(f"✓ MOSAIC_CONVERT file: {mosaic_file}")
     
     print("\n[2] Please select people_management.xlsx file...")
-    people_file = select_file(
+    people_file = people_file or select_file(
         "Select people_management.xlsx",
         [("Excel files", "*.xlsx"), ("All files", "*.*")]
     )
@@ -118,7 +349,8 @@ def fill_tlf_template():
         
         while retry_count < max_retries and mosaic_df is None:
             try:
-                mosaic_df = pd.read_excel(mosaic_file, sheet_name='Index', engine='openpyxl')
+                with stage('read MOSAIC Index'):
+                    mosaic_df = pd.read_excel(mosaic_file, sheet_name='Index', engine='openpyxl')
                 print(f"✓ Read {len(mosaic_df)} rows of data")
                 break
             except PermissionError:
@@ -135,17 +367,18 @@ def fill_tlf_template():
     # Step 3: Read all sheets and structure from people_management file
     print("\n[4] Reading people_management file structure...")
     try:
-        # Get all sheet information
-        xls = pd.ExcelFile(people_file, engine='openpyxl')
-        sheet_names = xls.sheet_names
-        print(f"✓ Found {len(sheet_names)} sheets: {', '.join(sheet_names)}")
-        
-        # Read TLF sheet (for people data matching)
-        target_sheet = 'TLF' if 'TLF' in sheet_names else sheet_names[0]
-        print(f"✓ Will use '{target_sheet}' sheet for people data matching")
-        
-        # Read target sheet to get people data
-        people_df = pd.read_excel(people_file, sheet_name=target_sheet, header=1, engine='openpyxl')
+        with stage('read people_management'):
+            # Get all sheet information
+            xls = pd.ExcelFile(people_file, engine='openpyxl')
+            sheet_names = xls.sheet_names
+            print(f"✓ Found {len(sheet_names)} sheets: {', '.join(sheet_names)}")
+            
+            # Read TLF sheet (for people data matching)
+            target_sheet = 'TLF' if 'TLF' in sheet_names else sheet_names[0]
+            print(f"✓ Will use '{target_sheet}' sheet for people data matching")
+            
+            # Read target sheet to get people data
+            people_df = pd.read_excel(people_file, sheet_name=target_sheet, header=1, engine='openpyxl')
         print(f"  - '{target_sheet}' sheet: {len(people_df)} rows, {len(people_df.columns)} columns")
         
     except Exception as e:
@@ -155,156 +388,46 @@ def fill_tlf_template():
     # Step 4: Prepare MOSAIC data and perform three-tier matching
     print("\n[5] Processing data mapping and merging...")
     
-    # Column mapping: source_column(MOSAIC) -> target_column(people_file)
-    column_map = {
-        'Output Type (Table, Listing, Figure)': 'Output Type (Table, Listing, Figure)',
-        'tocnumber': 'Output # ',
-        'Title': 'Title',
-        'sect_num': 'Section # ',
-        'sect_ttl': 'Section Title',
-        'azsolid': 'Standard Template Reference',
-        'PROGRAM': 'Program Name',
-        'OUTFILE': 'Output Name'
-    }
-    
-    # Build temporary dataframe for merging
-    mosaic_merge_data = pd.DataFrame()
-    for src_col, tgt_col in column_map.items():
-        if src_col in mosaic_df.columns:
-            mosaic_merge_data[tgt_col] = mosaic_df[src_col].values
-        else:
-            print(f"⚠️ Warning: Column {src_col} not found in source file")
-            mosaic_merge_data[tgt_col] = None
+    mosaic_merge_data = build_merge_frame(mosaic_df)
     
     # Step 5: Merge people_management data - three-tier cascading match
     print("\n[6] Merging people data (three-tier cascading match)...")
     
-    # Initialize tracking columns
-    mosaic_merge_data['_tier1_matched'] = False
-    mosaic_merge_data['_tier2_matched'] = False
-    mosaic_merge_data['Programmer'] = None
-    mosaic_merge_data['QC Program'] = None
-    mosaic_merge_data['QC Programmer'] = None
-    
-    # ===== First priority: Match using Output Name =====
-    if 'Output Name' in mosaic_merge_data.columns and 'Output Name' in people_df.columns:
-        print("  [Step 1] Using Output Name for first priority matching...")
-        
-        people_by_outname = people_df[['Output Name', 'Programmer', 'QC Program', 'QC Programmer']].dropna(subset=['Output Name'])
-        people_by_outname_unique = people_by_outname.drop_duplicates(subset=['Output Name'], keep='first')
-        
-        prog_lookup_outname = dict(zip(people_by_outname_unique['Output Name'], people_by_outname_unique['Programmer']))
-        qc_prog_lookup_outname = dict(zip(people_by_outname_unique['Output Name'], people_by_outname_unique['QC Program']))
-        qc_programmer_lookup_outname = dict(zip(people_by_outname_unique['Output Name'], people_by_outname_unique['QC Programmer']))
-        
-        for idx in mosaic_merge_data.index:
-            outname = mosaic_merge_data.loc[idx, 'Output Name']
-            if pd.notna(outname) and outname in prog_lookup_outname:
-                mosaic_merge_data.loc[idx, 'Programmer'] = prog_lookup_outname[outname]
-                mosaic_merge_data.loc[idx, 'QC Program'] = qc_prog_lookup_outname[outname]
-                mosaic_merge_data.loc[idx, 'QC Programmer'] = qc_programmer_lookup_outname[outname]
-                mosaic_merge_data.loc[idx, '_tier1_matched'] = True
-        
-        tier1_count = mosaic_merge_data['_tier1_matched'].sum()
-        print(f"    ✓ Output Name matched - {tier1_count} rows")
-    
-    # ===== Second priority: Supplement match using Program Name =====
-    if 'Program Name' in mosaic_merge_data.columns and 'Program Name' in people_df.columns:
-        print("  [Step 2] Using Program Name for second priority matching (only supplement unmatched rows)...")
-        
-        people_by_progname = people_df[['Program Name', 'Programmer', 'QC Program', 'QC Programmer']].dropna(subset=['Program Name'])
-        people_by_progname_unique = people_by_progname.drop_duplicates(subset=['Program Name'], keep='first')
-        
-        prog_lookup_progname = dict(zip(people_by_progname_unique['Program Name'], people_by_progname_unique['Programmer']))
-        qc_prog_lookup_progname = dict(zip(people_by_progname_unique['Program Name'], people_by_progname_unique['QC Program']))
-        qc_programmer_lookup_progname = dict(zip(people_by_progname_unique['Program Name'], people_by_progname_unique['QC Programmer']))
-        
-        for idx in mosaic_merge_data.index:
-            if not mosaic_merge_data.loc[idx, '_tier1_matched']:
-                progname = mosaic_merge_data.loc[idx, 'Program Name']
-                if pd.notna(progname) and progname in prog_lookup_progname:
-                    mosaic_merge_data.loc[idx, 'Programmer'] = prog_lookup_progname[progname]
-                    mosaic_merge_data.loc[idx, 'QC Program'] = qc_prog_lookup_progname[progname]
-                    mosaic_merge_data.loc[idx, 'QC Programmer'] = qc_programmer_lookup_progname[progname]
-                    mosaic_merge_data.loc[idx, '_tier2_matched'] = True
-        
-        tier2_count = mosaic_merge_data['_tier2_matched'].sum()
-        total_matched = mosaic_merge_data['_tier1_matched'].sum() + tier2_count
-        print(f"    ✓ Program Name supplement match - {tier2_count} rows, total {total_matched} rows")
+    with stage('cascade match'):
+        tier_masks, unmatch_rows, green_highlight_rows = match_people(mosaic_merge_data, people_df)
     
-    # ===== Third step: Count unmatched rows =====
-    unmatch_rows = mosaic_merge_data[~(mosaic_merge_data['_tier1_matched'] | mosaic_merge_data['_tier2_matched'])].index.tolist()
-    green_highlight_rows = mosaic_merge_data[mosaic_merge_data['_tier2_matched']].index.tolist()
+    total_matched = 0
+    for tier_number, (key, mask) in enumerate(tier_masks.items(), start=1):
+        if key not in mosaic_merge_data.columns or key not in people_df.columns:
+            print(f"  [Step {tier_number}] ⚠️ '{key}' column not available, tier skipped")
+            continue
+        tier_count = int(mask.sum())
+        total_matched += tier_count
+        if tier_number == 1:
+            print(f"  [Step {tier_number}] Using {key} for first priority matching...")
+            print(f"    ✓ {key} matched - {tier_count} rows")
+        else:
+            print(f"  [Step {tier_number}] Using {key} for priority {tier_number} matching (only supplement unmatched rows)...")
+            print(f"    ✓ {key} supplement match - {tier_count} rows, total {total_matched} rows")
     
+    # ===== Count unmatched rows =====
     if unmatch_rows:
         print(f"    ⚠️ Warning - Still {len(unmatch_rows)} rows unmatched (will be highlighted in yellow in output)")
     if green_highlight_rows:
-        print(f"    ℹ️ Info - {len(green_highlight_rows)} rows matched via Program Name (will be highlighted in green in output)")
+        print(f"    ℹ️ Info - {len(green_highlight_rows)} rows matched via fallback tiers (will be highlighted in green in output)")
     
     # Step 6: Copy people_file workbook and update target sheet
     print("\n[7] Preparing output file...")
     
     try:
         # Load people_file workbook (preserve all sheets)
-        wb = load_workbook(people_file)
-        ws_target = wb[target_sheet]
-        
-        # Clear data from row 3 onwards (preserve first two header rows)
-        print(f"  - Clearing data rows in '{target_sheet}' sheet (preserve headers)...")
-        
-        max_row = ws_target.max_row
-        max_col = ws_target.max_column
-        
-        for row_idx in range(3, max_row + 1):
-            for col_idx in range(1, max_col + 1):
-                ws_target.cell(row=row_idx, column=col_idx).value = None
-        
-        # Get headers (row 2)
-        headers = {}
-        for col_idx in range(1, max_col + 1):
-            header = ws_target.cell(row=2, column=col_idx).value
-            if header:
-                headers[header] = col_idx
-        
-        print(f"  - Found {len(headers)} column headers")
-        
-        # Write MOSAIC data to corresponding columns
-        print(f"  - Filling {len(mosaic_merge_data)} rows of data...")
-        
-        for data_row_idx, (orig_idx, row_data) in enumerate(mosaic_merge_data.iterrows(), start=3):
-            for col_name, col_idx in headers.items():
-                if col_name in mosaic_merge_data.columns:
-                    value = row_data[col_name]
-                    if pd.isna(value):
-                        value = None
-                    ws_target.cell(row=data_row_idx, column=col_idx).value = value
-        
-        # Apply color highlighting
-        print("  - Applying highlight colors...")
-        yellow_fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
-        green_fill = PatternFill(start_color='C6EFCE', end_color='C6EFCE', fill_type='solid')
-        
-        target_cols = ['Programmer', 'QC Program', 'QC Programmer']
-        
-        # Yellow highlight: Both Output Name and Program Name unmatched
-        for row_idx in unmatch_rows:
-            excel_row = row_idx + 3
-            for col_name in target_cols:
-                if col_name in headers:
-                    col_idx = headers[col_name]
-                    ws_target.cell(row=excel_row, column=col_idx).fill = yellow_fill
-        
-        # Green highlight: Matched via Program Name
-        for row_idx in green_highlight_rows:
-            excel_row = row_idx + 3
-            for col_name in target_cols:
-                if col_name in headers:
-                    col_idx = headers[col_name]
-                    ws_target.cell(row=excel_row, column=col_idx).fill = green_fill
+        with stage('load workbook'):
+            wb = load_workbook(people_file)
+        fill_target_sheet(wb[target_sheet], mosaic_merge_data, unmatch_rows, green_highlight_rows)
         
         # Step 7: User selects save location
         print("\n[8] Please select output file save location...")
-        output_file = save_file(
+        output_file = output_file or save_file(
             "Save Output File",
             "people_management_updated.xlsx",
             [("Excel files", "*.xlsx"), ("All files", "*.*")]
@@ -316,7 +439,8 @@ def fill_tlf_template():
         
         # Save file
         print(f"  - Saving file to: {output_file}")
-        wb.save(output_file)
+        with stage('save workbook'):
+            wb.save(output_file)
         print(f"✓ File saved: {output_file}")
         
     except Exception as e:
@@ -331,18 +455,49 @@ def fill_tlf_template():
     print(f"Output file: {output_file}")
     print(f"Updated sheet: '{target_sheet}'")
     print(f"Data rows: {len(mosaic_merge_data)}")
-    print(f"Output Name matched: {mosaic_merge_data['_tier1_matched'].sum()} rows")
-    print(f"Program Name supplement match: {mosaic_merge_data['_tier2_matched'].sum()} rows")
+    for tier_number, (key, mask) in enumerate(tier_masks.items(), start=1):
+        label = "matched" if tier_number == 1 else "supplement match"
+        print(f"{key} {label}: {int(mask.sum())} rows")
     print(f"Unmatched (yellow highlight): {len(unmatch_rows)} rows")
-    print(f"Tier 2 matched (green highlight): {len(green_highlight_rows)} rows")
+    print(f"Fallback tier matched (green highlight): {len(green_highlight_rows)} rows")
     print("\nTip: You can directly open the Excel file to view results")
     print("      All sheets from people file have been preserved")
     
     return True
 
 
+def parse_args(argv=None):
+    """Parse command line arguments for non-interactive mode"""
+    parser = argparse.ArgumentParser(
+        description="Merge MOSAIC_CONVERT output into the people_management TLF sheet (command line mode)"
+    )
+    parser.add_argument('--mosaic', required=True, help="MOSAIC_CONVERT output Excel file (Index sheet)")
+    parser.add_argument('--people', required=True, help="people_management.xlsx to fill")
+    parser.add_argument('--output', required=True, help="Output Excel file")
+    stage_timer.add_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def command_line_mode(argv):
+    """
+    Run without dialogs
+    
+    Returns:
+    --------
+    int : exit code
+    """
+    args = parse_args(argv)
+    stage_timer.enable_from_args(args)
+    with profiling.profile_context(args, args.output):
+        success = fill_tlf_template(args.mosaic, args.people, args.output)
+    return 0 if success else 1
+
+
 if __name__ == "__main__":
     try:
+        if len(sys.argv) > 1:
+            sys.exit(command_line_mode(sys.argv[1:]))
         success = fill_tlf_template()
         sys.exit(0 if success else 1)
     except Exception as e:
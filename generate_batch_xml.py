@@ -10,13 +10,24 @@ Date: 2026-02-11
 
 import pandas as pd
 import re
+import io
+import sys
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
-from xml.dom import minidom
-import xml.etree.ElementTree as ET
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 import warnings
 
+from latin1_check import scan_characters
+from csv_loader import read_csv_sniffed, describe_load
+import stage_timer
+from stage_timer import stage
+import profiling
+
 # Try importing tkinter
 try:
     import tkinter as tk
@@ -28,11 +39,45 @@ except ImportError:
     print("To use GUI file selection, please install tkinter")
 
 
+# Attribute escaping, same as xml.dom.minidom's pretty printer on Python 3.11
+# (line breaks and tabs are written as is)
+_XML_ATTR_ESCAPES = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+})
+
+
+def _xml_attr(value):
+    """Escape a value for use inside a double-quoted XML attribute"""
+    return str(value).translate(_XML_ATTR_ESCAPES)
+
+
+# One <source-file> entry of the batch list
+SourceFile = namedtuple('SourceFile', ['filename', 'fileLocation', 'number', 'title', 'original_order'])
+
+
+# Defaults shared by interactive and command line mode
+DEFAULT_HEADER = "AZD0901 CSR DR2 Batch 1 Listings"
+DEFAULT_FILE_LOCATION = "root/cdar/d980/d9802c00001/ar/dr2/tlf/dev/output/"
+
+MANIFEST_FIELDS = ['input', 'header', 'output', 'output_name', 'file_location', 'start_number']
+
+
 class XMLGenerator:
     """Class for generating batch list XML"""
     
-    def __init__(self):
+    def __init__(self, non_latin1_action='ask'):
+        """
+        Args:
+            non_latin1_action: what to do when non-latin1 characters are found:
+                'ask' (prompt the user), 'continue' or 'abort'
+        """
+        self.non_latin1_action = non_latin1_action
         self.df = None
+        self.latin1_report = None
+        self.csv_info = None
         self.header_text = ""
         self.file_location = ""
         
@@ -49,22 +94,15 @@ class XMLGenerator:
             raise FileNotFoundError(f"File does not exist: {file_path}")
         
         try:
-            if file_path.suffix.lower() == '.csv':
-                # Try multiple encodings to read CSV
-                encodings = ['utf-8', 'gbk', 'gb2312', 'latin1']
-                for encoding in encodings:
-                    try:
-                        self.df = pd.read_csv(file_path, encoding=encoding)
-                        print(f"Successfully read CSV file with {encoding} encoding")
-                        break
-                    except UnicodeDecodeError:
-                        continue
+            with stage('read input'):
+                if file_path.suffix.lower() == '.csv':
+                    # Read once, detect encoding (utf-8, gbk, gb2312, latin1) from the bytes
+                    self.df, self.csv_info = read_csv_sniffed(file_path)
+                    print(f"Successfully read CSV file with {describe_load(self.csv_info)}")
                 else:
-                    raise ValueError("Unable to read CSV file with any supported encoding")
-            else:
-                # Read Excel file
-                self.df = pd.read_excel(file_path)
-                print("Successfully read Excel file")
+                    # Read Excel file
+                    self.df = pd.read_excel(file_path)
+                    print("Successfully read Excel file")
                 
             print(f"Read {len(self.df)} rows of data")
             self._validate_columns()
@@ -72,6 +110,16 @@ class XMLGenerator:
         except Exception as e:
             raise Exception(f"Failed to read file: {str(e)}")
     
+    def load_frame(self, df):
+        """
+        Use an in-memory Index table instead of reading a file
+        
+        Args:
+            df: DataFrame with the MOSAIC_CONVERT Index columns (copied)
+        """
+        self.df = df.copy()
+        self._validate_columns()
+    
     def _validate_columns(self):
         """Validate that required columns exist"""
         required_columns = ['sect_num', 'sect_ttl', 'OUTFILE', 
@@ -116,49 +164,23 @@ class XMLGenerator:
         
         return tuple(result)
     
-    def _check_latin1_compatibility(self, text):
-        """
-        Check if text contains only latin1 characters
-        
-        Args:
-            text: Text to check
-            
-        Returns:
-            (is_compatible, problematic_chars): Compatibility status and list of problematic characters
-        """
-        if pd.isna(text):
-            return True, []
-        
-        text = str(text)
-        problematic_chars = []
-        
-        for char in text:
-            try:
-                char.encode('latin1')
-            except UnicodeEncodeError:
-                if char not in problematic_chars:
-                    problematic_chars.append(char)
-        
-        return len(problematic_chars) == 0, problematic_chars
-    
     def _validate_latin1(self):
         """Validate if all relevant fields contain only latin1 characters"""
         print("\nChecking character encoding compatibility...")
         
-        issues = []
         columns_to_check = ['sect_ttl', 'Title']
         
-        for idx, row in self.df.iterrows():
-            for col in columns_to_check:
-                if col in self.df.columns:
-                    is_compatible, problematic_chars = self._check_latin1_compatibility(row[col])
-                    if not is_compatible:
-                        issues.append({
-                            'row': idx + 2,  # Excel row number (starting from 1, plus header)
-                            'column': col,
-                            'value': str(row[col])[:50],  # Show only first 50 characters
-                            'problematic_chars': problematic_chars
-                        })
+        # Structured report: row, column, characters, offsets (see latin1_check.py)
+        self.latin1_report = scan_characters(self.df, columns_to_check)
+        
+        issues = []
+        for row, col, characters, _ in self.latin1_report.itertuples(index=False, name=None):
+            issues.append({
+                'row': row + 2,  # Excel row number (starting from 1, plus header)
+                'column': col,
+                'value': str(self.df.at[row, col])[:50],  # Show only first 50 characters
+                'problematic_chars': characters
+            })
         
         if issues:
             print("\n⚠ Warning: Non-latin1 characters detected!")
@@ -176,12 +198,18 @@ class XMLGenerator:
             print("  2. Replace non-ASCII characters with ASCII equivalents")
             print("  3. If XML needs to support these characters, consider using UTF-8 encoding")
             
-            response = input("\nContinue generating XML? (y/n): ").strip().lower()
-            if response != 'y':
-                raise ValueError("Operation cancelled by user")
+            if self.non_latin1_action == 'continue':
+                print("\nContinuing despite non-latin1 characters (--allow-non-latin1)")
+            elif self.non_latin1_action == 'abort':
+                raise ValueError(f"Non-latin1 characters found in {len(issues)} cell(s); use --allow-non-latin1 to continue anyway")
+            else:
+                response = input("\nContinue generating XML? (y/n): ").strip().lower()
+                if response != 'y':
+                    raise ValueError("Operation cancelled by user")
         else:
             print("✓ All characters are latin1 compatible")
     
+    @stage_timer.run('generate_xml')
     def generate_xml(self, header_text, file_location, output_path, output_filename, start_number=2):
         """
         Generate XML file
@@ -197,71 +225,15 @@ class XMLGenerator:
         self.file_location = file_location
         
         # Validate latin1 compatibility
-        self._validate_latin1()
+        with stage('latin1 check'):
+            self._validate_latin1()
         
         print("\nStarting XML generation...")
         
-        # Group by section
-        sections = self._group_by_section()
-        
-        # Create XML structure - maintain exact consistency with reference XML
-        root = ET.Element('pdf-builder-metadata')
-        
-        # 添加注释（需要在prettify时处理）
-        comment_text = '<!-- input files total to less than 100MB -->'
-        
-        # Add ruleset
-        ruleset = ET.SubElement(root, 'ruleset')
-        
-        # Add headers
-        headers = ET.SubElement(ruleset, 'headers')
-        header = ET.SubElement(headers, 'header')
-        header.set('text', header_text)
-        header.set('startNumber', str(start_number))
-        
-        # Add page configuration (fixed content)
-        page = ET.SubElement(ruleset, 'page')
-        page.set('orientation', 'landscape')
-        page.set('size', 'letter')
-        page.set('measurementUnit', 'in')
-        page.set('marginTop', '           0')
-        page.set('marginLeft', '           0')
-        page.set('marginRight', '           0')
-        page.set('marginBottom', '           0')
-        
-        # Add font configuration (fixed content)
-        font = ET.SubElement(ruleset, 'font')
-        font.set('fontName', 'CourierNew')
-        font.set('style', 'normal')
-        font.set('size', '9')
-        
-        # 添加注释（需要在prettify时处理）
-        # <!-- <character-encoding type="ascii" /> -->
-        
-        # Add document-heading (fixed content, but text uses user-defined header_text)
-        doc_heading = ET.SubElement(ruleset, 'document-heading')
-        doc_heading.set('text', header_text)
-        doc_heading.set('fontName', 'Times New Roman')
-        
-        # Add sectionset
-        sectionset = ET.SubElement(root, 'sectionset')
-        
-        # Add sections in natural sort order
-        sorted_sections = sorted(sections.items(), key=lambda x: self._natural_sort_key(x[0]))
-        
-        for section_key, files in sorted_sections:
-            section_num, section_title = section_key
-            
-            section = ET.SubElement(sectionset, 'section')
-            section.set('name', f"{section_num} {section_title}")
-            
-            # Add source-files
-            for file_info in files:
-                source_file = ET.SubElement(section, 'source-file')
-                source_file.set('filename', file_info['filename'])
-                source_file.set('fileLocation', file_info['fileLocation'])
-                source_file.set('number', file_info['number'])
-                source_file.set('title', file_info['title'])
+        # Group by section, then add sections in natural sort order
+        with stage('group sections'):
+            sections = self._group_by_section()
+            sorted_sections = sorted(sections.items(), key=lambda x: self._natural_sort_key(x[0]))
         
         # Extract base path from file_location for pdf-import and audit-import
         # For example: "root/cdar/d980/d9802c00001/ar/dr2/tlf/dev/output/" -> "root/cdar/d980/d9802c00001/ar/dr2"
@@ -271,27 +243,12 @@ class XMLGenerator:
         base_path = base_path.rstrip('/')
         doc_path = f"{base_path}/tlf/doc/"
         
-        # Add output-pdf (using custom output filename)
-        output_pdf = ET.SubElement(root, 'output-pdf')
-        output_pdf.set('filename', f'{output_filename}.pdf')
-        pdf_import = ET.SubElement(output_pdf, 'pdf-import')
-        pdf_import.set('path', doc_path)
-        
-        # Add output-audit (using custom output filename)
-        output_audit = ET.SubElement(root, 'output-audit')
-        output_audit.set('filename', f'{output_filename}_audit.pdf')
-        audit_import = ET.SubElement(output_audit, 'audit-import')
-        audit_import.set('path', doc_path)
-        
-        # Format XML
-        xml_string = self._prettify_xml(root)
-        
-        # Save to file
+        # Save to file, writing the reference layout element by element
         output_path = Path(output_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(xml_string)
+        with stage('write XML'), open(output_path, 'w', encoding='utf-8') as f:
+            self._write_xml(f, sorted_sections, header_text, start_number, output_filename, doc_path)
         
         print(f"\n✓ XML file generated: {output_path}")
         print(f"  - Contains {len(sorted_sections)} sections")
@@ -300,121 +257,123 @@ class XMLGenerator:
         return output_path
     
     def _group_by_section(self):
-        """Group and sort by section"""
-        sections = OrderedDict()
-        
-        # Clean data
-        df_clean = self.df.copy()
-        
-        # 填充空值
-        for col in df_clean.columns:
-            if col in ['sect_num', 'sect_ttl', 'OUTFILE', 'Title']:
-                df_clean[col] = df_clean[col].fillna('')
-            if col == 'tocnumber':
-                df_clean[col] = df_clean[col].fillna('')
+        """
+        Group and sort by section
         
-        # Process each row in original order
-        for idx, row in df_clean.iterrows():
-            sect_num = str(row['sect_num']).strip()
-            sect_ttl = str(row['sect_ttl']).strip()
-            
-            if not sect_num:
-                print(f"Warning: Row {idx + 2} missing sect_num, skipping")
-                continue
-            
-            section_key = (sect_num, sect_ttl)
-            
-            # Build source-file information
-            outfile = str(row['OUTFILE']).strip()
-            filename = f"{outfile}.rtf" if outfile else ""
-            
-            output_type = str(row['Output Type (Table, Listing, Figure)']).strip()
-            tocnumber = str(row['tocnumber']).strip()
-            number = f"{output_type} {tocnumber}" if output_type and tocnumber else ""
-            
-            title = str(row['Title']).strip()
-            
-            file_info = {
-                'filename': filename,
-                'fileLocation': self.file_location,
-                'number': number,
-                'title': title,
-                'original_order': idx
-            }
-            
-            # Add to section
-            if section_key not in sections:
-                sections[section_key] = []
-            sections[section_key].append(file_info)
+        Returns:
+            OrderedDict mapping (sect_num, sect_ttl) -> list of SourceFile records,
+            sections and files in original row order
+        """
+        df = self.df
+        
+        def text_column(col, fill=True):
+            # Same text as str(value).strip(); missing values become '' when filled
+            values = df[col].astype(object)
+            values = values.where(values.notna(), '' if fill else 'nan')
+            return values.astype(str).str.strip()
+        
+        sect_num = text_column('sect_num')
+        sect_ttl = text_column('sect_ttl')
+        outfile = text_column('OUTFILE')
+        output_type = text_column('Output Type (Table, Listing, Figure)', fill=False)
+        tocnumber = text_column('tocnumber')
+        title = text_column('Title')
+        
+        # Build source-file information
+        has_outfile = outfile != ''
+        filename = (outfile + '.rtf').where(has_outfile, '')
+        has_number = (output_type != '') & (tocnumber != '')
+        number = (output_type + ' ' + tocnumber).where(has_number, '')
+        
+        missing_sect = sect_num == ''
+        for idx in df.index[missing_sect.to_numpy()]:
+            print(f"Warning: Row {idx + 2} missing sect_num, skipping")
+        
+        files_df = pd.DataFrame({
+            'sect_num': sect_num,
+            'sect_ttl': sect_ttl,
+            'filename': filename,
+            'number': number,
+            'title': title,
+            'original_order': df.index,
+        }, index=df.index)[~missing_sect]
+        
+        # Stable grouping: sections in first-appearance order, files in row order
+        sections = OrderedDict()
+        for section_key, group in files_df.groupby(['sect_num', 'sect_ttl'], sort=False):
+            sections[section_key] = [
+                SourceFile(file_name, self.file_location, file_number, file_title, order)
+                for file_name, file_number, file_title, order in zip(
+                    group['filename'], group['number'], group['title'], group['original_order']
+                )
+            ]
         
         return sections
     
-    def _prettify_xml(self, elem):
-        """Format XML for better readability, maintain exact consistency with reference XML"""
-        # Use UTF-8 encoding
-        rough_string = ET.tostring(elem, encoding='utf-8')
-        reparsed = minidom.parseString(rough_string)
-        
-        # Get formatted XML with 4-space indentation
-        pretty = reparsed.toprettyxml(indent="    ", encoding='UTF-8').decode('utf-8')
-        
-        # Remove extra blank lines
-        lines = []
-        for line in pretty.split('\n'):
-            if line.strip():
-                lines.append(line)
-        
-        result = '\n'.join(lines)
-        
-        # Add comment after <pdf-builder-metadata>
-        result = result.replace(
-            '<pdf-builder-metadata>',
-            '<pdf-builder-metadata>\n<!-- input files total to less than 100MB -->'
-        )
-        
-        # Add comment after font element
-        result = result.replace(
-            '<font fontName="CourierNew" style="normal" size="9"/>',
-            '<font fontName="CourierNew" style="normal" size="9"/>\n        <!-- <character-encoding type="ascii" /> -->'
-        )
-        
-        # Fix self-closing tag format to match reference XML
-        # header tag
-        result = result.replace(
-            '<header text=',
-            '<header text='
-        ).replace('></header>', ' />')
-        
-        # page tag - maintain multi-line format
-        result = result.replace(
-            '<page orientation=',
-            '<page\n            orientation='
-        ).replace(
-            '" measurementUnit=',
-            '"\n            measurementUnit='
-        ).replace(
-            '" marginTop=',
-            '"\n            marginTop='
-        ).replace(
-            '" marginLeft=',
-            '"\n            marginLeft='
-        ).replace(
-            '" marginRight=',
-            '"\n            marginRight='
-        ).replace(
-            '" marginBottom=',
-            '"\n            marginBottom='
-        )
-        
-        # Ensure source-file is single line
-        result = result.replace('</source-file>', ' />')
-        result = result.replace('<source-file ', '<source-file ')
+    def _write_xml(self, f, sorted_sections, header_text, start_number, output_filename, doc_path):
+        """
+        Write the batch list XML in the exact reference layout
         
-        # Ensure other self-closing tags are formatted correctly
-        for tag in ['font', 'document-heading', 'pdf-import', 'audit-import']:
-            result = result.replace(f'</{tag}>', ' />')
+        Elements are written one line at a time (4-space indentation, multi-line
+        <page> attributes, fixed comments, self-closing source-file tags), so
+        memory use does not depend on the number of source files.
         
-        return result
+        Args:
+            f: text file opened for writing (utf-8)
+            sorted_sections: list of ((sect_num, sect_ttl), [SourceFile, ...]) in output order
+            header_text: header text attribute value
+            start_number: header startNumber attribute value
+            output_filename: output PDF filename (without .pdf extension)
+            doc_path: path for pdf-import and audit-import
+        """
+        header = _xml_attr(header_text)
+        
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<pdf-builder-metadata>\n')
+        f.write('<!-- input files total to less than 100MB -->\n')
+        
+        # ruleset (fixed content except header text and start number)
+        f.write('    <ruleset>\n')
+        f.write('        <headers>\n')
+        f.write(f'            <header text="{header}" startNumber="{_xml_attr(start_number)}"/>\n')
+        f.write('        </headers>\n')
+        f.write('        <page\n')
+        f.write('            orientation="landscape" size="letter"\n')
+        f.write('            measurementUnit="in"\n')
+        f.write('            marginTop="           0"\n')
+        f.write('            marginLeft="           0"\n')
+        f.write('            marginRight="           0"\n')
+        f.write('            marginBottom="           0"/>\n')
+        f.write('        <font fontName="CourierNew" style="normal" size="9"/>\n')
+        f.write('        <!-- <character-encoding type="ascii" /> -->\n')
+        f.write(f'        <document-heading text="{header}" fontName="Times New Roman"/>\n')
+        f.write('    </ruleset>\n')
+        
+        # sectionset
+        if sorted_sections:
+            f.write('    <sectionset>\n')
+            for (section_num, section_title), files in sorted_sections:
+                f.write(f'        <section name="{_xml_attr(f"{section_num} {section_title}")}">\n')
+                for file_info in files:
+                    f.write(
+                        f'            <source-file filename="{_xml_attr(file_info.filename)}"'
+                        f' fileLocation="{_xml_attr(file_info.fileLocation)}"'
+                        f' number="{_xml_attr(file_info.number)}"'
+                        f' title="{_xml_attr(file_info.title)}"/>\n'
+                    )
+                f.write('        </section>\n')
+            f.write('    </sectionset>\n')
+        else:
+            f.write('    <sectionset/>\n')
+        
+        # output-pdf and output-audit (using custom output filename)
+        f.write(f'    <output-pdf filename="{_xml_attr(output_filename + ".pdf")}">\n')
+        f.write(f'        <pdf-import path="{_xml_attr(doc_path)}"/>\n')
+        f.write('    </output-pdf>\n')
+        f.write(f'    <output-audit filename="{_xml_attr(output_filename + "_audit.pdf")}">\n')
+        f.write(f'        <audit-import path="{_xml_attr(doc_path)}"/>\n')
+        f.write('    </output-audit>\n')
+        f.write('</pdf-builder-metadata>')
 
 
 def interactive_mode():
@@ -490,7 +449,7 @@ def interactive_mode():
     print("\nStep 2/6: Set Header Text")
     print("-" * 70)
     print("This will be used for: <header text=\"...\"> and <document-heading text=\"...\">")
-    default_header = "AZD0901 CSR DR2 Batch 1 Listings"
+    default_header = DEFAULT_HEADER
     header_text = input(f"Enter header text [Default: {default_header}]: ").strip()
     if not header_text:
         header_text = default_header
@@ -521,7 +480,7 @@ def interactive_mode():
     # 4. Get file location
     print("\nStep 4/6: Set File Location")
     print("-" * 70)
-    default_location = "root/cdar/d980/d9802c00001/ar/dr2/tlf/dev/output/"
+    default_location = DEFAULT_FILE_LOCATION
     file_location = input(f"Enter file location [Default: {default_location}]: ").strip()
     if not file_location:
         file_location = default_location
@@ -613,15 +572,260 @@ def interactive_mode():
         traceback.print_exc()
 
 
+def _normalize_batch(batch, base_dir=None):
+    """
+    Fill defaults for one batch description and validate it
+    
+    Args:
+        batch: dict with keys from MANIFEST_FIELDS ('input' and 'output' required)
+        base_dir: directory that relative paths are resolved against
+        
+    Returns:
+        Normalized batch dict
+    """
+    def text(key):
+        value = batch.get(key)
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return ''
+        return str(value).strip()
+    
+    input_file = text('input')
+    output_path = text('output')
+    if not input_file or not output_path:
+        raise ValueError(f"Batch needs both 'input' and 'output': {batch}")
+    if base_dir:
+        input_file = str(Path(base_dir) / input_file)
+        output_path = str(Path(base_dir) / output_path)
+    
+    header_text = text('header') or DEFAULT_HEADER
+    output_filename = text('output_name') or header_text.replace(' ', '_')
+    if ' ' in output_filename:
+        raise ValueError(f"Output filename cannot contain spaces: {output_filename}")
+    
+    start_number = text('start_number') or '2'
+    try:
+        start_number = int(float(start_number))
+    except ValueError:
+        raise ValueError(f"Invalid start number: {start_number}")
+    
+    return {
+        'input': input_file,
+        'header': header_text,
+        'output': output_path,
+        'output_name': output_filename,
+        'file_location': text('file_location') or DEFAULT_FILE_LOCATION,
+        'start_number': start_number,
+    }
+
+
+def load_manifest(manifest_path):
+    """
+    Read a batch manifest (CSV or JSON)
+    
+    CSV: one row per batch with columns input, header, output, output_name,
+    file_location, start_number. JSON: a list of objects with the same keys
+    (or {"batches": [...]}). Relative paths are resolved against the
+    manifest's directory.
+    
+    Args:
+        manifest_path: path to .csv or .json manifest
+        
+    Returns:
+        List of normalized batch dicts
+    """
+    manifest_path = Path(manifest_path)
+    if manifest_path.suffix.lower() == '.json':
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('batches', [])
+        batches = list(data)
+    else:
+        batches = pd.read_csv(manifest_path, dtype=str, keep_default_na=False).to_dict('records')
+    
+    return [_normalize_batch(batch, base_dir=manifest_path.parent) for batch in batches]
+
+
+def _generate_input_group(input_file, batches, non_latin1_action):
+    """
+    Worker: load one input file once and generate every batch that uses it
+    
+    Returns:
+        List of result records, one per batch (never raises)
+    """
+    records = []
+    generator = XMLGenerator(non_latin1_action=non_latin1_action)
+    log = io.StringIO()
+    
+    try:
+        with contextlib.redirect_stdout(log):
+            generator.load_excel(input_file)
+    except Exception as e:
+        return [dict(batch, status='ERROR', seconds=0.0, error=str(e)) for batch in batches]
+    
+    for batch in batches:
+        start_time = time.perf_counter()
+        record = dict(batch, status='OK', error='')
+        try:
+            with contextlib.redirect_stdout(log):
+                generator.generate_xml(
+                    header_text=batch['header'],
+                    file_location=batch['file_location'],
+                    output_path=batch['output'],
+                    output_filename=batch['output_name'],
+                    start_number=batch['start_number']
+                )
+        except Exception as e:
+            record['status'] = 'ERROR'
+            record['error'] = str(e)
+        record['seconds'] = time.perf_counter() - start_time
+        records.append(record)
+    
+    return records
+
+
+def generate_batches(batches, workers=None, non_latin1_action='abort'):
+    """
+    Generate many batch list XMLs concurrently
+    
+    Batches are grouped by input file so that each input is read only once;
+    input groups run in parallel worker processes.
+    
+    Args:
+        batches: list of normalized batch dicts (see load_manifest)
+        workers: number of worker processes (default: CPU count)
+        non_latin1_action: 'continue' or 'abort' when non-latin1 characters are found
+        
+    Returns:
+        List of result records in manifest order
+    """
+    groups = OrderedDict()
+    for position, batch in enumerate(batches):
+        key = str(Path(batch['input']).resolve())
+        groups.setdefault(key, []).append(dict(batch, position=position))
+    
+    print(f"Generating {len(batches)} batch XML(s) from {len(groups)} input file(s)...")
+    
+    records = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_generate_input_group, input_file, group, non_latin1_action): group
+            for input_file, group in groups.items()
+        }
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                group_records = future.result()
+            except Exception as e:
+                # Worker process died
+                group_records = [dict(batch, status='ERROR', seconds=0.0, error=str(e)) for batch in group]
+            for record in group_records:
+                print(f"  {'✓' if record['status'] == 'OK' else '✗'} {Path(record['output']).name}")
+            records.extend(group_records)
+    
+    records.sort(key=lambda record: record['position'])
+    print_batch_summary(records)
+    return records
+
+
+def print_batch_summary(records):
+    """Print one summary table for a command line run"""
+    name_width = max([len('Output XML')] + [len(Path(r['output']).name) for r in records])
+    
+    print("\n" + "=" * 70)
+    print("Batch XML summary")
+    print("=" * 70)
+    print(f"{'Output XML':<{name_width}}  {'Status':<6}  {'Seconds':>8}  Input / Error")
+    print("-" * 70)
+    for r in records:
+        detail = Path(r['input']).name if r['status'] == 'OK' else r['error']
+        print(f"{Path(r['output']).name:<{name_width}}  {r['status']:<6}  {r['seconds']:>8.2f}  {detail}")
+    print("-" * 70)
+    failed_count = sum(1 for r in records if r['status'] != 'OK')
+    print(f"Total: {len(records)} batch(es), {len(records) - failed_count} OK, {failed_count} failed")
+    print("=" * 70)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Generate Batch List XML from Excel/CSV (command line mode)"
+    )
+    parser.add_argument('--input', help="Input Excel/CSV file (single batch)")
+    parser.add_argument('--header', default=DEFAULT_HEADER,
+                        help=f"Header text (default: {DEFAULT_HEADER})")
+    parser.add_argument('--output', help="Output XML file path (single batch)")
+    parser.add_argument('--output-name',
+                        help="Output PDF filename without .pdf, no spaces (default: header with '_')")
+    parser.add_argument('--file-location', default=DEFAULT_FILE_LOCATION,
+                        help=f"File location prefix (default: {DEFAULT_FILE_LOCATION})")
+    parser.add_argument('--start-number', type=int, default=2,
+                        help="Starting page number (default: 2)")
+    parser.add_argument('--manifest', help="CSV/JSON manifest describing many batches")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for --manifest (default: CPU count)")
+    parser.add_argument('--allow-non-latin1', action='store_true',
+                        help="Continue when non-latin1 characters are found (default: fail the batch)")
+    stage_timer.add_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    if args.manifest and args.input:
+        parser.error("--manifest and --input cannot be used together")
+    if not args.manifest and not (args.input and args.output):
+        parser.error("give --manifest, or both --input and --output")
+    return args
+
+
+def command_line_mode(argv=None):
+    """Command line mode; returns the process exit code"""
+    args = parse_args(argv)
+    non_latin1_action = 'continue' if args.allow_non_latin1 else 'abort'
+    stage_timer.enable_from_args(args)
+    
+    # Profile files next to the output XML, or next to the manifest
+    with profiling.profile_context(args, args.manifest or args.output):
+        return _run_command_line(args, non_latin1_action)
+
+
+def _run_command_line(args, non_latin1_action):
+    """Generate the batch(es) of parsed command line arguments; returns the exit code"""
+    if args.manifest:
+        batches = load_manifest(args.manifest)
+        if not batches:
+            print(f"❌ No batches found in manifest: {args.manifest}")
+            return 1
+        records = generate_batches(batches, workers=args.workers, non_latin1_action=non_latin1_action)
+        return 0 if all(r['status'] == 'OK' for r in records) else 1
+    
+    batch = _normalize_batch({
+        'input': args.input,
+        'header': args.header,
+        'output': args.output,
+        'output_name': args.output_name,
+        'file_location': args.file_location,
+        'start_number': args.start_number,
+    })
+    generator = XMLGenerator(non_latin1_action=non_latin1_action)
+    with stage_timer.run('generate_batch_xml'):
+        generator.load_excel(batch['input'])
+        output_file = generator.generate_xml(
+            header_text=batch['header'],
+            file_location=batch['file_location'],
+            output_path=batch['output'],
+            output_filename=batch['output_name'],
+            start_number=batch['start_number']
+        )
+    print(f"\nGenerated file: {output_file.absolute()}")
+    return 0
+
+
 def main():
     """Main function"""
-    import sys
-    
     try:
         if len(sys.argv) > 1:
             # Command line mode
-            print("Command line mode not yet implemented, please use interactive mode")
-            print("Run directly: python generate_batch_xml.py")
+            sys.exit(command_line_mode(sys.argv[1:]))
         else:
             # Interactive mode
             interactive_mode()
@@ -635,6 +839,8 @@ def main():
         print("1. Are required packages installed: pip install pandas openpyxl")
         print("2. Is Python version >=3.6")
         print("3. Is input file format correct")
+        if len(sys.argv) > 1:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+"""
+Shared latin1 compatibility scanner
+
+Finds characters that cannot be encoded in latin1 (code points above U+00FF)
+with one compiled regex per column and returns a structured report.
+Used by generate_batch_xml.py (latin1 validation) and mosaic_convert.py
+(red character highlighting).
+"""
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Any code point outside latin1 (U+0000 - U+00FF)
+NON_LATIN1_PATTERN = re.compile(r'[^\x00-\xff]')
+
+REPORT_COLUMNS = ['row', 'column', 'characters', 'offsets']
+
+
+def scan_characters(df, columns=None, pattern=NON_LATIN1_PATTERN):
+    """
+    Find every match of pattern in the given columns
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Data to scan; missing values are treated as empty text
+    columns : list, optional
+        Columns to scan (default: all columns). Columns not in df are ignored
+    pattern : re.Pattern
+        Characters to find (default: non-latin1 characters)
+
+    Returns:
+    --------
+    report : pandas.DataFrame
+        One row per offending cell, in row then column order:
+        - row: index label of the row in df
+        - column: column name
+        - characters: distinct matched text, in order of first appearance
+        - offsets: character offsets covered by the matches
+    """
+    if columns is None:
+        columns = list(df.columns)
+    columns = [col for col in columns if col in df.columns]
+
+    records = []
+    for col_pos, col in enumerate(columns):
+        values = df[col].astype(object)
+        text = values.where(values.notna(), '').astype(str)
+
+        # One regex pass over the column, detailed matching only on hits
+        hits = text.str.contains(pattern.pattern, regex=True).to_numpy(dtype=bool)
+        for row_pos in np.flatnonzero(hits):
+            characters = []
+            offsets = []
+            for match in pattern.finditer(text.iat[row_pos]):
+                if match.group() not in characters:
+                    characters.append(match.group())
+                offsets.extend(range(match.start(), match.end()))
+            records.append((row_pos, col_pos, text.index[row_pos], col, characters, offsets))
+
+    records.sort(key=lambda record: (record[0], record[1]))
+    return pd.DataFrame([record[2:] for record in records], columns=REPORT_COLUMNS)
+
+
+def offsets_to_spans(offsets):
+    """Merge sorted character offsets into (start, end) spans"""
+    spans = []
+    for offset in offsets:
+        if spans and spans[-1][1] >= offset:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], offset + 1))
+        else:
+            spans.append((offset, offset + 1))
+    return spans
+
+
+def report_to_json(report, path=None):
+    """
+    Serialize a scan report as JSON (list of records)
+
+    Parameters:
+    -----------
+    report : pandas.DataFrame
+        Output of scan_characters
+    path : str, optional
+        If given, the JSON is also written to this file (UTF-8)
+
+    Returns:
+    --------
+    str : JSON text
+    """
+    records = [
+        {
+            'row': row.item() if hasattr(row, 'item') else row,
+            'column': column,
+            'characters': characters,
+            'offsets': offsets,
+        }
+        for row, column, characters, offsets in report[REPORT_COLUMNS].itertuples(index=False, name=None)
+    ]
+    text = json.dumps(records, ensure_ascii=False, indent=2)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return text
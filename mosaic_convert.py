@@ -1,16 +1,37 @@
 import pandas as pd
 import numpy as np
-from openpyxl import load_workbook
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill
+from openpyxl.styles.fonts import DEFAULT_FONT as DEFAULT_CELL_FONT
+from openpyxl.packaging.custom import StringProperty
 from openpyxl.cell.text import InlineFont
 from openpyxl.cell.rich_text import TextBlock, CellRichText
-from openpyxl.utils import get_column_letter
 import os
+import sys
+import io
+import glob
+import time
+import shutil
+import hashlib
+import argparse
+import base64
+import contextlib
+import difflib
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import tkinter as tk
 from tkinter import filedialog
-import re
 from datetime import datetime
 
+from mosaic_rules import evaluate_rules
+from csv_loader import read_csv_sniffed, describe_load
+from xlsx_patch import XlsxRowPatcher, RowPatchError, decode_cells, renumber_row, remap_cell_styles
+import stage_timer
+from stage_timer import stage
+import profiling
+
 
 def preprocess_csv_data(df):
     """
@@ -78,20 +99,285 @@ def preprocess_csv_data(df):
     return df
 
 
-def mosaic_convert(csv_file_path, output_file_path=None):
+def build_index_frame(df, param_col):
     """
-    Convert TiFo CSV file to Excel format with MOSAIC processing
+    Pivot seq-numbered parm/value rows into one Index row per output
+
+    Every seq group contributes sect_num/sect_ttl/PROGRAM/SUFFIX from its
+    first row, plus one column per normalized parm name. When a parm
+    appears more than once in a group, the last value wins. 'outfile'
+    becomes the 'OUTFILE' column.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Raw data with a 'seq' column (0 = rows before the first outfile)
+    param_col : str
+        Name of the parm column ('parm' or 'param')
+
+    Returns:
+    --------
+    index_df : pandas.DataFrame
+        One row per seq, in seq order
+    """
+    grouped = df[df['seq'] > 0]
+
+    # Fixed columns taken from the first row of each seq group
+    first_rows = grouped.drop_duplicates(subset='seq', keep='first').set_index('seq')
+    base = pd.DataFrame({
+        'sect_num': first_rows['sect_num'],
+        'sect_ttl': first_rows['sect_ttl'],
+        'PROGRAM': first_rows['program'].fillna(''),
+        'SUFFIX': first_rows['suffix'].fillna(''),
+    })
+
+    # Normalized parm names; empty/missing parms are ignored
+    params = grouped[param_col]
+    valid = params.notna() & (params != '')
+    keys = params[valid].astype(str).str.strip().str.lower()
+    keys = keys.where(keys != 'outfile', 'OUTFILE')
+
+    long_df = pd.DataFrame({
+        'seq': grouped.loc[valid, 'seq'],
+        'key': keys,
+        'value': grouped.loc[valid, 'value'],
+    })
+    long_df = long_df.drop_duplicates(subset=['seq', 'key'], keep='last')
+    pivoted = long_df.pivot(index='seq', columns='key', values='value')
+    pivoted.columns.name = None
+
+    # parm values override the fixed columns when names collide
+    for col in [col for col in base.columns if col in pivoted.columns]:
+        seqs_with_key = long_df.loc[long_df['key'] == col, 'seq']
+        base[col] = base[col].astype(object)
+        base.loc[seqs_with_key, col] = pivoted.loc[seqs_with_key, col]
+        pivoted = pivoted.drop(columns=col)
+    index_df = base.join(pivoted)
+
+    return index_df.reset_index(drop=True)
+
+
+# Shared formatting objects (created once, reused by every cell)
+YELLOW_FILL = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
+GREEN_FILL = PatternFill(start_color='92D050', end_color='92D050', fill_type='solid')  # Light green
+BLUE_FILL = PatternFill(start_color='00B0F0', end_color='00B0F0', fill_type='solid')
+DEFAULT_FONT = Font(name='等线')
+BOLD_FONT = Font(name='等线', bold=True)
+DEFAULT_INLINE = InlineFont(rFont='等线')
+RED_INLINE = InlineFont(rFont='等线', color='FF0000')
+NO_FILL = PatternFill()
+
+
+def create_rich_text(text, spans):
+    """Create rich text with the given spans highlighted in red"""
+    rich_text_parts = []
+    current_pos = 0
+
+    for start, end in spans:
+        # Add text before the highlighted span
+        if start > current_pos:
+            rich_text_parts.append(TextBlock(DEFAULT_INLINE, text[current_pos:start]))
+        # Add the highlighted span in red
+        rich_text_parts.append(TextBlock(RED_INLINE, text[start:end]))
+        current_pos = end
+
+    # Add remaining text
+    if current_pos < len(text):
+        rich_text_parts.append(TextBlock(DEFAULT_INLINE, text[current_pos:]))
+
+    return CellRichText(*rich_text_parts)
+
+
+# Background fill per rule (see mosaic_rules.DEFAULT_RULES); rules without a
+# fill are reported only
+RULE_FILLS = {
+    'duplicate_program_suffix': YELLOW_FILL,
+    'footnote_gap': GREEN_FILL,
+    'special_characters': GREEN_FILL,
+    'footnote_missing_closing_quote': BLUE_FILL,
+}
+
+
+def plan_index_highlights(index_final, findings):
+    """
+    Turn rule findings into the formatting of every highlighted Index cell
+
+    Findings come in rule order, so later rules win for the same cell:
+    - duplicate PROGRAM+SUFFIX: yellow background on PROGRAM and SUFFIX
+    - empty footnote cells before the last non-empty footnote: green background
+    - red characters (non-latin1 and ''s): rich text, green background
+    - non-empty footnote cells not ending with a double quote: blue background
+      (the red characters of the cell are kept)
+
+    Parameters:
+    -----------
+    index_final : pandas.DataFrame
+        Final Index data (RangeIndex, columns in output order)
+    findings : pandas.DataFrame
+        Output of mosaic_rules.evaluate_rules for index_final
+
+    Returns:
+    --------
+    plan : dict
+        (excel_row, excel_col) -> (spans, fill). Cells with spans are written
+        as rich text; all other data cells use the default font.
+    """
+    plan = {}
+    col_indices = {col_name: idx for idx, col_name in enumerate(index_final.columns, start=1)}
+
+    for rule, data_row_idx, col_name, detail in findings[['rule', 'row', 'column', 'detail']].itertuples(index=False, name=None):
+        fill = RULE_FILLS.get(rule)
+        if fill is None:
+            continue
+        key = (int(data_row_idx) + 2, col_indices[col_name])
+        if rule == 'special_characters':
+            spans = detail
+        else:
+            spans = plan[key][0] if key in plan else []
+        plan[key] = (spans, fill)
+
+    return plan
+
+
+def _excel_value(value):
+    """Convert a DataFrame value to what gets written to a cell (NaN -> empty)"""
+    if pd.isna(value):
+        return None
+    return value
+
+
+def index_cell_format(value, row_idx, col_idx, highlight_plan):
+    """
+    Value, font and fill of one Index data cell
+
+    Returns:
+    --------
+    (value, font, fill) : value is rich text for cells with red spans;
+    font and fill are None where the cell keeps the workbook default
+    """
+    value = _excel_value(value)
+    entry = highlight_plan.get((row_idx, col_idx))
+    if entry is None:
+        # Default: 等线 font
+        return value, DEFAULT_FONT, None
+    spans, fill = entry
+    if spans:
+        return create_rich_text(str(value), spans), None, fill
+    return value, DEFAULT_FONT, fill
+
+
+def _index_header_cells(ws, columns):
+    """Row 1: Headers - bold font, highlight H1:J1 (columns 8, 9, 10)"""
+    header_cells = []
+    for col_idx, col_name in enumerate(columns, start=1):
+        cell = WriteOnlyCell(ws, value=col_name)
+        cell.font = BOLD_FONT
+        if 8 <= col_idx <= 10:
+            cell.fill = YELLOW_FILL
+        header_cells.append(cell)
+    return header_cells
+
+
+def _index_row_cells(ws, row_idx, values, highlight_plan):
+    """Formatted cells of one Index data row"""
+    row_cells = []
+    for col_idx, value in enumerate(values, start=1):
+        value, font, fill = index_cell_format(value, row_idx, col_idx, highlight_plan)
+        cell = WriteOnlyCell(ws, value=value)
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        row_cells.append(cell)
+    return row_cells
+
+
+def write_mosaic_workbook(output_file_path, index_final, df_output, highlight_plan, input_key=None):
+    """
+    Write the formatted Index sheet and the Original sheet in one pass
+
+    Uses an openpyxl write-only workbook: every cell's font, fill and rich
+    text is taken from the highlight plan as its row is emitted, so rows are
+    streamed to disk instead of being built, saved, reloaded and restyled.
+
+    Parameters:
+    -----------
+    output_file_path : str
+        Path to output XLSX file
+    index_final : pandas.DataFrame
+        Final Index data (RangeIndex, columns in output order)
+    df_output : pandas.DataFrame
+        Cleaned raw data for the Original sheet
+    highlight_plan : dict
+        Output of plan_index_highlights
+    input_key : str, optional
+        cache_key() of the input CSV; when given, the state used by
+        incremental_convert is stored in custom document properties
+    """
+    wb = Workbook(write_only=True)
+    if input_key is not None:
+        state = {
+            INPUT_PROPERTY: input_key,
+            ROW_GROUP_PROPERTIES['Index']: encode_row_groups(index_row_groups(index_final, highlight_plan)),
+            ROW_GROUP_PROPERTIES['Original']: encode_row_groups(original_row_groups(df_output)),
+            # Placeholder, set once the sheet XML exists
+            SHEETS_PROPERTY: '-',
+        }
+        for name, value in state.items():
+            wb.custom_doc_props.append(StringProperty(name=name, value=value))
+    ws = wb.create_sheet('Index')
+
+    # Freeze panes at H2
+    ws.freeze_panes = 'H2'
+
+    ws.append(_index_header_cells(ws, index_final.columns))
+
+    # Data rows: header is row 1, data starts at row 2
+    for row_idx, values in enumerate(index_final.itertuples(index=False, name=None), start=2):
+        ws.append(_index_row_cells(ws, row_idx, values, highlight_plan))
+
+    # Write the original data (cleaned), no formatting
+    ws_original = wb.create_sheet('Original')
+    ws_original.append(list(df_output.columns))
+    for values in df_output.itertuples(index=False, name=None):
+        ws_original.append([_excel_value(value) for value in values])
+
+    wb.save(output_file_path)
+
+    if input_key is not None:
+        with XlsxRowPatcher(output_file_path, STATE_SHEETS) as written:
+            written.write(output_file_path, {}, {SHEETS_PROPERTY: format_sheet_crcs(
+                {name: written.sheet_crc(name) for name in STATE_SHEETS}
+            )})
+
+
+def default_output_path(csv_file_path):
+    """Default output path next to the input: <input>_MOSAIC_CONVERT_YYYYMMDD.xlsx"""
+    base_name = os.path.splitext(csv_file_path)[0]
+    date_suffix = datetime.now().strftime('%Y%m%d')
+    return f"{base_name}_MOSAIC_CONVERT_{date_suffix}.xlsx"
+
+
+def build_mosaic_index(csv_file_path):
+    """
+    Read a TiFo CSV file and build the MOSAIC Index data (no Excel output)
     
     Parameters:
     -----------
     csv_file_path : str
         Path to input CSV file
-    output_file_path : str, optional
-        Path to output XLSX file. If None, creates output in same directory with _MOSAIC_CONVERT suffix
+    
+    Returns:
+    --------
+    (df_output, index_final, findings) :
+        cleaned raw data for the Original sheet, final Index data, and the
+        quality rule findings for the Index data (mosaic_rules.evaluate_rules)
     """
     
-    # Read CSV file
-    df = pd.read_csv(csv_file_path)
+    # Read CSV file (single read, encoding detected from the bytes)
+    with stage('read CSV'):
+        df, load_info = read_csv_sniffed(csv_file_path)
+    print(f"Read CSV file with {describe_load(load_info)}")
 
     # Resolve param column name (parm/param)
     if 'parm' in df.columns:
@@ -103,7 +389,8 @@ def mosaic_convert(csv_file_path, output_file_path=None):
     
     # Preprocess: Replace first and last single quotes in title/footnote values
     print("Preprocessing data...")
-    df = preprocess_csv_data(df)
+    with stage('preprocess'):
+        df = preprocess_csv_data(df)
     
     # Get the number of rows
     lrow = len(df)
@@ -138,43 +425,14 @@ def mosaic_convert(csv_file_path, output_file_path=None):
     # Step 6: Create Index dataframe by pivoting the data using seq
     # 1. 使用 seq 将每张图表的多行记录转为一行
     # 2. seq 起始值为 1，每当 param=outfile 时 seq+1
-    seq_values = []
-    seq = 0
-    for param_val in df[param_col].astype(str).fillna(''):
-        if param_val.lower() == 'outfile':
-            seq += 1
-        seq_values.append(seq)
-    df['seq'] = seq_values
-
-    if seq == 0:
-        raise ValueError("Missing required 'outfile' rows to build seq")
-
-    index_data = []
-    for seq_val, group in df.groupby('seq', sort=False):
-        if seq_val == 0:
-            continue
-        group = group.copy()
-
-        row_data = {
-            'sect_num': group['sect_num'].iloc[0],
-            'sect_ttl': group['sect_ttl'].iloc[0],
-            'PROGRAM': group['program'].iloc[0] if pd.notna(group['program'].iloc[0]) else '',
-            'SUFFIX': group['suffix'].iloc[0] if pd.notna(group['suffix'].iloc[0]) else '',
-        }
+    outfile_mask = df[param_col].astype(str).fillna('').str.lower().eq('outfile')
+    df['seq'] = outfile_mask.cumsum()
 
-        for _, row in group.iterrows():
-            param_name = row.get(param_col, None)
-            if pd.isna(param_name) or param_name == '':
-                continue
-            key = str(param_name).strip().lower()
-            # Special handling: Convert 'outfile' to 'OUTFILE' (uppercase)
-            if key == 'outfile':
-                key = 'OUTFILE'
-            row_data[key] = row.get('value', None)
-
-        index_data.append(row_data)
+    if not outfile_mask.any():
+        raise ValueError("Missing required 'outfile' rows to build seq")
 
-    index_df = pd.DataFrame(index_data)
+    with stage('pivot Index'):
+        index_df = build_index_frame(df, param_col)
     
     # Step 7: OUTFILE is now directly from CSV (parm='outfile' -> value)
     # No need to build from PROGRAM + SUFFIX anymore
@@ -279,201 +537,764 @@ def mosaic_convert(csv_file_path, output_file_path=None):
         # Sort by the numeric key
         index_final = index_final.sort_values('_tocnumber_sort_key').drop('_tocnumber_sort_key', axis=1).reset_index(drop=True)
     
+    # Quality rules (duplicate program+suffix, footnotes, special characters) in one pass
+    with stage('quality rules'):
+        findings = evaluate_rules(index_final)
+    if findings['rule'].eq('duplicate_program_suffix').any():
+        print("ERROR: 有图表使用同样的program+suffix,请更新MOSAIC")
+    
+    df_output = df[['sect_num', 'sect_ttl', 'program', 'suffix', param_col, 'value']]
+    return df_output, index_final, findings
+
+
+@stage_timer.run('mosaic_convert')
+def mosaic_convert(csv_file_path, output_file_path=None):
+    """
+    Convert TiFo CSV file to Excel format with MOSAIC processing
+    
+    Parameters:
+    -----------
+    csv_file_path : str
+        Path to input CSV file
+    output_file_path : str, optional
+        Path to output XLSX file. If None, creates output in same directory with _MOSAIC_CONVERT suffix
+    """
+    with stage('build Index'):
+        df_output, index_final, findings = build_mosaic_index(csv_file_path)
+    
     # Step 11: Save to Excel with formatting
     if output_file_path is None:
-        base_name = os.path.splitext(csv_file_path)[0]
-        date_suffix = datetime.now().strftime('%Y%m%d')
-        output_file_path = f"{base_name}_MOSAIC_CONVERT_{date_suffix}.xlsx"
-    
-    # Write to Excel
-    with pd.ExcelWriter(output_file_path, engine='openpyxl') as writer:
-        # Write the Index sheet
-        index_final.to_excel(writer, sheet_name='Index', index=False)
+        output_file_path = default_output_path(csv_file_path)
+    
+    # Step 12: Write Index (formatted) and Original sheets in a single pass
+    with stage('highlight plan'):
+        highlight_plan = plan_index_highlights(index_final, findings)
+    with stage('write workbook'):
+        write_mosaic_workbook(output_file_path, index_final, df_output, highlight_plan,
+                              cache_key(csv_file_path))
+    
+    print(f"OK: Conversion complete! Output file: {output_file_path}")
+    print(f"  - Processed {len(df_output)} rows of raw data")
+    print(f"  - Generated {len(index_final)} rows of index data")
+    
+    return output_file_path
+
+
+def _cell_text(value):
+    """Text of a decoded cell value (see xlsx_patch.decode_cells)"""
+    if value is None:
+        return ''
+    if isinstance(value, tuple):
+        return ''.join(text for text, _ in value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _fingerprint(*parts):
+    """64-bit fingerprint of the repr of parts (salted with RULE_VERSION)"""
+    digest = hashlib.blake2b(f"{RULE_VERSION}\n".encode('utf-8'), digest_size=8)
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def index_row_groups(index_final, highlight_plan):
+    """
+    Fingerprints of the Index sheet rows (header first)
+    
+    Each row is its own group; its fingerprint covers the values and the
+    highlighting, so rows restyled by a cross-row rule count as changed.
+    
+    Returns:
+    --------
+    list : (fingerprint, row count) per group
+    """
+    row_plans = {}
+    for (row_idx, col_idx), (spans, fill) in highlight_plan.items():
+        row_plans.setdefault(row_idx, []).append((col_idx, spans, fill.fgColor.rgb))
+    groups = [(_fingerprint(list(index_final.columns)), 1)]
+    for row_idx, values in enumerate(index_final.itertuples(index=False, name=None), start=2):
+        groups.append((_fingerprint(values, sorted(row_plans.get(row_idx, []))), 1))
+    return groups
+
+
+def original_row_groups(df_output):
+    """
+    Fingerprints of the Original sheet rows: the header, then each run of
+    consecutive rows with the same program and suffix
+    
+    Returns:
+    --------
+    list : (fingerprint, row count) per group
+    """
+    groups = [(_fingerprint(list(df_output.columns)), 1)]
+    program_col = list(df_output.columns).index('program')
+    current = None
+    rows = []
+    for values in df_output.itertuples(index=False, name=None):
+        key = values[program_col:program_col + 2]
+        if rows and key != current:
+            groups.append((_fingerprint(*rows), len(rows)))
+            rows = []
+        current = key
+        rows.append(values)
+    if rows:
+        groups.append((_fingerprint(*rows), len(rows)))
+    return groups
+
+
+def encode_row_groups(groups):
+    """Row group fingerprints as compact text for a document property"""
+    return base64.b64encode(b''.join(struct.pack('<QI', fingerprint, count) for fingerprint, count in groups)).decode('ascii')
+
+
+def decode_row_groups(text):
+    """Inverse of encode_row_groups"""
+    return list(struct.iter_unpack('<QI', base64.b64decode(text, validate=True)))
+
+
+def format_sheet_crcs(crcs):
+    """SHEETS_PROPERTY value for {sheet name: CRC-32 of its XML}"""
+    return ' '.join(f"{name}:{crc:08x}" for name, crc in crcs.items())
+
+
+def _style_lookup(cell_formats):
+    """
+    Map (font, fill) to a workbook's cell format index
+    
+    Parameters:
+    -----------
+    cell_formats : list
+        XlsxRowPatcher.cell_formats() of the workbook
+    
+    Returns:
+    --------
+    function : style_id(font=None, fill=None) -> index, or None when the
+    workbook has no such format (None font/fill = workbook default)
+    """
+    index = {}
+    for idx, cell_format in enumerate(cell_formats):
+        index.setdefault(cell_format, idx)
+    # Fonts and fills are shared module objects, so identity is a cheap key
+    cache = {}
+    
+    def style_id(font=None, fill=None):
+        key = (id(font), id(fill))
+        if key not in cache:
+            cache[key] = index.get((
+                DEFAULT_CELL_FONT if font is None else font,
+                NO_FILL if fill is None else fill,
+            ))
+        return cache[key]
+    
+    return style_id
+
+
+def plan_row_patch(previous_rows, previous_groups, new_groups):
+    """
+    Reuse the rows of unchanged groups of a previous sheet
+    
+    Groups are aligned by fingerprint with difflib, so an added or removed
+    output only shifts the rows after it (their row numbers are rewritten).
+    
+    Parameters:
+    -----------
+    previous_rows : list
+        <row> XML of the previous sheet
+    previous_groups, new_groups : list
+        (fingerprint, row count) per group
+    
+    Returns:
+    --------
+    (rows, to_render, opcodes) : rows has the previous <row> XML at every
+    reused position and None elsewhere; to_render lists those positions;
+    opcodes is the group alignment (difflib.SequenceMatcher.get_opcodes)
+    """
+    if sum(count for _, count in previous_groups) != len(previous_rows):
+        raise RowPatchError("stored row fingerprints do not match the sheet")
+    
+    def starts(groups):
+        positions = [0]
+        for _, count in groups:
+            positions.append(positions[-1] + count)
+        return positions
+    
+    old_starts = starts(previous_groups)
+    new_starts = starts(new_groups)
+    rows = [None] * new_starts[-1]
+    to_render = []
+    matcher = difflib.SequenceMatcher(None, [fingerprint for fingerprint, _ in previous_groups],
+                                      [fingerprint for fingerprint, _ in new_groups], autojunk=False)
+    opcodes = matcher.get_opcodes()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            shift = new_starts[j1] - old_starts[i1]
+            for i in range(old_starts[i1], old_starts[i2]):
+                rows[i + shift] = previous_rows[i] if shift == 0 else renumber_row(previous_rows[i], i + shift + 1)
+        else:
+            to_render.extend(range(new_starts[j1], new_starts[j2]))
+    return rows, to_render, opcodes
+
+
+def diff_index_groups(opcodes, previous_rows, previous_groups, new_groups, index_final):
+    """
+    Report the outputs behind the changed Index rows by OUTFILE
+    
+    Only the previous rows outside the unchanged groups are decoded.
+    
+    Parameters:
+    -----------
+    opcodes : list
+        Index group alignment from plan_row_patch
+    previous_rows : list
+        <row> XML of the previous Index sheet
+    previous_groups, new_groups : list
+        Index row fingerprints (one row per group, header first)
+    index_final : pandas.DataFrame
+        New Index data
+    
+    Returns:
+    --------
+    dict : 'added', 'removed', 'changed' (lists of OUTFILE values) and
+           'order_changed' (bool, unchanged outputs moved to other rows)
+    """
+    previous_header = {_cell_text(value): col_idx for col_idx, _, value in decode_cells(previous_rows[0])}
+    outfile_col = previous_header.get('OUTFILE')
+    new_outfiles = index_final['OUTFILE'].map(lambda value: _cell_text(_excel_value(value))).tolist()
+    
+    # OUTFILE -> fingerprints of its rows outside unchanged groups
+    old = {}
+    new = {}
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            continue
+        for i in range(max(i1, 1), i2):
+            outfile = next((_cell_text(value) for col_idx, _, value in decode_cells(previous_rows[i])
+                            if col_idx == outfile_col), '')
+            old.setdefault(outfile, []).append(previous_groups[i][0])
+        for j in range(max(j1, 1), j2):
+            new.setdefault(new_outfiles[j - 1], []).append(new_groups[j][0])
+    
+    return {
+        'added': [outfile for outfile in new if outfile not in old],
+        'removed': [outfile for outfile in old if outfile not in new],
+        'changed': [outfile for outfile in new if outfile in old and sorted(new[outfile]) != sorted(old[outfile])],
+        'order_changed': any(outfile in old and sorted(new[outfile]) == sorted(old[outfile]) for outfile in new),
+    }
+
+
+def render_rows(index_final, df_output, highlight_plan, index_positions, original_positions, style_id):
+    """
+    Render selected Index and Original rows with openpyxl
+    
+    The rows are written to an in-memory write-only workbook, so cells are
+    serialized exactly like write_mosaic_workbook does, then renumbered and
+    their cell formats mapped to the target workbook.
+    
+    Parameters:
+    -----------
+    index_positions, original_positions : list
+        Sheet rows to render (0 = header, i = data row i - 1)
+    style_id : function
+        _style_lookup of the target workbook
+    
+    Returns:
+    --------
+    (dict, dict) : position -> <row> XML for the Index and Original sheets
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Index')
+    data_positions = [position - 1 for position in index_positions if position > 0]
+    data_rows = iter(index_final.iloc[data_positions].itertuples(index=False, name=None))
+    for position in index_positions:
+        if position == 0:
+            ws.append(_index_header_cells(ws, index_final.columns))
+        else:
+            ws.append(_index_row_cells(ws, position + 1, next(data_rows), highlight_plan))
+    
+    ws_original = wb.create_sheet('Original')
+    data_positions = [position - 1 for position in original_positions if position > 0]
+    data_rows = iter(df_output.iloc[data_positions].itertuples(index=False, name=None))
+    for position in original_positions:
+        if position == 0:
+            ws_original.append(list(df_output.columns))
+        else:
+            ws_original.append([_excel_value(value) for value in next(data_rows)])
+    
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    with XlsxRowPatcher(buffer, ['Index', 'Original']) as rendered:
+        style_map = {}
+        for idx, (font, fill) in enumerate(rendered.cell_formats()):
+            target = style_id(font, fill)
+            if target is not None:
+                style_map[idx] = target
+        rendered_rows = [rendered.rows('Index'), rendered.rows('Original')]
+    
+    return tuple(
+        {
+            position: remap_cell_styles(renumber_row(row, position + 1), style_map)
+            for position, row in zip(positions, rows)
+        }
+        for positions, rows in zip([index_positions, original_positions], rendered_rows)
+    )
+
+
+def print_change_report(changes, original_changed, limit=20):
+    """Print the outputs added/removed/changed by an incremental conversion"""
+    print("\nIncremental change report:")
+    for label in ['added', 'removed', 'changed']:
+        outfiles = changes[label]
+        print(f"  - {label.capitalize()}: {len(outfiles)}")
+        for outfile in outfiles[:limit]:
+            print(f"      {outfile}")
+        if len(outfiles) > limit:
+            print(f"      ... {len(outfiles) - limit} more")
+    if changes['order_changed']:
+        print("  - Row order changed")
+    if original_changed:
+        print("  - Original sheet data changed")
+
+
+def _previous_row_groups(previous, properties):
+    """Validated row group fingerprints stored in a previous output"""
+    try:
+        groups = {name: decode_row_groups(properties[ROW_GROUP_PROPERTIES[name]]) for name in STATE_SHEETS}
+    except (KeyError, ValueError, struct.error):
+        raise RowPatchError("previous output has no row fingerprints") from None
+    crcs = format_sheet_crcs({name: previous.sheet_crc(name) for name in STATE_SHEETS})
+    if properties.get(SHEETS_PROPERTY) != crcs:
+        raise RowPatchError("previous output was modified after it was written")
+    return groups
+
+
+@stage_timer.run('incremental_convert')
+def incremental_convert(csv_file_path, previous_output_path, output_file_path=None):
+    """
+    Re-convert a CSV against a previous output, patching only changed rows
+    
+    Every output stores the hash of its input CSV and RULE_VERSION, one
+    fingerprint per Index row and per program/suffix group of Original
+    rows, and the CRC-32 of both sheets (custom document properties). When
+    the input hash matches and the sheets are untouched, the previous
+    workbook is kept and nothing is converted. Otherwise the new Index is
+    built and only the rows whose fingerprints changed are rendered and
+    spliced into the previous sheet XML; every other row, part and zip
+    member is reused (see xlsx_patch.XlsxRowPatcher). The changed outputs
+    are reported by OUTFILE. Workbooks without valid state (edited after
+    writing, or written before incremental support) are rewritten in full.
+    
+    Parameters:
+    -----------
+    csv_file_path : str
+        Path to input CSV file
+    previous_output_path : str
+        Previously generated MOSAIC_CONVERT XLSX
+    output_file_path : str, optional
+        Path to output XLSX file. If None, the previous output is updated in place
+    
+    Returns:
+    --------
+    (str, dict) : Output file path and the diff_index_groups result (None
+    when the previous output had to be rewritten in full)
+    """
+    if output_file_path is None:
+        output_file_path = previous_output_path
+    input_key = cache_key(csv_file_path)
+    
+    print(f"Comparing with previous output: {previous_output_path}")
+    with XlsxRowPatcher(previous_output_path, STATE_SHEETS) as previous:
+        properties = previous.custom_properties()
+        try:
+            previous_groups = _previous_row_groups(previous, properties)
+        except RowPatchError as e:
+            previous_groups = None
+            reason = str(e)
         
-        # Write the original data (cleaned)
-        df_output = df[['sect_num', 'sect_ttl', 'program', 'suffix', param_col, 'value']].copy()
-        df_output.to_excel(writer, sheet_name='Original', index=False)
-    
-    # Step 12: Apply formatting
-    wb = load_workbook(output_file_path)
-    ws = wb['Index']
-    
-    # Helper function to find all characters that need red highlighting
-    def find_highlight_positions(text):
-        """Find positions of characters that need to be highlighted in red (non-latin1 and ''s)"""
-        if pd.isna(text) or text == '':
-            return []
-        if not isinstance(text, str):
-            return []
+        if previous_groups is not None and properties.get(INPUT_PROPERTY) == input_key:
+            previous.close()
+            _place_file(previous_output_path, output_file_path)
+            print(f"OK: Input CSV and rules unchanged, kept previous output: {output_file_path}")
+            return output_file_path, {'added': [], 'removed': [], 'changed': [], 'order_changed': False}
         
-        positions = set()
+        with stage('build Index'):
+            df_output, index_final, findings = build_mosaic_index(csv_file_path)
+        with stage('highlight plan'):
+            highlight_plan = plan_index_highlights(index_final, findings)
         
-        # Find non-latin1 characters
-        for i, char in enumerate(text):
+        try:
+            if previous_groups is None:
+                raise RowPatchError(reason)
+            with stage('diff previous output'):
+                new_groups = {
+                    'Index': index_row_groups(index_final, highlight_plan),
+                    'Original': original_row_groups(df_output),
+                }
+                previous_rows = {name: previous.rows(name) for name in STATE_SHEETS}
+                patches = {
+                    name: plan_row_patch(previous_rows[name], previous_groups[name], new_groups[name])
+                    for name in STATE_SHEETS
+                }
+                changes = diff_index_groups(patches['Index'][2], previous_rows['Index'],
+                                            previous_groups['Index'], new_groups['Index'], index_final)
+            print_change_report(changes, previous_groups['Original'] != new_groups['Original'])
+            
+            with stage('patch workbook'):
+                style_id = _style_lookup(previous.cell_formats())
+                rendered = render_rows(index_final, df_output, highlight_plan,
+                                       patches['Index'][1], patches['Original'][1], style_id)
+                sheets = {}
+                crcs = {}
+                for name, rendered_rows in zip(STATE_SHEETS, rendered):
+                    rows, _, opcodes = patches[name]
+                    if len(opcodes) == 1 and opcodes[0][0] == 'equal':
+                        # Unchanged sheet: copied as is
+                        crcs[name] = previous.sheet_crc(name)
+                        continue
+                    for position, row in rendered_rows.items():
+                        rows[position] = row
+                    sheets[name] = previous.build_sheet(name, rows)
+                    crcs[name] = zlib.crc32(sheets[name])
+                previous.write(output_file_path, sheets, {
+                    INPUT_PROPERTY: input_key,
+                    ROW_GROUP_PROPERTIES['Index']: encode_row_groups(new_groups['Index']),
+                    ROW_GROUP_PROPERTIES['Original']: encode_row_groups(new_groups['Original']),
+                    SHEETS_PROPERTY: format_sheet_crcs(crcs),
+                })
+            print(f"OK: Incremental conversion complete! Re-rendered {len(patches['Index'][1])} Index and "
+                  f"{len(patches['Original'][1])} Original rows. Output file: {output_file_path}")
+            return output_file_path, changes
+        except RowPatchError as e:
+            print(f"Note: cannot patch the previous output ({e}); writing the full workbook")
+    
+    with stage('write workbook'):
+        write_mosaic_workbook(output_file_path, index_final, df_output, highlight_plan, input_key)
+    print(f"OK: Conversion complete! Output file: {output_file_path}")
+    return output_file_path, None
+
+
+# Bump whenever conversion or formatting rules change, so cached outputs
+# produced by older rules are never reused
+RULE_VERSION = '3.3'
+
+# Custom document properties holding the state incremental_convert compares:
+# cache_key() of the input, row group fingerprints per sheet, sheet XML CRC-32s
+INPUT_PROPERTY = 'MOSAIC_CONVERT_INPUT'
+ROW_GROUP_PROPERTIES = {'Index': 'MOSAIC_CONVERT_INDEX_ROWS', 'Original': 'MOSAIC_CONVERT_ORIGINAL_ROWS'}
+SHEETS_PROPERTY = 'MOSAIC_CONVERT_SHEETS'
+STATE_SHEETS = ['Index', 'Original']
+
+# On-disk cache of generated XLSX files, keyed by input CSV content
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.mosaic_cache')
+DEFAULT_CACHE_MAX_MB = 500
+
+
+def cache_key(csv_file_path):
+    """Hash of the input CSV bytes plus the converter rule version"""
+    digest = hashlib.sha256()
+    digest.update(f"mosaic_convert:{RULE_VERSION}\n".encode('utf-8'))
+    with open(csv_file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _place_file(source_path, target_path, link=False):
+    """Copy (or hard-link, when requested and possible) source_path to target_path"""
+    if os.path.abspath(source_path) == os.path.abspath(target_path):
+        return
+    target_dir = os.path.dirname(os.path.abspath(target_path))
+    os.makedirs(target_dir, exist_ok=True)
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    if link:
+        try:
+            os.link(source_path, target_path)
+            return
+        except OSError:
+            pass  # Different volume or unsupported filesystem: fall back to copy
+    shutil.copyfile(source_path, target_path)
+
+
+def cache_fetch(cache_dir, key, output_file_path, link=False):
+    """
+    Place a cached output at output_file_path if one exists for key
+    
+    Returns:
+    --------
+    bool : True on cache hit
+    """
+    cached_file = os.path.join(cache_dir, f"{key}.xlsx")
+    if not os.path.isfile(cached_file):
+        return False
+    _place_file(cached_file, output_file_path, link=link)
+    # Mark as most recently used for LRU eviction
+    os.utime(cached_file, None)
+    return True
+
+
+def cache_store(cache_dir, key, output_file_path, max_mb=DEFAULT_CACHE_MAX_MB):
+    """Add a freshly generated output to the cache, then evict to the size limit"""
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_file = os.path.join(cache_dir, f"{key}.xlsx")
+    temp_file = f"{cached_file}.{os.getpid()}.tmp"
+    shutil.copyfile(output_file_path, temp_file)
+    os.replace(temp_file, cached_file)
+    evict_cache(cache_dir, max_mb)
+
+
+def evict_cache(cache_dir, max_mb=DEFAULT_CACHE_MAX_MB):
+    """Remove least recently used cache entries until the cache fits in max_mb"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.xlsx'):
+            path = os.path.join(cache_dir, name)
             try:
-                char.encode('latin1')
-            except UnicodeEncodeError:
-                positions.add(i)
-        
-        # Find ''s patterns (two single quotes followed by s)
-        apostrophe_s_pattern = "''s"
-        start = 0
-        while True:
-            pos = text.find(apostrophe_s_pattern, start)
-            if pos == -1:
-                break
-            positions.add(pos)      # first '
-            positions.add(pos + 1)  # second '
-            positions.add(pos + 2)  # s
-            start = pos + 1
-        
-        return sorted(list(positions))
-    
-    def create_rich_text(text, highlight_positions):
-        """Create rich text with specified positions highlighted in red"""
-        if not highlight_positions:
-            return text
-
-        if not isinstance(text, str):
-            return text
-        text_str = text
-        rich_text_parts = []
-        current_pos = 0
-        
-        # Define fonts
-        default_inline = InlineFont(rFont='等线')
-        red_inline = InlineFont(rFont='等线', color='FF0000')
-        
-        for pos in highlight_positions:
-            # Add text before the highlighted char
-            if pos > current_pos:
-                rich_text_parts.append(TextBlock(default_inline, text_str[current_pos:pos]))
-            # Add the highlighted char in red
-            rich_text_parts.append(TextBlock(red_inline, text_str[pos]))
-            current_pos = pos + 1
-        
-        # Add remaining text
-        if current_pos < len(text_str):
-            rich_text_parts.append(TextBlock(default_inline, text_str[current_pos:]))
-        
-        return CellRichText(*rich_text_parts)
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # Evicted by another process since listdir
+            entries.append((stat.st_mtime, stat.st_size, path))
     
-    # Identify duplicate program+suffix combinations
-    prog_suff_keys = index_final[['PROGRAM', 'SUFFIX']].fillna('').astype(str)
-    prog_suff_key_series = prog_suff_keys['PROGRAM'] + '||' + prog_suff_keys['SUFFIX']
-    dup_mask = prog_suff_key_series.duplicated(keep=False)
-    dup_mask = dup_mask & (prog_suff_key_series != '||')
-    dup_rows = set(index_final.index[dup_mask])
+    total_bytes = sum(size for _, size, _ in entries)
+    max_bytes = max_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_bytes -= size
+        except OSError:
+            pass  # Entry in use by another process; try the next one
 
-    if dup_rows:
-        print("ERROR: 有图表使用同样的program+suffix,请更新MOSAIC")
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """Delete every cached output; returns the number of removed entries"""
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith('.xlsx') or name.endswith('.tmp'):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
+
+
+def convert_with_cache(csv_file_path, output_file_path=None, cache_dir=DEFAULT_CACHE_DIR,
+                       max_mb=DEFAULT_CACHE_MAX_MB, link=False):
+    """
+    mosaic_convert with an on-disk output cache
     
-    # Find column indices for tocnumber, PROGRAM, SUFFIX
-    col_indices = {}
-    for idx, col_name in enumerate(index_final.columns, start=1):
-        col_indices[col_name] = idx
-    
-    tocnum_col = col_indices.get('tocnumber')
-    program_col = col_indices.get('PROGRAM')
-    suffix_col = col_indices.get('SUFFIX')
-    footnote_cols = {col_indices[col] for col in index_final.columns if col.startswith('footnote')}
-    
-    # Identify footnote columns with gaps (empty cells before last non-empty footnote)
-    footnote_col_names = [col for col in index_final.columns if col.startswith('footnote')]
-    empty_footnote_cells = set()  # Set of (row_idx, col_idx) tuples for Excel coordinates
-    
-    for data_row_idx in range(len(index_final)):
-        # Get values for all footnote columns in this row
-        footnote_info = []
-        for col_name in footnote_col_names:
-            col_idx = col_indices[col_name]
-            value = index_final.loc[data_row_idx, col_name]
-            is_empty = pd.isna(value) or str(value).strip() == ''
-            footnote_info.append((col_idx, is_empty))
-        
-        # Find the last non-empty footnote column
-        last_non_empty_idx = -1
-        for i in range(len(footnote_info) - 1, -1, -1):
-            col_idx, is_empty = footnote_info[i]
-            if not is_empty:
-                last_non_empty_idx = i
-                break
-        
-        # Mark all empty footnote columns before the last non-empty one
-        if last_non_empty_idx > 0:
-            for i in range(last_non_empty_idx):
-                col_idx, is_empty = footnote_info[i]
-                if is_empty:
-                    # Excel row = data_row_idx + 2 (header is row 1, data starts at row 2)
-                    empty_footnote_cells.add((data_row_idx + 2, col_idx))
-    
-    # Define fill colors and fonts
-    yellow_fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
-    green_fill = PatternFill(start_color='92D050', end_color='92D050', fill_type='solid')  # Light green
-    blue_fill = PatternFill(start_color='00B0F0', end_color='00B0F0', fill_type='solid')
-    default_font = Font(name='等线')
-    bold_font = Font(name='等线', bold=True)
-    
-    # Format all cells
-    for row_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=ws.max_row), start=1):
-        for col_idx, cell in enumerate(row, start=1):
-            # Row 1: Headers - bold font
-            if row_idx == 1:
-                cell.font = bold_font
-                # Highlight H1:J1 (columns 8, 9, 10)
-                if 8 <= col_idx <= 10:
-                    cell.fill = yellow_fill
+    When the same CSV content was already converted with the current
+    RULE_VERSION, the cached XLSX is copied (or hard-linked with link=True)
+    to the output path instead of being regenerated.
+    
+    Returns:
+    --------
+    (str, bool) : Output file path, and whether it came from the cache
+    """
+    if output_file_path is None:
+        output_file_path = default_output_path(csv_file_path)
+    
+    key = cache_key(csv_file_path)
+    if cache_fetch(cache_dir, key, output_file_path, link=link):
+        print(f"OK: Input unchanged, reused cached output: {output_file_path}")
+        return output_file_path, True
+    
+    mosaic_convert(csv_file_path, output_file_path)
+    cache_store(cache_dir, key, output_file_path, max_mb=max_mb)
+    return output_file_path, False
+
+
+def find_csv_files(pattern):
+    """
+    Resolve a directory or glob pattern to a sorted list of CSV files
+    
+    Parameters:
+    -----------
+    pattern : str
+        Directory (all *.csv inside it) or glob pattern, e.g. "delivery/*_TiFo.csv"
+    
+    Returns:
+    --------
+    list : Sorted CSV file paths
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.csv')
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+
+def _convert_one(csv_file_path, cache_options=None):
+    """Worker: convert one CSV, never raise; returns a summary record"""
+    start_time = time.perf_counter()
+    record = {'input': csv_file_path, 'output': '', 'status': 'OK', 'seconds': 0.0, 'error': ''}
+    try:
+        # Keep per-file progress messages out of the shared console
+        with contextlib.redirect_stdout(io.StringIO()):
+            if cache_options is None:
+                record['output'] = mosaic_convert(csv_file_path)
             else:
-                # Data rows
-                cell_value = cell.value
-                
-                # Check if this row has duplicate program+suffix
-                data_row_idx = row_idx - 2  # Convert to 0-based index for index_final
-                is_dup_prog_suff = data_row_idx in dup_rows
-                
-                # Find all characters that need red highlighting (non-latin1 and ''s)
-                text_value = '' if cell_value is None else str(cell_value)
-                highlight_positions = find_highlight_positions(text_value)
-                has_highlight_chars = len(highlight_positions) > 0
-
-                # Check if this is an empty footnote cell with a gap
-                is_empty_footnote_gap = (row_idx, col_idx) in empty_footnote_cells
-
-                # Footnote cells must end with a double quote
-                needs_quote_highlight = (
-                    col_idx in footnote_cols and text_value.strip() != '' and not text_value.rstrip().endswith('"')
-                )
-                
-                # Apply formatting based on conditions
-                if has_highlight_chars:
-                    # Has special chars: create rich text with those chars in red, green background
-                    cell.value = create_rich_text(text_value, highlight_positions)
-                    cell.fill = green_fill
-                elif is_empty_footnote_gap:
-                    # Empty footnote with gap: green background
-                    cell.fill = green_fill
-                    cell.font = default_font
-                elif is_dup_prog_suff and col_idx in [program_col, suffix_col]:
-                    # Duplicate PROGRAM+SUFFIX: yellow fill
-                    cell.fill = yellow_fill
-                    cell.font = default_font
-                else:
-                    # Default: 等线 font
-                    cell.font = default_font
-
-                if needs_quote_highlight:
-                    cell.fill = blue_fill
+                record['output'], hit = convert_with_cache(csv_file_path, **cache_options)
+                if hit:
+                    record['status'] = 'CACHED'
+    except Exception as e:
+        record['status'] = 'ERROR'
+        record['error'] = str(e)
+    record['seconds'] = time.perf_counter() - start_time
+    return record
+
+
+def batch_convert(pattern, workers=None, cache_options=None):
+    """
+    Convert every CSV matched by a directory or glob pattern in parallel
     
-    # Freeze panes at H2
-    ws.freeze_panes = 'H2'
+    Outputs are written next to each input using the default
+    _MOSAIC_CONVERT_YYYYMMDD naming. A failing file is reported in the
+    summary and does not stop the remaining conversions.
     
-    wb.save(output_file_path)
+    Parameters:
+    -----------
+    pattern : str
+        Directory or glob pattern of input CSV files
+    workers : int, optional
+        Number of worker processes (default: CPU count)
+    cache_options : dict, optional
+        Keyword arguments for convert_with_cache; None disables the cache
     
-    print(f"OK: Conversion complete! Output file: {output_file_path}")
-    print(f"  - Processed {len(df)} rows of raw data")
-    print(f"  - Generated {len(index_final)} rows of index data")
+    Returns:
+    --------
+    list : One summary record per input file, in input order
+    """
+    csv_files = find_csv_files(pattern)
+    if not csv_files:
+        print(f"WARN: No CSV files found for: {pattern}")
+        return []
     
-    return output_file_path
+    print(f"Converting {len(csv_files)} CSV file(s) with {workers or os.cpu_count()} worker(s)...")
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_convert_one, path, cache_options): path for path in csv_files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                # Worker process died (e.g. out of memory)
+                record = {'input': path, 'output': '', 'status': 'ERROR', 'seconds': 0.0, 'error': str(e)}
+            results[path] = record
+            print(f"  {record['status']:<6} {os.path.basename(path)}")
+    
+    records = [results[path] for path in csv_files]
+    print_batch_summary(records)
+    return records
+
+
+def print_batch_summary(records):
+    """Print one summary table for a batch run"""
+    name_width = max([len('Input file')] + [len(os.path.basename(r['input'])) for r in records])
+    
+    print("\n" + "=" * 80)
+    print("Batch summary")
+    print("=" * 80)
+    print(f"{'Input file':<{name_width}}  {'Status':<6}  {'Seconds':>8}  Output / Error")
+    print("-" * 80)
+    for r in records:
+        detail = r['error'] if r['status'] == 'ERROR' else os.path.basename(r['output'])
+        print(f"{os.path.basename(r['input']):<{name_width}}  {r['status']:<6}  {r['seconds']:>8.2f}  {detail}")
+    print("-" * 80)
+    failed_count = sum(1 for r in records if r['status'] == 'ERROR')
+    cached_count = sum(1 for r in records if r['status'] == 'CACHED')
+    print(f"Total: {len(records)} file(s), {len(records) - failed_count} OK ({cached_count} from cache), {failed_count} failed")
+    print("=" * 80)
+
+
+def parse_args(argv=None):
+    """Parse headless command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="MOSAIC_CONVERT - convert MOSAIC CSV exports to Index XLSX (headless batch mode)"
+    )
+    parser.add_argument('--batch', metavar='DIR_OR_GLOB',
+                        help="Directory of CSV files or glob pattern, e.g. \"delivery/*.csv\"")
+    parser.add_argument('--input', metavar='CSV',
+                        help="Convert a single CSV file")
+    parser.add_argument('--output', metavar='XLSX',
+                        help="Output file for --input (default: <input>_MOSAIC_CONVERT_YYYYMMDD.xlsx)")
+    parser.add_argument('--incremental', metavar='PREVIOUS_XLSX',
+                        help="With --input: diff against a previous output by OUTFILE and rewrite only if something changed")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Always regenerate outputs, bypassing the output cache")
+    parser.add_argument('--clear-cache', action='store_true',
+                        help="Delete all cached outputs before converting")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help="Output cache directory (default: .mosaic_cache next to this script)")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_CACHE_MAX_MB,
+                        help=f"Cache size limit in MB, least recently used entries are evicted (default: {DEFAULT_CACHE_MAX_MB})")
+    parser.add_argument('--cache-link', action='store_true',
+                        help="Hard-link cached outputs instead of copying them (same volume only)")
+    stage_timer.add_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.batch and args.input:
+        parser.error("--batch and --input cannot be used together")
+    if args.incremental and not args.input:
+        parser.error("--incremental requires --input")
+    if not args.batch and not args.input and not args.clear_cache:
+        parser.error("nothing to do: give --batch, --input and/or --clear-cache")
+    return args
+
+
+def profile_output_path(args):
+    """Output the --profile files are written next to"""
+    if args.input:
+        return args.output or default_output_path(args.input)
+    if args.batch and os.path.isdir(args.batch):
+        return os.path.join(args.batch, 'mosaic_convert_batch')
+    return os.path.join(os.path.dirname(args.batch or '') or '.', 'mosaic_convert_batch')
+
+
+def batch_main(argv=None):
+    """Headless entry point; returns the process exit code"""
+    args = parse_args(argv)
+    stage_timer.enable_from_args(args)
+    
+    with profiling.profile_context(args, profile_output_path(args)):
+        return run_headless(args)
+
+
+def run_headless(args):
+    """Run parsed headless arguments; returns the process exit code"""
+    if args.clear_cache:
+        removed = clear_cache(args.cache_dir)
+        print(f"OK: Cleared {removed} cached output(s) from {args.cache_dir}")
+        if not args.batch and not args.input:
+            return 0
+    
+    cache_options = None
+    if not args.no_cache:
+        cache_options = {'cache_dir': args.cache_dir, 'max_mb': args.cache_max_mb, 'link': args.cache_link}
+    
+    if args.input:
+        try:
+            if args.incremental:
+                result_file, _ = incremental_convert(args.input, args.incremental, args.output)
+            elif cache_options is None:
+                result_file = mosaic_convert(args.input, args.output)
+            else:
+                result_file, _ = convert_with_cache(args.input, args.output, **cache_options)
+        except Exception as e:
+            print(f"ERROR: 转换失败: {e}")
+            return 1
+        with open(".last_output.txt", "w", encoding="utf-8") as f:
+            f.write(result_file)
+        return 0
+    
+    records = batch_convert(args.batch, workers=args.workers, cache_options=cache_options)
+    if not records:
+        return 1
+    return 0 if all(r['status'] != 'ERROR' for r in records) else 1
 
 
 def select_input_file():
@@ -528,6 +1349,10 @@ def select_output_file(default_name="output_MOSAIC_CONVERT.xlsx"):
 
 
 if __name__ == "__main__":
+    # Headless mode: python mosaic_convert.py --batch <dir|glob> | --input <csv> [--incremental <xlsx>]
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
+    
     print("=" * 80)
     print("MOSAIC_CONVERT - CSV转Excel工具")
     print("=" * 80)
@@ -569,7 +1394,7 @@ if __name__ == "__main__":
     print("=" * 80)
     
     try:
-        result_file = mosaic_convert(input_file, output_file)
+        result_file, _ = convert_with_cache(input_file, output_file)
         print("\n" + "=" * 80)
         print("OK: 转换成功！")
         print("=" * 80)
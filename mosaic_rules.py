@@ -0,0 +1,152 @@
+"""
+Rule-based quality checks for the MOSAIC Index data
+
+Each rule declares the columns it needs and is evaluated over whole columns
+of the Index frame. evaluate_rules prepares the shared cell text once, runs
+every rule in order and returns one findings table (rule, row, column,
+severity, detail). mosaic_convert.py turns the findings into cell colors and
+validate_output.py reports them.
+"""
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from latin1_check import NON_LATIN1_PATTERN, scan_characters, offsets_to_spans
+
+
+# Characters highlighted in red: non-latin1 code points and the ''s pattern
+HIGHLIGHT_PATTERN = re.compile(NON_LATIN1_PATTERN.pattern + "|''s")
+
+FOOTNOTE_COLUMNS = [f'footnote{number}' for number in range(1, 10)]
+
+FINDING_COLUMNS = ['rule', 'row', 'column', 'severity', 'detail']
+
+# columns=None means every column of the frame; partial rules also run when
+# only some of their columns exist (e.g. fewer footnote columns)
+Rule = namedtuple('Rule', ['name', 'columns', 'severity', 'check', 'description', 'partial'])
+
+
+class RuleContext:
+    """Index data shared by all rules of one evaluation pass"""
+
+    def __init__(self, frame, columns):
+        self.frame = frame
+        self.columns = columns
+        # Cell text as written to Excel (empty for missing values), built once
+        # Positional row labels so findings refer to 0-based row positions
+        subset = frame[columns].astype(object).reset_index(drop=True)
+        self.text = subset.where(subset.notna(), '').astype(str)
+
+
+def _mask_findings(mask, detail=None):
+    """(row, column, detail) records for the True cells of a boolean DataFrame"""
+    rows, positions = np.nonzero(mask.to_numpy())
+    columns = mask.columns
+    return [(int(row), columns[pos], detail) for row, pos in zip(rows, positions)]
+
+
+def check_duplicate_tocnumber(context, columns):
+    """Non-empty tocnumber used by more than one output"""
+    toc = context.text['tocnumber'].str.strip()
+    duplicated = toc.duplicated(keep=False) & toc.ne('')
+    return [(int(row), 'tocnumber', toc.iat[row]) for row in np.flatnonzero(duplicated.to_numpy())]
+
+
+def check_duplicate_program_suffix(context, columns):
+    """Same PROGRAM+SUFFIX on more than one output (flags both columns)"""
+    key = context.text['PROGRAM'] + '||' + context.text['SUFFIX']
+    duplicated = key.duplicated(keep=False) & key.ne('||')
+    records = []
+    for row in np.flatnonzero(duplicated.to_numpy()):
+        for col_name in ['PROGRAM', 'SUFFIX']:
+            records.append((int(row), col_name, key.iat[row]))
+    return records
+
+
+def check_footnote_gap(context, columns):
+    """Empty footnote cells before the last non-empty footnote of the row"""
+    is_empty = context.text[columns].apply(lambda col: col.str.strip().eq(''))
+    # True where any footnote further right is non-empty
+    later_non_empty = (~is_empty).iloc[:, ::-1].cummax(axis=1).iloc[:, ::-1]
+    later_non_empty = later_non_empty.shift(-1, axis=1, fill_value=False).astype(bool)
+    return _mask_findings(is_empty & later_non_empty)
+
+
+def check_special_characters(context, columns):
+    """Non-latin1 characters and ''s; detail holds the (start, end) spans"""
+    report = scan_characters(context.text, columns, HIGHLIGHT_PATTERN)
+    return [
+        (int(row), col_name, offsets_to_spans(offsets))
+        for row, col_name, _, offsets in report.itertuples(index=False, name=None)
+    ]
+
+
+def check_footnote_closing_quote(context, columns):
+    """Non-empty footnote cells that do not end with a double quote"""
+    stripped = context.text[columns].apply(lambda col: col.str.rstrip())
+    return _mask_findings(stripped.ne('') & ~stripped.apply(lambda col: col.str.endswith('"')))
+
+
+# Evaluation order; later findings on the same cell take precedence for coloring
+DEFAULT_RULES = [
+    Rule('duplicate_tocnumber', ['tocnumber'], 'error', check_duplicate_tocnumber,
+         "tocnumber used by more than one output", False),
+    Rule('duplicate_program_suffix', ['PROGRAM', 'SUFFIX'], 'error', check_duplicate_program_suffix,
+         "PROGRAM+SUFFIX used by more than one output", False),
+    Rule('footnote_gap', FOOTNOTE_COLUMNS, 'warning', check_footnote_gap,
+         "empty footnote before a later non-empty footnote", True),
+    Rule('special_characters', None, 'warning', check_special_characters,
+         "non-latin1 characters or ''s", True),
+    Rule('footnote_missing_closing_quote', FOOTNOTE_COLUMNS, 'warning', check_footnote_closing_quote,
+         "footnote does not end with a double quote", True),
+]
+
+
+def evaluate_rules(frame, rules=DEFAULT_RULES):
+    """
+    Run quality rules over the Index frame in one scheduled pass
+
+    Parameters:
+    -----------
+    frame : pandas.DataFrame
+        Index data
+    rules : list
+        Rule tuples, evaluated in order. A rule is skipped when its columns
+        are missing (partial rules need at least one of them)
+
+    Returns:
+    --------
+    findings : pandas.DataFrame
+        One row per finding, columns FINDING_COLUMNS; row is the 0-based
+        position in frame, findings are in rule order then row order
+    """
+    # Columns needed by any rule, prepared once for all of them
+    rule_columns = []
+    for rule in rules:
+        columns = list(frame.columns) if rule.columns is None else [col for col in rule.columns if col in frame.columns]
+        rule_columns.append(columns)
+    needed = [col for col in frame.columns if any(col in columns for columns in rule_columns)]
+    context = RuleContext(frame, needed)
+
+    records = []
+    for rule, columns in zip(rules, rule_columns):
+        if not columns or (not rule.partial and len(columns) < len(rule.columns)):
+            continue
+        for row, column, detail in rule.check(context, columns):
+            records.append((rule.name, row, column, rule.severity, detail))
+
+    return pd.DataFrame(records, columns=FINDING_COLUMNS)
+
+
+def summarize_findings(findings, rules=DEFAULT_RULES):
+    """
+    Count findings per rule
+
+    Returns:
+    --------
+    list : (rule name, severity, description, count) in rule order
+    """
+    counts = findings['rule'].value_counts()
+    return [(rule.name, rule.severity, rule.description, int(counts.get(rule.name, 0))) for rule in rules]
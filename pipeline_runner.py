@@ -0,0 +1,424 @@
+"""
+Make-like runner for the TLF pipeline scripts
+
+Each stage declares its input and output files:
+
+    MOSAIC CSV -> mosaic_convert -> Index XLSX -> extract_programs -> SAS run script(s)
+                                               -> generate_batch_xml -> batch list XML
+                  people_management + Index XLSX -> fill_tlf_template -> tracker XLSX
+                  tfl_status + tracker XLSX -> fill_tlf_status -> tracker with QC Status
+
+A stage runs only when it is stale: never run, an output is missing, its
+parameters changed, or an input changed since its last successful run
+(modification time and size first, then a SHA-256 of the content, so a
+touched but unchanged file does not trigger a rerun). State is kept in
+.pipeline_state.json next to the Index workbook. Stages whose inputs are
+ready run concurrently in worker processes, e.g. extract_programs,
+fill_tlf_template and generate_batch_xml all start once the Index exists.
+
+Usage:
+    python pipeline_runner.py --csv <TiFo.csv> --index-out <xlsx>
+        [--scripts-out <txt>] [--people <xlsx> --tracker-out <xlsx>]
+        [--status <xlsx> --status-out <xlsx>] [--xml-out <xml>]
+        [--config pipeline.json] [--dry-run] [--force] [--jobs N]
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from mosaic_convert import mosaic_convert, RULE_VERSION
+from extract_programs import analyze_programs, write_run_scripts, split_script_paths, load_runtimes
+from fill_tlf_template import fill_tlf_template
+from fill_tlf_status import fill_tlf_status
+from generate_batch_xml import XMLGenerator, DEFAULT_HEADER, DEFAULT_FILE_LOCATION
+from runtime_store import DEFAULT_DB_PATH
+
+
+STATE_FILE_NAME = '.pipeline_state.json'
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# runner: top-level function taking the Stage (runs in a worker process);
+# params: settings that force a rerun when they change (JSON values)
+Stage = namedtuple('Stage', ['name', 'runner', 'inputs', 'outputs', 'params'])
+
+StageResult = namedtuple('StageResult', ['name', 'status', 'seconds', 'reason', 'log'])
+
+
+def file_hash(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(path, sha256=None):
+    """Modification time, size and content hash of a file"""
+    stat = os.stat(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256 or file_hash(path)}
+
+
+def input_changed(path, recorded):
+    """
+    Compare an input with its recorded signature
+
+    The hash is only computed when modification time or size differ. A file
+    that was touched but has the same content updates recorded in place.
+    """
+    stat = os.stat(path)
+    if recorded and stat.st_mtime_ns == recorded['mtime_ns'] and stat.st_size == recorded['size']:
+        return False
+    sha256 = file_hash(path)
+    if recorded and sha256 == recorded['sha256']:
+        recorded.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        return False
+    return True
+
+
+def stale_reason(stage, record, force=False):
+    """
+    Why a stage has to run
+
+    Parameters:
+    -----------
+    stage : Stage
+    record : dict or None
+        State of the stage's last successful run
+    force : bool
+        Rerun regardless of the state
+
+    Returns:
+    --------
+    str or None : reason, None when the stage is up to date
+    """
+    if force:
+        return "forced"
+    if record is None:
+        return "never run"
+    for path in stage.outputs:
+        if not os.path.exists(path):
+            return f"output missing: {os.path.basename(path)}"
+    if record.get('params') != stage.params:
+        return "parameters changed"
+    if sorted(record.get('inputs', {})) != sorted(stage.inputs):
+        return "inputs changed"
+    for path in stage.inputs:
+        if input_changed(path, record['inputs'][path]):
+            return f"input changed: {os.path.basename(path)}"
+    return None
+
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state, state_path):
+    """Write the state file atomically"""
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, state_path)
+
+
+def run_mosaic_convert(stage):
+    mosaic_convert(stage.inputs[0], stage.outputs[0])
+
+
+def run_extract_programs(stage):
+    program_stats = analyze_programs(stage.inputs[0])
+    if program_stats is None or len(program_stats) == 0:
+        raise RuntimeError("Analysis failed or no valid PROGRAM data found")
+    runtimes = load_runtimes(None, stage.params['runtime_db'], program_stats['PROGRAM'].astype(str))
+    if not write_run_scripts(program_stats, stage.params['script'], stage.params['scripts'],
+                             runtimes, stage.params['order']):
+        raise RuntimeError("Failed to save run script(s)")
+
+
+def run_fill_tlf_template(stage):
+    if not fill_tlf_template(stage.inputs[0], stage.inputs[1], stage.outputs[0]):
+        raise RuntimeError("fill_tlf_template failed")
+
+
+def run_fill_tlf_status(stage):
+    if not fill_tlf_status(stage.inputs[0], stage.inputs[1], stage.outputs[0]):
+        raise RuntimeError("fill_tlf_status failed")
+
+
+def run_generate_batch_xml(stage):
+    if ' ' in stage.params['output_name']:
+        raise ValueError(f"Output filename cannot contain spaces: {stage.params['output_name']}")
+    generator = XMLGenerator(non_latin1_action=stage.params['non_latin1_action'])
+    generator.load_excel(stage.inputs[0])
+    generator.generate_xml(stage.params['header'], stage.params['file_location'], stage.outputs[0],
+                           stage.params['output_name'], stage.params['start_number'])
+
+
+def _execute_stage(stage):
+    """
+    Worker: run one stage with its output captured
+
+    Returns:
+    --------
+    (ok, seconds, log) : never raises
+    """
+    log = io.StringIO()
+    start_time = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log):
+            stage.runner(stage)
+        ok = True
+    except (Exception, SystemExit):
+        # SystemExit: tools abort on fatal input errors
+        log.write(traceback.format_exc())
+        ok = False
+    return ok, time.perf_counter() - start_time, log.getvalue()
+
+
+def build_stages(args):
+    """
+    Declare the stages for parsed arguments
+
+    Returns:
+    --------
+    list : Stage tuples; paths are absolute
+    """
+    def path(value):
+        return os.path.abspath(value) if value else None
+
+    index_file = path(args.index_out)
+    stages = [Stage('mosaic_convert', run_mosaic_convert, [path(args.csv)], [index_file],
+                    {'rule_version': RULE_VERSION})]
+
+    if args.scripts_out:
+        script = path(args.scripts_out)
+        outputs = split_script_paths(script, args.scripts) if args.scripts > 1 else [script]
+        runtime_db = None if args.no_history else path(args.runtime_db)
+        inputs = [index_file] + ([runtime_db] if runtime_db and os.path.exists(runtime_db) else [])
+        stages.append(Stage('extract_programs', run_extract_programs, inputs, outputs, {
+            'script': script, 'scripts': args.scripts, 'order': args.order, 'runtime_db': runtime_db,
+        }))
+
+    if args.tracker_out:
+        stages.append(Stage('fill_tlf_template', run_fill_tlf_template,
+                            [index_file, path(args.people)], [path(args.tracker_out)], {}))
+
+    if args.status_out:
+        stages.append(Stage('fill_tlf_status', run_fill_tlf_status,
+                            [path(args.tracker_out), path(args.status)], [path(args.status_out)], {}))
+
+    if args.xml_out:
+        stages.append(Stage('generate_batch_xml', run_generate_batch_xml, [index_file], [path(args.xml_out)], {
+            'header': args.xml_header,
+            'output_name': args.xml_name or args.xml_header.replace(' ', '_'),
+            'file_location': args.file_location,
+            'start_number': args.start_number,
+            'non_latin1_action': 'continue' if args.allow_non_latin1 else 'abort',
+        }))
+
+    return stages
+
+
+def stage_dependencies(stages):
+    """Stage name -> names of the stages producing its inputs"""
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    return {
+        stage.name: sorted({producers[path] for path in stage.inputs if path in producers} - {stage.name})
+        for stage in stages
+    }
+
+
+def run_stages(stages, state, state_path, force=False, jobs=None, dry_run=False, verbose=False):
+    """
+    Run stale stages in dependency order, independent stages concurrently
+
+    A stage is checked for staleness once all stages it depends on have
+    finished, so a rerun upstream stage whose outputs did not change does
+    not make it stale. Stages depending on a failed stage are blocked.
+
+    Parameters:
+    -----------
+    stages : list
+        Stage tuples (see build_stages)
+    state : dict
+        Stage name -> record of the last successful run; updated in place
+        and saved to state_path after every successful stage
+    force : bool
+        Rerun every stage
+    jobs : int, optional
+        Worker processes (default: CPU count)
+    dry_run : bool
+        Only report which stages would run
+    verbose : bool
+        Print the output of every stage, not only of failed ones
+
+    Returns:
+    --------
+    list : StageResult per stage, in declaration order
+    """
+    dependencies = stage_dependencies(stages)
+    pending = OrderedDict((stage.name, stage) for stage in stages)
+    results = {}
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                deps = dependencies[name]
+                if any(dep in pending or dep in running.values() for dep in deps):
+                    continue
+                del pending[name]
+
+                failed = [dep for dep in deps if results[dep].status in ('ERROR', 'BLOCKED')]
+                missing = [path for path in stage.inputs if not os.path.exists(path)]
+                if failed:
+                    results[name] = StageResult(name, 'BLOCKED', 0.0, f"{', '.join(failed)} failed", '')
+                    continue
+                if dry_run and any(results[dep].status == 'WOULD RUN' for dep in deps):
+                    results[name] = StageResult(name, 'WOULD RUN', 0.0, "upstream stage reruns", '')
+                    continue
+                if missing:
+                    status = 'WOULD RUN' if dry_run else 'ERROR'
+                    results[name] = StageResult(name, status, 0.0, f"input not found: {os.path.basename(missing[0])}", '')
+                    continue
+
+                reason = stale_reason(stage, state.get(name), force)
+                if reason is None:
+                    results[name] = StageResult(name, 'SKIPPED', 0.0, "up to date", '')
+                elif dry_run:
+                    results[name] = StageResult(name, 'WOULD RUN', 0.0, reason, '')
+                else:
+                    print(f"  → {name}: {reason}")
+                    # Input signatures before the run, so edits made while it runs are picked up next time
+                    inputs = {path: file_signature(path) for path in stage.inputs}
+                    future = executor.submit(_execute_stage, stage)
+                    running[future] = name
+                    results[name] = (reason, inputs)
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Circular stage dependencies: {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                stage = next(stage for stage in stages if stage.name == name)
+                reason, inputs = results[name]
+                try:
+                    ok, seconds, log = future.result()
+                except Exception as e:
+                    # Worker process died
+                    ok, seconds, log = False, 0.0, str(e)
+                results[name] = StageResult(name, 'OK' if ok else 'ERROR', seconds, reason, log)
+                print(f"  {'✓' if ok else '✗'} {name} ({seconds:.2f}s)")
+                if verbose or not ok:
+                    print(log)
+                if ok:
+                    state[name] = {
+                        'params': stage.params,
+                        'inputs': inputs,
+                        'outputs': {path: file_signature(path) for path in stage.outputs if os.path.exists(path)},
+                        'finished': datetime.now().isoformat(timespec='seconds'),
+                        'seconds': round(seconds, 3),
+                    }
+                    save_state(state, state_path)
+
+    if not dry_run:
+        # Keep refreshed signatures of touched-but-unchanged inputs
+        save_state(state, state_path)
+    return [results[stage.name] for stage in stages]
+
+
+def print_run_summary(results):
+    """Print one summary table for a runner invocation"""
+    print("\n" + "=" * 80)
+    print("Pipeline summary")
+    print("=" * 80)
+    print(f"{'Stage':<22}  {'Status':<9}  {'Seconds':>8}  Reason")
+    print("-" * 80)
+    for r in results:
+        seconds = f"{r.seconds:8.2f}" if r.status in ('OK', 'ERROR') else f"{'-':>8}"
+        print(f"{r.name:<22}  {r.status:<9}  {seconds}  {r.reason}")
+    print("-" * 80)
+    counts = OrderedDict()
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    print("Total: " + ", ".join(f"{count} {status}" for status, count in counts.items()))
+    print("=" * 80)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments; --config values are used as defaults"""
+    parser = argparse.ArgumentParser(description="Run the stale stages of the TLF pipeline")
+    parser.add_argument('--config', help="JSON file with any of the options below (keys as dest names, e.g. index_out)")
+    parser.add_argument('--csv', help="MOSAIC (TiFo) CSV export")
+    parser.add_argument('--index-out', help="MOSAIC_CONVERT workbook")
+    parser.add_argument('--scripts-out', help="SAS run script")
+    parser.add_argument('--scripts', type=int, default=1, help="Number of load-balanced run scripts (default: 1)")
+    parser.add_argument('--order', choices=['appearance', 'longest'], default='appearance',
+                        help="Program order inside each run script (default: appearance)")
+    parser.add_argument('--runtime-db', default=DEFAULT_DB_PATH,
+                        help="Runtime store used to balance run scripts; an input of extract_programs")
+    parser.add_argument('--no-history', action='store_true', help="Ignore the runtime store")
+    parser.add_argument('--people', help="people_management.xlsx")
+    parser.add_argument('--tracker-out', help="people_management filled from the Index (fill_tlf_template)")
+    parser.add_argument('--status', help="tfl_status.xlsx")
+    parser.add_argument('--status-out', help="Tracker with QC Status filled (fill_tlf_status)")
+    parser.add_argument('--xml-out', help="Batch list XML")
+    parser.add_argument('--xml-header', default=DEFAULT_HEADER, help=f"Batch header text (default: {DEFAULT_HEADER})")
+    parser.add_argument('--xml-name', help="Output PDF filename without .pdf (default: header with '_')")
+    parser.add_argument('--file-location', default=DEFAULT_FILE_LOCATION,
+                        help=f"File location prefix (default: {DEFAULT_FILE_LOCATION})")
+    parser.add_argument('--start-number', type=int, default=2, help="Starting page number (default: 2)")
+    parser.add_argument('--allow-non-latin1', action='store_true',
+                        help="Continue when non-latin1 characters are found in the XML input")
+    parser.add_argument('--state', help=f"State file (default: {STATE_FILE_NAME} next to --index-out)")
+    parser.add_argument('--jobs', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="Rerun every stage")
+    parser.add_argument('--dry-run', action='store_true', help="Only show which stages would run")
+    parser.add_argument('--verbose', action='store_true', help="Print the output of every stage")
+
+    config_args, _ = parser.parse_known_args(argv)
+    if config_args.config:
+        with open(config_args.config, encoding='utf-8') as f:
+            parser.set_defaults(**json.load(f))
+    args = parser.parse_args(argv)
+
+    if not args.csv or not args.index_out:
+        parser.error("--csv and --index-out are required (on the command line or in --config)")
+    if args.tracker_out and not args.people:
+        parser.error("--tracker-out requires --people")
+    if args.status_out and not (args.status and args.tracker_out):
+        parser.error("--status-out requires --status and --tracker-out")
+    return args
+
+
+def main(argv=None):
+    """Command line entry point; returns the process exit code"""
+    args = parse_args(argv)
+    stages = build_stages(args)
+    state_path = args.state or os.path.join(os.path.dirname(os.path.abspath(args.index_out)), STATE_FILE_NAME)
+    state = load_state(state_path)
+
+    print(f"{'Checking' if args.dry_run else 'Running'} {len(stages)} stage(s), state: {state_path}")
+    results = run_stages(stages, state, state_path, args.force, args.jobs, args.dry_run, args.verbose)
+    print_run_summary(results)
+    return 0 if all(r.status not in ('ERROR', 'BLOCKED') for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
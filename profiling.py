@@ -0,0 +1,125 @@
+"""
+Optional profiler hook shared by the command line tools
+
+--profile runs the tool under cProfile and, at the same time, samples the
+call stack of the main thread. Next to the output it writes
+<output>_profile.prof (open with snakeviz or pstats) and
+<output>_profile.collapsed.txt (one "frame;frame;frame count" line per stack,
+the input format of flamegraph.pl and speedscope), and prints the top
+functions by cumulative time.
+
+Only the main process is profiled: --batch and --manifest runs convert in
+worker processes, so profile a single --input run instead.
+"""
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+
+
+DEFAULT_TOP = 25
+
+# Seconds between stack samples for the collapsed-stack file
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+class StackSampler(threading.Thread):
+    """Background thread counting the collapsed call stacks of one thread"""
+
+    def __init__(self, thread_id, interval=DEFAULT_SAMPLE_INTERVAL):
+        super().__init__(name='StackSampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def profile_base(output_path):
+    """Profile file path without extension, next to output_path"""
+    return f"{os.path.splitext(output_path)[0]}_profile"
+
+
+def add_profile_arguments(parser):
+    """Add --profile and --profile-top to an argparse parser"""
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile the run: write <output>_profile.prof and a collapsed-stack file, print the top functions")
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP,
+                        help=f"Functions shown in the profile summary (default: {DEFAULT_TOP})")
+
+
+def write_collapsed(counts, path):
+    """Write stack sample counts in collapsed-stack format"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def profiled(base_path, top=DEFAULT_TOP, interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Profile the enclosed code
+
+    Parameters:
+    -----------
+    base_path : str
+        Output path without extension (.prof and .collapsed.txt are added)
+    top : int
+        Functions printed, by cumulative time
+    interval : float
+        Seconds between stack samples
+    """
+    sampler = StackSampler(threading.get_ident(), interval)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        sampler.stop()
+
+        prof_path = f"{base_path}.prof"
+        collapsed_path = f"{base_path}.collapsed.txt"
+        profiler.dump_stats(prof_path)
+        write_collapsed(sampler.counts, collapsed_path)
+
+        print("\n" + "=" * 80)
+        print(f"Profile: top {top} functions by cumulative time")
+        print("=" * 80)
+        pstats.Stats(profiler, stream=sys.stdout).strip_dirs().sort_stats('cumulative').print_stats(top)
+        print(f"Profile written to: {prof_path}")
+        print(f"Collapsed stacks ({sum(sampler.counts.values())} samples) written to: {collapsed_path}")
+
+
+def profile_context(args, output_path):
+    """
+    profiled() for parsed arguments with --profile, else a no-op context
+
+    Parameters:
+    -----------
+    args : argparse.Namespace
+        Parsed arguments including add_profile_arguments
+    output_path : str
+        Tool output; the profile files are written next to it
+    """
+    if not args.profile:
+        return contextlib.nullcontext()
+    return profiled(profile_base(output_path), args.profile_top)
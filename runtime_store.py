@@ -0,0 +1,226 @@
+"""
+Historical SAS program runtime store
+
+Keeps one row per program run in a local SQLite database (indexed by
+program name) and imports timings from SAS logs. extract_programs.py uses
+the stored runtimes to balance run scripts, order programs longest first
+and predict batch time.
+
+Usage:
+    python runtime_store.py import <log file | folder | glob> [...]
+    python runtime_store.py show [PROGRAM ...]
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.runtime_history.sqlite')
+
+# Median over this many most recent runs per program
+DEFAULT_RECENT_RUNS = 5
+
+# Programs per "WHERE program IN (...)" query (older SQLite builds allow 999 parameters)
+QUERY_CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    program     TEXT NOT NULL,
+    seconds     REAL NOT NULL,
+    recorded_at TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    UNIQUE (program, source, recorded_at)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_program ON runs (program, recorded_at);
+"""
+
+# "real time  0.05 seconds", "real time  1:23.45", "real time  1:02:03.45"
+_REAL_TIME_RE = re.compile(r'^\s*real time\s+((?:\d+:){0,2}\d+(?:\.\d+)?)(?:\s+seconds)?\s*$', re.M)
+_SYSTEM_USED_RE = re.compile(r'NOTE: (?:The )?SAS System used:\s*\n\s*real time\s+((?:\d+:){0,2}\d+(?:\.\d+)?)')
+
+
+def _to_seconds(text):
+    """'1:02:03.45' / '1:23.45' / '0.05' -> seconds"""
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_sas_log(log_file):
+    """
+    Read the run time of a SAS log
+
+    Uses the final "NOTE: The SAS System used: real time" when the session
+    ended normally, otherwise the sum of the step real times.
+
+    Parameters:
+    -----------
+    log_file : str
+        SAS log path; the program name is the file name without extension
+
+    Returns:
+    --------
+    (program, seconds) : seconds is None when the log has no timings
+    """
+    program = os.path.splitext(os.path.basename(log_file))[0]
+    with open(log_file, encoding='latin1') as f:
+        text = f.read()
+
+    total = _SYSTEM_USED_RE.findall(text)
+    if total:
+        return program, _to_seconds(total[-1])
+    steps = _REAL_TIME_RE.findall(text)
+    if steps:
+        return program, sum(_to_seconds(step) for step in steps)
+    return program, None
+
+
+def find_log_files(patterns):
+    """Expand log files, folders (all *.log inside) and glob patterns"""
+    log_files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            log_files.extend(sorted(glob.glob(os.path.join(pattern, '*.log'))))
+        else:
+            log_files.extend(sorted(glob.glob(pattern)) or [pattern])
+    return log_files
+
+
+class RuntimeStore:
+    """SQLite store of program runtimes"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, program, seconds, source='manual', recorded_at=None):
+        """Add one run; the same (program, source, recorded_at) is stored once"""
+        recorded_at = recorded_at or datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO runs (program, seconds, recorded_at, source) VALUES (?, ?, ?, ?)",
+                (program, float(seconds), recorded_at, source),
+            )
+
+    def import_logs(self, log_files):
+        """
+        Import SAS log timings
+
+        A log is identified by its path and modification time, so importing
+        the same log twice adds nothing and a rerun adds a new run.
+
+        Returns:
+        --------
+        (imported, skipped) : counts of new runs stored and logs without timings
+        """
+        rows = []
+        skipped = 0
+        for log_file in log_files:
+            program, seconds = parse_sas_log(log_file)
+            if seconds is None:
+                skipped += 1
+                continue
+            recorded_at = datetime.fromtimestamp(os.path.getmtime(log_file)).isoformat(timespec='seconds')
+            rows.append((program, seconds, recorded_at, os.path.abspath(log_file)))
+
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO runs (program, seconds, recorded_at, source) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return self.conn.total_changes - before, skipped
+
+    def estimates(self, recent=DEFAULT_RECENT_RUNS, programs=None):
+        """
+        Expected runtime per program
+
+        Parameters:
+        -----------
+        recent : int
+            Number of most recent runs per program to take the median of
+        programs : iterable, optional
+            Programs to look up (default: all stored programs)
+
+        Returns:
+        --------
+        dict : program -> seconds (programs without runs are left out)
+        """
+        # Newest runs first per program via the window function; a program
+        # filter is applied inside the window so the (program, recorded_at)
+        # index limits the scan to the requested programs
+        query = """
+            SELECT program, seconds FROM (
+                SELECT program, seconds,
+                       ROW_NUMBER() OVER (PARTITION BY program ORDER BY recorded_at DESC) AS run
+                FROM runs{where}
+            ) WHERE run <= ?
+        """
+        if programs is None:
+            runs = pd.read_sql_query(query.format(where=''), self.conn, params=[recent])
+        else:
+            programs = list(dict.fromkeys(str(program) for program in programs))
+            chunks = [
+                pd.read_sql_query(
+                    query.format(where=f" WHERE program IN ({', '.join('?' * len(chunk))})"),
+                    self.conn,
+                    params=[*chunk, recent],
+                )
+                for chunk in (programs[i:i + QUERY_CHUNK_SIZE] for i in range(0, len(programs), QUERY_CHUNK_SIZE))
+            ]
+            if not chunks:
+                return {}
+            runs = pd.concat(chunks, ignore_index=True)
+        return runs.groupby('program')['seconds'].median().to_dict()
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Historical SAS program runtime store")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="SQLite database path")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="Import timings from SAS logs")
+    import_parser.add_argument('logs', nargs='+', help="Log files, folders or glob patterns")
+    show_parser = commands.add_parser('show', help="Show expected runtime per program")
+    show_parser.add_argument('programs', nargs='*', help="Programs to show (default: all)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with RuntimeStore(args.db) as store:
+        if args.command == 'import':
+            log_files = find_log_files(args.logs)
+            imported, skipped = store.import_logs(log_files)
+            print(f"OK: Imported {imported} log(s), {skipped} without timings ({args.db})")
+            return 0
+
+        estimates = store.estimates(programs=args.programs or None)
+        programs = args.programs or sorted(estimates)
+        print(f"{'PROGRAM':<30} {'Expected seconds':>18}")
+        print("-" * 50)
+        for program in programs:
+            seconds = estimates.get(program)
+            print(f"{program:<30} {'-' if seconds is None else f'{seconds:.1f}':>18}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
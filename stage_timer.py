@@ -0,0 +1,222 @@
+"""
+Per-stage timing and memory instrumentation for the pipeline scripts
+
+Wrap a tool run in run(name) and its steps in stage(name). When enabled,
+each stage records wall time, CPU time and peak traced memory
+(tracemalloc); at the end of the run a stage breakdown table is printed and
+optionally written as a JSON trace. When disabled, stage() returns a shared
+no-op context manager.
+
+Enable with the environment variable TLF_STAGE_TIMING=1 (or =time to skip
+memory tracing, which slows allocation-heavy code), or with the
+--stage-timing flag of the command line tools. TLF_STAGE_TRACE=<path> also
+writes the JSON trace (a folder gets one file per run).
+"""
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime
+
+
+ENABLE_ENV_VAR = 'TLF_STAGE_TIMING'
+TRACE_ENV_VAR = 'TLF_STAGE_TRACE'
+
+StageRecord = namedtuple('StageRecord', ['name', 'depth', 'start', 'wall_seconds', 'cpu_seconds', 'peak_bytes'])
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _State:
+    """Instrumentation settings and the records of the current run"""
+
+    def __init__(self):
+        setting = os.environ.get(ENABLE_ENV_VAR, '').strip().lower()
+        self.enabled = setting not in ('', '0', 'false', 'no', 'off')
+        self.memory = setting != 'time'
+        self.trace_path = os.environ.get(TRACE_ENV_VAR) or None
+        self.records = []
+        self.run_depth = 0
+        self.run_start = 0.0
+        # Peak traced memory seen so far by each open stage (innermost last)
+        self.open_peaks = []
+
+
+_state = _State()
+
+
+def enable(memory=True, trace_path=None):
+    """
+    Turn instrumentation on for this process and the processes it starts
+
+    Parameters:
+    -----------
+    memory : bool
+        Also record peak memory with tracemalloc
+    trace_path : str, optional
+        JSON trace file, or folder for one trace file per run
+    """
+    _state.enabled = True
+    _state.memory = memory
+    os.environ[ENABLE_ENV_VAR] = '1' if memory else 'time'
+    if trace_path:
+        _state.trace_path = trace_path
+        os.environ[TRACE_ENV_VAR] = trace_path
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def add_arguments(parser):
+    """Add --stage-timing and --stage-trace to an argparse parser"""
+    parser.add_argument('--stage-timing', action='store_true',
+                        help="Print wall/CPU time and peak memory per stage (see stage_timer.py)")
+    parser.add_argument('--stage-trace', metavar='JSON',
+                        help="With --stage-timing: also write the stage records as JSON (file or folder)")
+
+
+def enable_from_args(args):
+    """Enable instrumentation if --stage-timing was given (see add_arguments)"""
+    if args.stage_timing:
+        enable(trace_path=args.stage_trace)
+
+
+def _traced_peak():
+    """Peak traced memory since the last reset (0 when not tracing)"""
+    return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+
+@contextlib.contextmanager
+def _timed_stage(name):
+    depth = len(_state.open_peaks)
+    if _state.open_peaks:
+        _state.open_peaks[-1] = max(_state.open_peaks[-1], _traced_peak())
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    _state.open_peaks.append(0)
+    record_index = len(_state.records)
+    _state.records.append(None)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        peak = max(_state.open_peaks.pop(), _traced_peak())
+        if _state.open_peaks:
+            _state.open_peaks[-1] = max(_state.open_peaks[-1], peak)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        _state.records[record_index] = StageRecord(
+            name, depth, wall_start - _state.run_start, wall, cpu, max(peak - start_memory, 0)
+        )
+
+
+def stage(name):
+    """
+    Context manager timing one stage (no-op when instrumentation is off)
+
+    Stages nest; records are shown indented under their parent stage.
+    """
+    if not _state.enabled:
+        return _NULL_STAGE
+    return _timed_stage(name)
+
+
+@contextlib.contextmanager
+def run(name):
+    """
+    Mark one tool run (also usable as a decorator)
+
+    The outermost run collects the stages inside it and prints the stage
+    breakdown when it ends, also on errors. Nested runs (a tool called by
+    another tool) are shown as a stage of the outer run.
+    """
+    if not _state.enabled:
+        yield
+        return
+    if _state.run_depth > 0:
+        with stage(name):
+            yield
+        return
+
+    _state.records = []
+    _state.open_peaks = []
+    _state.run_depth = 1
+    _state.run_start = time.perf_counter()
+    started_tracing = _state.memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        _state.run_depth = 0
+        if started_tracing:
+            tracemalloc.stop()
+        records = [record for record in _state.records if record is not None]
+        print_stage_table(name, records, _state.memory)
+        if _state.trace_path:
+            path = write_trace(name, records, _state.trace_path)
+            print(f"Stage trace written to: {path}")
+
+
+def print_stage_table(run_name, records, memory=True):
+    """Print the stage breakdown of one run"""
+    print("\n" + "=" * 80)
+    print(f"Stage breakdown: {run_name}")
+    print("=" * 80)
+    print(f"{'Stage':44s} {'Wall s':>10s} {'CPU s':>10s} {'Peak MB':>10s}")
+    print("-" * 80)
+    for record in records:
+        label = ("  " * record.depth + record.name)[:44]
+        peak = f"{record.peak_bytes / 1024 / 1024:10.1f}" if memory else f"{'-':>10s}"
+        print(f"{label:44s} {record.wall_seconds:10.3f} {record.cpu_seconds:10.3f} {peak}")
+    top_level = [record for record in records if record.depth == 0]
+    print("-" * 80)
+    total_peak = max((record.peak_bytes for record in top_level), default=0)
+    peak = f"{total_peak / 1024 / 1024:10.1f}" if memory else f"{'-':>10s}"
+    print(f"{'Total (top-level stages)':44s} {sum(record.wall_seconds for record in top_level):10.3f} "
+          f"{sum(record.cpu_seconds for record in top_level):10.3f} {peak}")
+    print("=" * 80)
+
+
+def write_trace(run_name, records, trace_path):
+    """
+    Write the stage records of one run as JSON
+
+    Parameters:
+    -----------
+    trace_path : str
+        Trace file, or an existing folder for <run>_<timestamp>.json files
+
+    Returns:
+    --------
+    str : path written
+    """
+    if os.path.isdir(trace_path):
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        trace_path = os.path.join(trace_path, f"{run_name}_{stamp}_{os.getpid()}.json")
+    data = {
+        'run': run_name,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'pid': os.getpid(),
+        'stages': [
+            {
+                'name': record.name,
+                'depth': record.depth,
+                'start_seconds': round(record.start, 6),
+                'wall_seconds': round(record.wall_seconds, 6),
+                'cpu_seconds': round(record.cpu_seconds, 6),
+                'peak_bytes': record.peak_bytes,
+            }
+            for record in records
+        ],
+    }
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return trace_path
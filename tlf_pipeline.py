@@ -0,0 +1,337 @@
+"""
+Headless library API for the whole TLF pipeline
+
+Run by hand, the steps are chained through .bat files and .last_output.txt
+and every step rereads the XLSX written by the previous one. Here each
+stage takes and returns in-memory data, and files are written only at the
+requested endpoints:
+
+    mosaic = convert_mosaic(csv_file)                    # MosaicIndex
+    write_mosaic_index(mosaic, index_xlsx)               # optional endpoint
+    program_stats = extract_program_stats(mosaic)        # -> extract_programs.write_run_scripts
+    tracker = merge_tracker(mosaic, people_file)         # fill_tlf_template
+    tracker = merge_status(tracker, status_file)         # fill_tlf_status
+    write_tracker(tracker, tracker_xlsx)
+    write_batch_xml(mosaic, xml_file)                    # generate_batch_xml
+
+run_pipeline chains the stages in one process and parses each input once.
+
+Usage:
+    python tlf_pipeline.py --csv <TiFo.csv> [--index-out <xlsx>]
+        [--scripts-out <txt> [--scripts N]]
+        [--people <people_management.xlsx> [--status <tfl_status.xlsx>] --tracker-out <xlsx>]
+        [--xml-out <xml> [--xml-header TEXT] [--xml-name NAME]]
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+import profiling
+import stage_timer
+from stage_timer import stage
+from mosaic_convert import build_mosaic_index, plan_index_highlights, write_mosaic_workbook
+from extract_programs import summarize_programs, write_run_scripts, load_runtimes
+from fill_tlf_template import build_merge_frame, match_people, fill_target_sheet, MATCH_TIERS, PEOPLE_COLUMNS
+from fill_tlf_status import merge_qc_status, QC_STATUS_COL, COMPARISON_TO_QC
+from generate_batch_xml import XMLGenerator, DEFAULT_HEADER, DEFAULT_FILE_LOCATION
+from runtime_store import DEFAULT_DB_PATH
+
+
+# original: cleaned CSV rows (Original sheet); index: Index data as built
+# (written to the Index sheet); findings: mosaic_rules findings; index_read:
+# the Index data as the downstream tools read it back from the XLSX
+MosaicIndex = namedtuple('MosaicIndex', ['original', 'index', 'findings', 'index_read'])
+
+# workbook: loaded people_management workbook (written by write_tracker);
+# frame: merged TLF rows; qc_stats: merge_qc_status counts, None before merge_status
+Tracker = namedtuple('Tracker', ['workbook', 'sheet', 'frame', 'tier_masks',
+                                 'unmatched_rows', 'fallback_rows', 'qc_stats'])
+
+
+def index_frame_as_read(index_final):
+    """
+    Index data as pd.read_excel returns it from the written Index sheet
+
+    Empty strings are not stored in the sheet, so they become NaN, and
+    all-empty columns become float columns.
+    """
+    frame = index_final.reset_index(drop=True).astype(object)
+    frame = frame.where(frame.notna() & frame.ne(''), np.nan)
+    return frame.infer_objects()
+
+
+def sheet_frame(ws, header_row):
+    """
+    DataFrame of a loaded worksheet with the header in header_row
+
+    Same column naming as pd.read_excel: missing headers become
+    'Unnamed: n' and repeated headers get '.1', '.2' suffixes.
+    """
+    rows = list(ws.iter_rows(min_row=header_row, values_only=True))
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    if not rows:
+        return pd.DataFrame()
+
+    header = []
+    seen = {}
+    for position, name in enumerate(rows[0]):
+        name = f"Unnamed: {position}" if name is None else name
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        header.append(name)
+    frame = pd.DataFrame(rows[1:], columns=header)
+    return frame.fillna(np.nan).infer_objects()
+
+
+def convert_mosaic(csv_file):
+    """
+    MOSAIC_CONVERT stage: read the TiFo CSV and build the Index data
+
+    Returns:
+    --------
+    MosaicIndex
+    """
+    original, index_final, findings = build_mosaic_index(csv_file)
+    return MosaicIndex(original, index_final, findings, index_frame_as_read(index_final))
+
+
+def write_mosaic_index(mosaic, output_file):
+    """Write the formatted MOSAIC_CONVERT workbook (Index and Original sheets)"""
+    with stage('highlight plan'):
+        highlight_plan = plan_index_highlights(mosaic.index, mosaic.findings)
+    with stage('write workbook'):
+        write_mosaic_workbook(output_file, mosaic.index, mosaic.original, highlight_plan)
+    return output_file
+
+
+def extract_program_stats(mosaic):
+    """extract_programs stage: per-PROGRAM statistics (see summarize_programs)"""
+    return summarize_programs(mosaic.index_read)
+
+
+def merge_tracker(mosaic, people_file):
+    """
+    fill_tlf_template stage: merge the Index data into the people_management TLF rows
+
+    The people_management workbook is loaded once; the people data is read
+    from the loaded sheet, and write_tracker saves the same workbook.
+
+    Returns:
+    --------
+    Tracker
+    """
+    with stage('read people_management'):
+        wb = load_workbook(people_file)
+        sheet = 'TLF' if 'TLF' in wb.sheetnames else wb.sheetnames[0]
+        people_df = sheet_frame(wb[sheet], header_row=2)
+        # Formula cells hold their formula text here; use the cached values instead
+        used = [col for col in MATCH_TIERS + PEOPLE_COLUMNS if col in people_df.columns]
+        if people_df[used].map(lambda value: isinstance(value, str) and value.startswith('=')).any().any():
+            people_df = pd.read_excel(people_file, sheet_name=sheet, header=1, engine='openpyxl')
+    print(f"✓ '{sheet}' sheet: {len(people_df)} rows, {len(people_df.columns)} columns")
+
+    frame = build_merge_frame(mosaic.index_read)
+    with stage('cascade match'):
+        tier_masks, unmatched_rows, fallback_rows = match_people(frame, people_df)
+    for key, mask in tier_masks.items():
+        print(f"  ✓ {key} matched - {int(mask.sum())} rows")
+    print(f"  - Unmatched (yellow): {len(unmatched_rows)} rows, fallback tier (green): {len(fallback_rows)} rows")
+    return Tracker(wb, sheet, frame, tier_masks, unmatched_rows, fallback_rows, None)
+
+
+def merge_status(tracker, status_file):
+    """
+    fill_tlf_status stage: map tfl_status Comparison Status onto the tracker rows
+
+    Returns:
+    --------
+    Tracker : with the QC Status column in frame and qc_stats set
+    """
+    headers = [cell.value for cell in tracker.workbook[tracker.sheet][2]]
+    if QC_STATUS_COL not in headers:
+        raise ValueError(f"'{QC_STATUS_COL}' column not found in '{tracker.sheet}' sheet")
+
+    with stage('read tfl_status'):
+        status_df = pd.read_excel(status_file, sheet_name='Overview')
+    missing = [col for col in ['Dataset', 'Comparison Status'] if col not in status_df.columns]
+    if missing:
+        raise ValueError(f"Missing columns in Overview sheet of tfl_status file: {', '.join(missing)}")
+    status_df['QC Status'] = status_df['Comparison Status'].replace(COMPARISON_TO_QC)
+
+    with stage('merge QC status'):
+        frame, stats = merge_qc_status(tracker.frame.copy(), status_df)
+    print(f"  ✓ QC Status matched {stats['matched']}/{stats['total']} rows "
+          f"(Pass {stats['pass']}, Fail {stats['fail']}, empty {stats['empty']})")
+    return tracker._replace(frame=frame, qc_stats=stats)
+
+
+def write_tracker(tracker, output_file):
+    """Write the merged TLF rows into the people_management workbook and save it"""
+    fill_target_sheet(tracker.workbook[tracker.sheet], tracker.frame,
+                      tracker.unmatched_rows, tracker.fallback_rows)
+    with stage('save workbook'):
+        tracker.workbook.save(output_file)
+    return output_file
+
+
+def write_batch_xml(mosaic, output_path, header_text=DEFAULT_HEADER, output_name=None,
+                    file_location=DEFAULT_FILE_LOCATION, start_number=2, non_latin1_action='abort'):
+    """
+    generate_batch_xml stage: write the batch list XML from the Index data
+
+    Parameters:
+    -----------
+    output_name : str, optional
+        Output PDF filename without .pdf (default: header with '_')
+    non_latin1_action : str
+        'continue' or 'abort' when non-latin1 characters are found
+    """
+    output_name = output_name or header_text.replace(' ', '_')
+    if ' ' in output_name:
+        raise ValueError(f"Output filename cannot contain spaces: {output_name}")
+    generator = XMLGenerator(non_latin1_action=non_latin1_action)
+    generator.load_frame(mosaic.index_read)
+    return generator.generate_xml(header_text, file_location, output_path, output_name, start_number)
+
+
+@stage_timer.run('tlf_pipeline')
+def run_pipeline(csv_file, index_output=None, script_output=None, n_scripts=1, runtimes=None,
+                 people_file=None, status_file=None, tracker_output=None, xml_output=None,
+                 xml_header=DEFAULT_HEADER, xml_name=None, file_location=DEFAULT_FILE_LOCATION,
+                 non_latin1_action='abort', runtime_db=None):
+    """
+    Run the pipeline in one process, writing only the requested outputs
+
+    Parameters:
+    -----------
+    csv_file : str
+        MOSAIC (TiFo) CSV export
+    index_output : str, optional
+        MOSAIC_CONVERT workbook
+    script_output, n_scripts, runtimes :
+        SAS run script(s), see extract_programs.write_run_scripts
+    runtime_db : str, optional
+        Runtime store read for the converted programs when runtimes is None
+    people_file, status_file, tracker_output : str, optional
+        people_management input, tfl_status input (optional) and the filled
+        tracker workbook
+    xml_output, xml_header, xml_name, file_location, non_latin1_action :
+        Batch list XML, see write_batch_xml
+
+    Returns:
+    --------
+    dict : output kind -> path(s) written
+    """
+    outputs = {}
+
+    print("[1] Converting MOSAIC CSV...")
+    with stage('convert MOSAIC'):
+        mosaic = convert_mosaic(csv_file)
+    print(f"✓ {len(mosaic.index)} outputs from {len(mosaic.original)} CSV rows")
+    if index_output:
+        with stage('write Index workbook'):
+            outputs['index'] = write_mosaic_index(mosaic, index_output)
+        print(f"✓ Index workbook: {index_output}")
+
+    if script_output:
+        print("\n[2] Generating SAS run script(s)...")
+        with stage('extract programs'):
+            program_stats = extract_program_stats(mosaic)
+            if runtimes is None and runtime_db:
+                runtimes = load_runtimes(None, runtime_db, program_stats['PROGRAM'].astype(str))
+            outputs['scripts'] = write_run_scripts(program_stats, script_output, n_scripts, runtimes)
+        if not outputs['scripts']:
+            raise RuntimeError(f"Failed to write run script(s): {script_output}")
+
+    if tracker_output:
+        print("\n[3] Filling people_management tracker...")
+        with stage('fill tracker'):
+            tracker = merge_tracker(mosaic, people_file)
+            if status_file:
+                tracker = merge_status(tracker, status_file)
+            outputs['tracker'] = write_tracker(tracker, tracker_output)
+        print(f"✓ Tracker workbook: {tracker_output}")
+
+    if xml_output:
+        print("\n[4] Generating batch list XML...")
+        outputs['xml'] = str(write_batch_xml(mosaic, xml_output, xml_header, xml_name,
+                                             file_location, non_latin1_action=non_latin1_action))
+
+    return outputs
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Run the TLF pipeline (MOSAIC_CONVERT, extract_programs, fill_tlf_template, "
+                    "fill_tlf_status, generate_batch_xml) in one process"
+    )
+    parser.add_argument('--csv', required=True, help="MOSAIC (TiFo) CSV export")
+    parser.add_argument('--index-out', help="Write the MOSAIC_CONVERT workbook")
+    parser.add_argument('--scripts-out', help="Write the SAS run script(s)")
+    parser.add_argument('--scripts', type=int, default=1, help="Number of load-balanced run scripts (default: 1)")
+    parser.add_argument('--runtime-db', default=DEFAULT_DB_PATH,
+                        help="Runtime store used to balance run scripts (see runtime_store.py)")
+    parser.add_argument('--no-history', action='store_true', help="Ignore the runtime store")
+    parser.add_argument('--people', help="people_management.xlsx to fill")
+    parser.add_argument('--status', help="tfl_status.xlsx with the QC comparison results")
+    parser.add_argument('--tracker-out', help="Write the filled people_management workbook")
+    parser.add_argument('--xml-out', help="Write the batch list XML")
+    parser.add_argument('--xml-header', default=DEFAULT_HEADER, help=f"Batch header text (default: {DEFAULT_HEADER})")
+    parser.add_argument('--xml-name', help="Output PDF filename without .pdf (default: header with '_')")
+    parser.add_argument('--file-location', default=DEFAULT_FILE_LOCATION,
+                        help=f"File location prefix (default: {DEFAULT_FILE_LOCATION})")
+    parser.add_argument('--allow-non-latin1', action='store_true',
+                        help="Continue when non-latin1 characters are found in the XML input")
+    stage_timer.add_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not any([args.index_out, args.scripts_out, args.tracker_out, args.xml_out]):
+        parser.error("nothing to write: give --index-out, --scripts-out, --tracker-out and/or --xml-out")
+    if args.tracker_out and not args.people:
+        parser.error("--tracker-out requires --people")
+    if args.status and not args.tracker_out:
+        parser.error("--status requires --tracker-out")
+    return args
+
+
+def main(argv=None):
+    """Command line driver; returns the process exit code"""
+    args = parse_args(argv)
+    stage_timer.enable_from_args(args)
+
+    first_output = args.index_out or args.scripts_out or args.tracker_out or args.xml_out
+    try:
+        with profiling.profile_context(args, first_output):
+            outputs = run_pipeline(
+                args.csv, args.index_out, args.scripts_out, args.scripts, None,
+                args.people, args.status, args.tracker_out, args.xml_out,
+                args.xml_header, args.xml_name, args.file_location,
+                'continue' if args.allow_non_latin1 else 'abort',
+                None if args.no_history else args.runtime_db,
+            )
+    except Exception as e:
+        print(f"\nERROR: Pipeline failed: {e}")
+        return 1
+
+    print("\n" + "=" * 80)
+    print("OK: Pipeline complete")
+    print("=" * 80)
+    for kind, paths in outputs.items():
+        for path in paths if isinstance(paths, list) else [paths]:
+            print(f"  - {kind}: {os.path.abspath(path)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,122 +2,270 @@
 Validation script for MOSAIC_CONVERT output
 """
 import pandas as pd
+import numpy as np
 import os
+import sys
+import json
+import argparse
+from collections import namedtuple
+from openpyxl import load_workbook
 
+from mosaic_rules import evaluate_rules, summarize_findings
 
-def validate_mosaic_output(excel_file):
+
+REQUIRED_COLUMNS = ['sect_num', 'sect_ttl', 'PROGRAM', 'SUFFIX', 'outtype',
+                    'azsolid', 'Core', 'tocnumber', 'Output Type (Table, Listing, Figure)',
+                    'Title', 'OUTFILE']
+
+# Columns whose completeness must reach COMPLETENESS_THRESHOLD percent
+QUALITY_COLUMNS = ['sect_num', 'sect_ttl', 'PROGRAM', 'SUFFIX', 'outtype', 'azsolid',
+                   'tocnumber', 'Output Type (Table, Listing, Figure)', 'Title']
+COMPLETENESS_THRESHOLD = 95
+
+SAMPLE_COLUMNS = ['sect_num', 'PROGRAM', 'SUFFIX', 'Output Type (Table, Listing, Figure)', 'Title']
+
+ValidationResult = namedtuple('ValidationResult', [
+    'file',              # validated path
+    'passed',            # True when every check meets expectations
+    'error',             # fatal problem (missing file/sheet/columns), else None
+    'sheets',            # worksheet names
+    'rows',              # Index data rows
+    'columns',           # Index column count
+    'missing_columns',   # required columns not present
+    'completeness',      # list of {'column', 'count', 'total', 'pct', 'status'}
+    'output_types',      # Output Type -> row count
+    'empty_titles',      # rows with empty Title
+    'sample',            # first rows of SAMPLE_COLUMNS (DataFrame)
+    'rule_counts',       # list of {'rule', 'severity', 'description', 'count'} (mosaic_rules)
+])
+
+
+def read_index_sheet(excel_file):
+    """
+    Open the workbook once (read-only, values only) and read the Index sheet
+    
+    Returns:
+    --------
+    (sheet_names, df_index) : df_index is None if there is no Index sheet
+    """
+    wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        sheet_names = wb.sheetnames
+        if 'Index' not in sheet_names:
+            return sheet_names, None
+        
+        ws = wb['Index']
+        ws.reset_dimensions()
+        rows = list(ws.iter_rows(values_only=True))
+    finally:
+        wb.close()
+    
+    # Drop trailing empty rows, as pd.read_excel does
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    if not rows:
+        return sheet_names, pd.DataFrame()
+    
+    header = [f"Unnamed: {position}" if name is None else name for position, name in enumerate(rows[0])]
+    df_index = pd.DataFrame(rows[1:], columns=header)
+    # Missing cells as NaN and numeric columns as numbers, matching pd.read_excel
+    df_index = df_index.fillna(np.nan).infer_objects()
+    return sheet_names, df_index
+
+
+def run_validation(excel_file):
     """
-    Validate Excel file generated by MOSAIC_CONVERT
+    Validate Excel file generated by MOSAIC_CONVERT without printing
     
     Parameters:
     -----------
     excel_file : str
         Path to the generated Excel file
+    
+    Returns:
+    --------
+    ValidationResult
     """
+    result = dict.fromkeys(ValidationResult._fields)
+    result.update(file=excel_file, passed=False, sheets=[], missing_columns=[],
+                  completeness=[], output_types={}, empty_titles=0, rule_counts=[])
     
     if not os.path.exists(excel_file):
-        print(f"ERROR: File not found {excel_file}")
-        return False
+        result['error'] = f"File not found {excel_file}"
+        return ValidationResult(**result)
+    
+    sheet_names, df_index = read_index_sheet(excel_file)
+    result['sheets'] = sheet_names
+    if df_index is None:
+        result['error'] = "'Index' worksheet not found"
+        return ValidationResult(**result)
+    
+    result['rows'] = len(df_index)
+    result['columns'] = len(df_index.columns)
     
+    result['missing_columns'] = [col for col in REQUIRED_COLUMNS if col not in df_index.columns]
+    if result['missing_columns']:
+        result['error'] = f"Missing required columns: {result['missing_columns']}"
+        return ValidationResult(**result)
+    
+    # Completeness of every quality column in one pass
+    total = len(df_index)
+    counts = df_index[QUALITY_COLUMNS].notna().sum()
+    for col, count in counts.items():
+        pct = (count / total * 100) if total > 0 else 0
+        result['completeness'].append({
+            'column': col,
+            'count': int(count),
+            'total': total,
+            'pct': float(pct),
+            'status': "OK" if pct >= COMPLETENESS_THRESHOLD else "WARN",
+        })
+    
+    output_type_counts = df_index['Output Type (Table, Listing, Figure)'].value_counts()
+    result['output_types'] = {otype: int(count) for otype, count in output_type_counts.items()}
+    result['empty_titles'] = int((df_index['Title'].isna() | (df_index['Title'] == '')).sum())
+    result['sample'] = df_index[SAMPLE_COLUMNS].head(3)
+    
+    # Same Index rules as mosaic_convert, all in one pass
+    findings = evaluate_rules(df_index)
+    result['rule_counts'] = [
+        {'rule': name, 'severity': severity, 'description': description, 'count': count}
+        for name, severity, description, count in summarize_findings(findings)
+    ]
+    result['passed'] = all(check['status'] == "OK" for check in result['completeness'])
+    
+    return ValidationResult(**result)
+
+
+def print_validation(result):
+    """
+    Print a ValidationResult in the standard report layout
+    """
+    if result.error and not result.sheets:
+        print(f"ERROR: {result.error}")
+        return
+    
+    print("=" * 80)
+    print(f"Validating file: {os.path.basename(result.file)}")
     print("=" * 80)
-    print(f"Validating file: {os.path.basename(excel_file)}")
+    
+    print(f"\nOK: File opened successfully")
+    print(f"  Worksheet list: {result.sheets}")
+    
+    if result.rows is None:
+        print(f"\nERROR: {result.error}")
+        return
+    
+    print(f"\nOK: Index worksheet:")
+    print(f"  - Rows: {result.rows}")
+    print(f"  - Columns: {result.columns}")
+    
+    if result.missing_columns:
+        print(f"\nERROR: {result.error}")
+        return
+    print(f"  OK: All required columns present")
+    
+    # Data quality check
+    print(f"\nOK: Data quality check:")
+    for check in result.completeness:
+        print(f"  {check['status']} {check['column']:40s}: {check['count']:3d}/{check['total']:3d} ({check['pct']:5.1f}%)")
+    
+    # Output Type distribution
+    print(f"\nOK: Output Type distribution:")
+    for otype, count in result.output_types.items():
+        print(f"  - {otype:10s}: {count:3d}")
+    
+    if result.empty_titles > 0:
+        print(f"\nWARN: {result.empty_titles} rows have empty Title")
+    
+    # Rule findings (reported only, completeness decides pass/fail)
+    flagged = [rule for rule in result.rule_counts if rule['count'] > 0]
+    if flagged:
+        print(f"\nWARN: Rule checks:")
+        for rule in flagged:
+            level = "ERROR" if rule['severity'] == 'error' else "WARN"
+            print(f"  {level} {rule['description']:50s}: {rule['count']:3d} cell(s)")
+    else:
+        print(f"\nOK: Rule checks: no findings")
+    
+    # Display sample data
+    print(f"\nOK: Data sample (first 3 rows):")
+    print(result.sample.to_string(index=False))
+    
+    # Summary
+    print("\n" + "=" * 80)
+    if result.passed:
+        print("OK: Validation passed! All checks meet expectations.")
+    else:
+        print(f"WARN: Validation complete, but some columns have data completeness below {COMPLETENESS_THRESHOLD}%.")
     print("=" * 80)
+
+
+def result_to_json(result, path=None):
+    """
+    Serialize a ValidationResult as JSON (sample as a list of records)
+    
+    Parameters:
+    -----------
+    result : ValidationResult
+    path : str, optional
+        If given, the JSON is also written to this file (UTF-8)
+    
+    Returns:
+    --------
+    str : JSON text
+    """
+    data = result._asdict()
+    if result.sample is not None:
+        sample = result.sample.astype(object)
+        data['sample'] = sample.where(sample.notna(), None).to_dict(orient='records')
+    text = json.dumps(data, ensure_ascii=False, indent=2, default=str)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return text
+
+
+def validate_mosaic_output(excel_file):
+    """
+    Validate Excel file generated by MOSAIC_CONVERT and print the report
+    
+    Parameters:
+    -----------
+    excel_file : str
+        Path to the generated Excel file
     
+    Returns:
+    --------
+    bool : True if validation passed
+    """
     try:
-        # Read worksheet
-        xl = pd.ExcelFile(excel_file)
-        print(f"\nOK: File opened successfully")
-        print(f"  Worksheet list: {xl.sheet_names}")
-        
-        # Validate Index worksheet
-        if 'Index' not in xl.sheet_names:
-            print(f"\nERROR: 'Index' worksheet not found")
-            return False
-        
-        df_index = pd.read_excel(excel_file, sheet_name='Index')
-        
-        print(f"\nOK: Index worksheet:")
-        print(f"  - Rows: {len(df_index)}")
-        print(f"  - Columns: {len(df_index.columns)}")
-        
-        # Validate required columns
-        required_cols = ['sect_num', 'sect_ttl', 'PROGRAM', 'SUFFIX', 'outtype', 
-                         'azsolid', 'Core', 'tocnumber', 'Output Type (Table, Listing, Figure)', 
-                         'Title', 'OUTFILE']
-        
-        missing_cols = [col for col in required_cols if col not in df_index.columns]
-        
-        if missing_cols:
-            print(f"\nERROR: Missing required columns: {missing_cols}")
-            return False
-        else:
-            print(f"  OK: All required columns present")
-        
-        # Data quality check
-        print(f"\nOK: Data quality check:")
-        
-        quality_checks = {
-            'sect_num': lambda x: x.notna().sum(),
-            'sect_ttl': lambda x: x.notna().sum(),
-            'PROGRAM': lambda x: x.notna().sum(),
-            'SUFFIX': lambda x: x.notna().sum(),
-            'outtype': lambda x: x.notna().sum(),
-            'azsolid': lambda x: x.notna().sum(),
-            'tocnumber': lambda x: x.notna().sum(),
-            'Output Type (Table, Listing, Figure)': lambda x: x.notna().sum(),
-            'Title': lambda x: x.notna().sum(),
-        }
-        
-        all_passed = True
-        for col, check_func in quality_checks.items():
-            count = check_func(df_index[col])
-            total = len(df_index)
-            pct = (count / total * 100) if total > 0 else 0
-            status = "OK" if pct >= 95 else "WARN"
-            print(f"  {status} {col:40s}: {count:3d}/{total:3d} ({pct:5.1f}%)")
-            if pct < 95:
-                all_passed = False
-        
-        # Output Type distribution
-        print(f"\nOK: Output Type distribution:")
-        output_type_counts = df_index['Output Type (Table, Listing, Figure)'].value_counts()
-        for otype, count in output_type_counts.items():
-            print(f"  - {otype:10s}: {count:3d}")
-        
-        # Check for empty Titles
-        empty_titles = df_index[df_index['Title'].isna() | (df_index['Title'] == '')].shape[0]
-        if empty_titles > 0:
-            print(f"\nWARN: {empty_titles} rows have empty Title")
-        
-        # Display sample data
-        print(f"\nOK: Data sample (first 3 rows):")
-        sample_cols = ['sect_num', 'PROGRAM', 'SUFFIX', 'Output Type (Table, Listing, Figure)', 'Title']
-        print(df_index[sample_cols].head(3).to_string(index=False))
-        
-        # Summary
-        print("\n" + "=" * 80)
-        if all_passed:
-            print("OK: Validation passed! All checks meet expectations.")
-        else:
-            print("WARN: Validation complete, but some columns have data completeness below 95%.")
-        print("=" * 80)
-        
-        return all_passed
-        
+        result = run_validation(excel_file)
     except Exception as e:
         print(f"\nERROR: Error during validation: {e}")
         import traceback
         traceback.print_exc()
         return False
+    
+    print_validation(result)
+    return result.passed
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Validate MOSAIC_CONVERT output")
+    parser.add_argument('file', nargs='?', help="Excel file (default: path in .last_output.txt)")
+    parser.add_argument('--json', dest='json_path', help="Also write the result as JSON to this file")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    import sys
+    args = parse_args()
     
     # Check command line arguments
-    if len(sys.argv) > 1:
+    if args.file:
         # Use file path provided via command line
-        target_file = sys.argv[1]
+        target_file = args.file
     else:
         # Try reading latest generated file path from .last_output.txt (UTF-8 encoding)
         script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -136,7 +284,19 @@ if __name__ == "__main__":
             target_file = os.path.join(script_dir, "02_output", "2026-02-09", "Clinical Study Report_TiFo_MOSAIC_CONVERT.xlsx")
     
     if target_file and os.path.exists(target_file):
-        validate_mosaic_output(target_file)
+        try:
+            result = run_validation(target_file)
+        except Exception as e:
+            print(f"\nERROR: Error during validation: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+        print_validation(result)
+        if args.json_path:
+            result_to_json(result, args.json_path)
+            print(f"Result written to: {args.json_path}")
+        sys.exit(0 if result.passed else 1)
     else:
         print(f"ERROR: File not found {target_file if target_file else '(not specified)'}")
-        print(f"Usage: python validate_output.py [file path]")
+        print(f"Usage: python validate_output.py [file path] [--json result.json]")
+        sys.exit(1)
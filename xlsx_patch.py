@@ -0,0 +1,669 @@
+"""
+Column and row patching of XLSX worksheets
+
+Rewrites cells or rows directly in the worksheet XML inside the XLSX zip.
+Every other part (other sheets, styles, shared strings, formulas) is copied
+as its stored compressed bytes, so saving costs the patched sheets' XML
+instead of a full openpyxl load/save of the workbook.
+XlsxColumnPatcher is used by fill_tlf_status.py to write the QC Status
+column; XlsxRowPatcher by the incremental mode of mosaic_convert.py.
+"""
+import copy
+import html
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from collections import deque
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.xml.functions import fromstring
+
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+DOC_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Worksheet XML is matched on bytes; optional namespace prefix (e.g. "x:") is kept
+_SHEET_DATA_RE = re.compile(rb'<(?P<p>(?:\w+:)?)sheetData\b[^>]*?(?P<empty>/?)>')
+_ROW_RE = re.compile(rb'<(?P<p>(?:\w+:)?)row\b(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</(?P=p)row>)', re.S)
+_CELL_RE = re.compile(rb'<(?P<p>(?:\w+:)?)c\b(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</(?P=p)c>)', re.S)
+_ROW_NUM_RE = re.compile(rb'\br="(\d+)"')
+_CELL_REF_RE = re.compile(rb'\br="([A-Z]+)(\d+)"')
+_STYLE_RE = re.compile(rb'\bs="(\d+)"')
+_TYPE_RE = re.compile(rb'\bt="(\w+)"')
+_SPANS_RE = re.compile(rb'\s+spans="[^"]*"')
+_VALUE_RE = re.compile(rb'<(?:\w+:)?v>(.*?)</(?:\w+:)?v>', re.S)
+_TEXT_RE = re.compile(rb'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', re.S)
+_PHONETIC_RE = re.compile(rb'<(?P<p>(?:\w+:)?)rPh\b.*?</(?P=p)rPh>', re.S)
+_RUN_RE = re.compile(rb'<(?P<p>(?:\w+:)?)r>(?P<body>.*?)</(?P=p)r>', re.S)
+_COLOR_RGB_RE = re.compile(rb'<(?:\w+:)?color\b[^>]*?\brgb="(\w+)"')
+_FORMULA_RE = re.compile(rb'<(?:\w+:)?f\b')
+_CELL_TAG_RE = re.compile(rb'<(?:\w+:)?c\b[^>]*>')
+# Row number / cell reference inside a <row> or <c> start tag (not in cell text)
+_ROW_REF_RE = re.compile(rb'(<(?:\w+:)?(?:row|c)\b[^>]*?\br="[A-Z]*)\d+"')
+_DIMENSION_RE = re.compile(rb'(<(?:\w+:)?dimension\b[^>]*?\bref="[A-Z]+\d+:[A-Z]+)\d+"')
+
+# General purpose flag bit 3: CRC and sizes follow the data instead of the local header
+_DATA_DESCRIPTOR_FLAG = 0x08
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ColumnPatchError(Exception):
+    """Worksheet layout the patcher does not handle (callers fall back to openpyxl)"""
+
+
+class RowPatchError(Exception):
+    """Workbook content XlsxRowPatcher does not handle (callers write the full workbook)"""
+
+
+def copy_member_raw(source, zout, info):
+    """
+    Append one zip member to zout without decompressing it
+
+    The stored compressed bytes are copied unchanged behind a rebuilt local
+    header. zipfile has no public raw-copy API, so the writer bookkeeping of
+    ZipFile.open(mode='w') (file list, central directory offset) is repeated
+    here.
+
+    Parameters:
+    -----------
+    source : file
+        Source zip opened in binary mode
+    zout : zipfile.ZipFile
+        Destination opened for writing
+    info : zipfile.ZipInfo
+        Member of the source zip
+    """
+    source.seek(info.header_offset)
+    header = source.read(zipfile.sizeFileHeader)
+    if header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+
+    member = copy.copy(info)
+    # Sizes and CRC are known, so they go into the local header
+    member.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    zout.fp.seek(zout.start_dir)
+    member.header_offset = zout.fp.tell()
+    zout.fp.write(member.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.read(min(remaining, COPY_CHUNK_SIZE))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated data for {info.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+
+    zout.start_dir = zout.fp.tell()
+    zout.filelist.append(member)
+    zout.NameToInfo[member.filename] = member
+    zout._didModify = True
+
+
+def write_patched_parts(xlsx_path, output_path, parts):
+    """
+    Write a copy of an XLSX file with some parts replaced
+
+    Only the replaced parts are compressed; every other member is copied
+    with copy_member_raw.
+
+    Parameters:
+    -----------
+    xlsx_path : str
+        Source workbook
+    output_path : str
+        Destination workbook (may be the source file)
+    parts : dict
+        Zip path -> new content (bytes) of each replaced part
+    """
+    temp_path = f"{output_path}.tmp"
+    try:
+        with open(xlsx_path, 'rb') as source, zipfile.ZipFile(source) as zin, \
+                zipfile.ZipFile(temp_path, 'w') as zout:
+            for info in zin.infolist():
+                if info.filename in parts:
+                    zout.writestr(copy.copy(info), parts[info.filename])
+                else:
+                    copy_member_raw(source, zout, info)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class XlsxColumnPatcher:
+    """Read one worksheet's XML from an XLSX file and write a patched copy"""
+
+    def __init__(self, xlsx_path, sheet_name):
+        """
+        Parameters:
+        -----------
+        xlsx_path : str
+            Source workbook
+        sheet_name : str
+            Worksheet to patch
+        """
+        self.xlsx_path = xlsx_path
+        self.sheet_name = sheet_name
+
+        with zipfile.ZipFile(xlsx_path) as zf:
+            self.sheet_part, self.shared_strings_part = self._resolve_parts(zf)
+            self.sheet_xml = zf.read(self.sheet_part)
+
+        if self.sheet_xml.startswith((b'\xff\xfe', b'\xfe\xff')):
+            raise ColumnPatchError("UTF-16 worksheet XML is not supported")
+
+        match = _SHEET_DATA_RE.search(self.sheet_xml)
+        if not match:
+            raise ColumnPatchError(f"No sheetData in worksheet '{sheet_name}'")
+        self._prefix = match.group('p')
+        if match.group('empty'):
+            self._data_start = self._data_end = match.end()
+            self._empty_data = True
+        else:
+            self._data_start = match.end()
+            self._data_end = self.sheet_xml.index(b'</' + self._prefix + b'sheetData>', self._data_start)
+            self._empty_data = False
+
+    def _resolve_parts(self, zf):
+        """Find the zip paths of the worksheet and the shared strings table"""
+        workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+        rel_id = None
+        for sheet in workbook.iter(f'{{{MAIN_NS}}}sheet'):
+            if sheet.get('name') == self.sheet_name:
+                rel_id = sheet.get(f'{{{DOC_REL_NS}}}id')
+                break
+        if rel_id is None:
+            raise KeyError(f"Worksheet {self.sheet_name} does not exist.")
+
+        sheet_part = None
+        shared_strings_part = None
+        rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                part = target.lstrip('/')
+            else:
+                part = posixpath.normpath(posixpath.join('xl', target))
+            if rel.get('Id') == rel_id:
+                sheet_part = part
+            elif rel.get('Type', '').endswith('/sharedStrings'):
+                shared_strings_part = part
+
+        if sheet_part is None:
+            raise ColumnPatchError(f"Relationship {rel_id} for worksheet '{self.sheet_name}' not found")
+        return sheet_part, shared_strings_part
+
+    def _shared_strings(self, indices):
+        """Read shared strings up to the highest requested index"""
+        if not indices or self.shared_strings_part is None:
+            return {}
+        wanted = set(indices)
+        last = max(wanted)
+        strings = {}
+        si_tag = f'{{{MAIN_NS}}}si'
+        with zipfile.ZipFile(self.xlsx_path) as zf, zf.open(self.shared_strings_part) as f:
+            position = 0
+            for _, element in ET.iterparse(f):
+                if element.tag != si_tag:
+                    continue
+                if position in wanted:
+                    # Plain <t> or rich text runs <r><t>; phonetic <rPh> is not cell text
+                    parts = []
+                    for child in element:
+                        if child.tag == f'{{{MAIN_NS}}}t':
+                            parts.append(child.text or '')
+                        elif child.tag == f'{{{MAIN_NS}}}r':
+                            parts.extend(t.text or '' for t in child.iter(f'{{{MAIN_NS}}}t'))
+                    strings[position] = ''.join(parts)
+                element.clear()
+                if position >= last:
+                    break
+                position += 1
+        return strings
+
+    def _iter_rows(self):
+        """Yield (row_number, match) for every <row> in sheetData"""
+        for match in _ROW_RE.finditer(self.sheet_xml, self._data_start, self._data_end):
+            row_number = _ROW_NUM_RE.search(match.group('attrs'))
+            if not row_number:
+                raise ColumnPatchError("Row without 'r' attribute")
+            yield int(row_number.group(1)), match
+
+    def headers(self, header_row):
+        """
+        Read the header row
+
+        Parameters:
+        -----------
+        header_row : int
+            1-based Excel row holding the headers
+
+        Returns:
+        --------
+        dict : header text -> 1-based column index (later duplicates win,
+        empty headers skipped)
+        """
+        cells = []
+        for row_number, match in self._iter_rows():
+            if row_number < header_row:
+                continue
+            if row_number == header_row and match.group('body'):
+                for cell in _CELL_RE.finditer(match.group('body')):
+                    ref = _CELL_REF_RE.search(cell.group('attrs'))
+                    if not ref:
+                        raise ColumnPatchError("Cell without 'r' attribute")
+                    cells.append((column_index_from_string(ref.group(1).decode()), cell))
+            break
+
+        shared_indices = []
+        raw = []
+        for col_idx, cell in cells:
+            cell_type = _TYPE_RE.search(cell.group('attrs'))
+            cell_type = cell_type.group(1) if cell_type else b'n'
+            body = cell.group('body') or b''
+            if cell_type == b'inlineStr':
+                body = _PHONETIC_RE.sub(b'', body)
+                text = b''.join(_TEXT_RE.findall(body))
+                raw.append((col_idx, html.unescape(text.decode('utf-8'))))
+                continue
+            value = _VALUE_RE.search(body)
+            if not value:
+                continue
+            value = html.unescape(value.group(1).decode('utf-8'))
+            if cell_type == b's':
+                shared_indices.append(int(value))
+                raw.append((col_idx, int(value)))
+            else:
+                raw.append((col_idx, value))
+
+        shared = self._shared_strings(shared_indices)
+        headers = {}
+        for col_idx, value in raw:
+            text = shared.get(value, '') if isinstance(value, int) else value
+            if text:
+                headers[text] = col_idx
+        return headers
+
+    def _cell_xml(self, prefix, ref, style, value):
+        """Build a cell element; value None leaves only the style"""
+        style_attr = b' s="' + style + b'"' if style else b''
+        if value is None:
+            return b'<' + prefix + b'c r="' + ref + b'"' + style_attr + b'/>'
+        space = b' xml:space="preserve"' if value != value.strip() else b''
+        text = escape(value).encode('utf-8')
+        return (
+            b'<' + prefix + b'c r="' + ref + b'"' + style_attr + b' t="inlineStr"><'
+            + prefix + b'is><' + prefix + b't' + space + b'>' + text + b'</'
+            + prefix + b't></' + prefix + b'is></' + prefix + b'c>'
+        )
+
+    def _patch_row(self, match, row_number, col_idx, value):
+        """Return the row XML with the target cell replaced or inserted"""
+        prefix = match.group('p')
+        attrs = match.group('attrs')
+        body = match.group('body') or b''
+        ref = get_column_letter(col_idx).encode() + str(row_number).encode()
+
+        for cell in _CELL_RE.finditer(body):
+            cell_ref = _CELL_REF_RE.search(cell.group('attrs'))
+            if not cell_ref:
+                raise ColumnPatchError("Cell without 'r' attribute")
+            cell_col = column_index_from_string(cell_ref.group(1).decode())
+            if cell_col < col_idx:
+                continue
+            if cell_col == col_idx:
+                if re.search(rb'<(?:\w+:)?f\b', cell.group('body') or b''):
+                    raise ColumnPatchError(f"Cell {ref.decode()} holds a formula")
+                style = _STYLE_RE.search(cell.group('attrs'))
+                new_cell = self._cell_xml(prefix, ref, style.group(1) if style else None, value)
+                body = body[:cell.start()] + new_cell + body[cell.end():]
+            elif value is not None:
+                body = body[:cell.start()] + self._cell_xml(prefix, ref, None, value) + body[cell.start():]
+                attrs = _SPANS_RE.sub(b'', attrs)
+            break
+        else:
+            if value is None:
+                return match.group(0)
+            body += self._cell_xml(prefix, ref, None, value)
+            attrs = _SPANS_RE.sub(b'', attrs)
+
+        return b'<' + prefix + b'row' + attrs + b'>' + body + b'</' + prefix + b'row>'
+
+    def patch(self, output_path, col_idx, values, first_row):
+        """
+        Write a copy of the workbook with one column replaced
+
+        Parameters:
+        -----------
+        output_path : str
+            Destination workbook (may be the source file)
+        col_idx : int
+            1-based column to write
+        values : list
+            Cell values from first_row down; None clears the cell (its style
+            is kept), anything else is written as text
+        first_row : int
+            1-based Excel row of values[0]
+
+        Returns:
+        --------
+        int : number of rows written
+        """
+        pending = {
+            first_row + offset: (None if value is None else str(value))
+            for offset, value in enumerate(values)
+        }
+        if self._empty_data and any(value is not None for value in pending.values()):
+            raise ColumnPatchError(f"Worksheet '{self.sheet_name}' has no rows")
+
+        order = deque(sorted(pending))
+
+        def new_rows(upto):
+            # Rows missing from the sheet are created in row order
+            pieces = []
+            while order and order[0] < upto:
+                row_number = order.popleft()
+                if row_number not in pending:
+                    continue
+                value = pending.pop(row_number)
+                if value is not None:
+                    ref = get_column_letter(col_idx).encode() + str(row_number).encode()
+                    pieces.append(
+                        b'<' + self._prefix + b'row r="' + str(row_number).encode() + b'">'
+                        + self._cell_xml(self._prefix, ref, None, value)
+                        + b'</' + self._prefix + b'row>'
+                    )
+            return pieces
+
+        pieces = [self.sheet_xml[:self._data_start]]
+        position = self._data_start
+        for row_number, match in self._iter_rows():
+            if not pending:
+                break
+            pieces.append(self.sheet_xml[position:match.start()])
+            pieces.extend(new_rows(row_number))
+            if row_number in pending:
+                pieces.append(self._patch_row(match, row_number, col_idx, pending.pop(row_number)))
+            else:
+                pieces.append(match.group(0))
+            position = match.end()
+        pieces.append(self.sheet_xml[position:self._data_end])
+        pieces.extend(new_rows(float('inf')))
+        pieces.append(self.sheet_xml[self._data_end:])
+        patched_xml = b''.join(pieces)
+
+        write_patched_parts(self.xlsx_path, output_path, {self.sheet_part: patched_xml})
+        return len(values)
+
+
+def _part_path(base_dir, target):
+    """Zip path of a relationship target"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def _related_part(zf, rels_part, base_dir, type_suffix):
+    """Zip path of the first relationship of a type, or None"""
+    if rels_part not in zf.namelist():
+        return None
+    rels = ET.fromstring(zf.read(rels_part))
+    for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+        if rel.get('Type', '').endswith(type_suffix):
+            return _part_path(base_dir, rel.get('Target', ''))
+    return None
+
+
+def decode_cells(row_xml):
+    """
+    Decode the cells of one <row> element
+
+    Handles the cell types openpyxl writes in write-only mode: numbers and
+    inline strings (plain or rich text). Shared strings, formulas and other
+    types raise RowPatchError.
+
+    Parameters:
+    -----------
+    row_xml : bytes
+        <row> element
+
+    Returns:
+    --------
+    list : (column index, style index, value) per cell; value is None for
+    an empty cell, float, str, or a tuple of (text, color rgb or None)
+    runs for rich text
+    """
+    cells = []
+    for cell in _CELL_RE.finditer(row_xml):
+        attrs = cell.group('attrs')
+        body = cell.group('body') or b''
+        ref = _CELL_REF_RE.search(attrs)
+        if not ref:
+            raise RowPatchError("Cell without 'r' attribute")
+        style = _STYLE_RE.search(attrs)
+        cell_type = _TYPE_RE.search(attrs)
+        cell_type = cell_type.group(1) if cell_type else b'n'
+        if _FORMULA_RE.search(body):
+            raise RowPatchError(f"Cell {ref.group(0).decode()} holds a formula")
+
+        if cell_type == b'inlineStr':
+            body = _PHONETIC_RE.sub(b'', body)
+            runs = _RUN_RE.findall(body)
+            if runs:
+                value = tuple(
+                    (
+                        html.unescape(b''.join(_TEXT_RE.findall(run)).decode('utf-8')),
+                        color.group(1).decode() if (color := _COLOR_RGB_RE.search(run)) else None,
+                    )
+                    for _, run in runs
+                )
+            else:
+                value = html.unescape(b''.join(_TEXT_RE.findall(body)).decode('utf-8'))
+        elif cell_type == b'n':
+            number = _VALUE_RE.search(body)
+            value = float(number.group(1)) if number else None
+        else:
+            raise RowPatchError(f"Unsupported cell type '{cell_type.decode()}'")
+
+        cells.append((column_index_from_string(ref.group(1).decode()), int(style.group(1)) if style else 0, value))
+    return cells
+
+
+def renumber_row(row_xml, row_number):
+    """Return the <row> element with its row number and cell references set to row_number"""
+    suffix = str(row_number).encode() + b'"'
+    return _ROW_REF_RE.sub(lambda match: match.group(1) + suffix, row_xml)
+
+
+def remap_cell_styles(row_xml, mapping):
+    """
+    Return the <row> element with cell style indices replaced
+
+    Parameters:
+    -----------
+    mapping : dict
+        Style index -> new style index (cells without 's' have index 0)
+    """
+    def remap(match):
+        tag = match.group(0)
+        style = _STYLE_RE.search(tag)
+        old = int(style.group(1)) if style else 0
+        if old not in mapping:
+            raise RowPatchError(f"No target cell format for style {old}")
+        new = str(mapping[old]).encode()
+        if style:
+            return tag[:style.start(1)] + new + tag[style.end(1):]
+        if mapping[old] == 0:
+            return tag
+        end = len(tag) - (2 if tag.endswith(b'/>') else 1)
+        return tag[:end] + b' s="' + new + b'"' + tag[end:]
+
+    return _CELL_TAG_RE.sub(remap, row_xml)
+
+
+class XlsxRowPatcher:
+    """
+    Read worksheets of an XLSX file as row XML and write a copy with new rows
+
+    The workbook is opened once and parts are read on demand; use as a
+    context manager. Rows are kept as their original XML, so rows passed
+    back to write() unchanged are written byte for byte.
+    """
+
+    def __init__(self, xlsx_path, sheet_names):
+        """
+        Parameters:
+        -----------
+        xlsx_path : str or file
+            Source workbook
+        sheet_names : list
+            Worksheets to read or patch
+        """
+        self.xlsx_path = xlsx_path
+        self._zip = zipfile.ZipFile(xlsx_path)
+        try:
+            self.sheet_parts = {}
+            workbook = ET.fromstring(self._zip.read('xl/workbook.xml'))
+            rel_ids = {
+                sheet.get('name'): sheet.get(f'{{{DOC_REL_NS}}}id')
+                for sheet in workbook.iter(f'{{{MAIN_NS}}}sheet')
+            }
+            rels = ET.fromstring(self._zip.read('xl/_rels/workbook.xml.rels'))
+            targets = {
+                rel.get('Id'): _part_path('xl', rel.get('Target', ''))
+                for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship')
+            }
+            for name in sheet_names:
+                if name not in rel_ids:
+                    raise KeyError(f"Worksheet {name} does not exist.")
+                if rel_ids[name] not in targets:
+                    raise RowPatchError(f"Relationship {rel_ids[name]} for worksheet '{name}' not found")
+                self.sheet_parts[name] = targets[rel_ids[name]]
+            self.styles_part = _related_part(self._zip, 'xl/_rels/workbook.xml.rels', 'xl', '/styles')
+            self.custom_part = _related_part(self._zip, '_rels/.rels', '', '/custom-properties')
+        except Exception:
+            self._zip.close()
+            raise
+        self._sheet_xml = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def custom_properties(self):
+        """Custom document properties as name -> text (empty without the part)"""
+        if self.custom_part is None:
+            return {}
+        root = ET.fromstring(self._zip.read(self.custom_part))
+        return {prop.get('name'): (prop[0].text or '') if len(prop) else '' for prop in root}
+
+    def cell_formats(self):
+        """(Font, PatternFill) of every cell format, indexed like the cells' 's' attribute"""
+        if self.styles_part is None:
+            raise RowPatchError("Workbook has no styles part")
+        stylesheet = Stylesheet.from_tree(fromstring(self._zip.read(self.styles_part)))
+        return [
+            (stylesheet.fonts[xf.fontId or 0], stylesheet.fills[xf.fillId or 0])
+            for xf in stylesheet.cell_styles
+        ]
+
+    def _sheet(self, sheet_name):
+        """Worksheet XML and the (start, end) of its sheetData content (None for <sheetData/>)"""
+        if sheet_name not in self._sheet_xml:
+            sheet_xml = self._zip.read(self.sheet_parts[sheet_name])
+            match = _SHEET_DATA_RE.search(sheet_xml)
+            if not match or sheet_xml.startswith((b'\xff\xfe', b'\xfe\xff')):
+                raise RowPatchError(f"Unsupported sheetData in worksheet '{sheet_name}'")
+            if match.group('empty'):
+                self._sheet_xml[sheet_name] = (sheet_xml, None, None)
+            else:
+                end = sheet_xml.index(b'</' + match.group('p') + b'sheetData>', match.end())
+                self._sheet_xml[sheet_name] = (sheet_xml, match.end(), end)
+        return self._sheet_xml[sheet_name]
+
+    def rows(self, sheet_name):
+        """
+        <row> elements of a worksheet
+
+        Returns:
+        --------
+        list : row XML (bytes); element i is Excel row i + 1
+        """
+        sheet_xml, start, end = self._sheet(sheet_name)
+        if start is None:
+            return []
+        rows = []
+        for match in _ROW_RE.finditer(sheet_xml, start, end):
+            row_number = _ROW_NUM_RE.search(match.group('attrs'))
+            if not row_number or int(row_number.group(1)) != len(rows) + 1:
+                raise RowPatchError(f"Rows of worksheet '{sheet_name}' are not numbered 1, 2, 3, ...")
+            rows.append(match.group(0))
+        return rows
+
+    def sheet_crc(self, sheet_name):
+        """CRC-32 of the worksheet XML, from the zip directory (no decompression)"""
+        return self._zip.getinfo(self.sheet_parts[sheet_name]).CRC
+
+    def build_sheet(self, sheet_name, rows):
+        """
+        Worksheet XML with new rows
+
+        Parameters:
+        -----------
+        rows : list
+            <row> elements numbered 1, 2, 3, ...
+
+        Returns:
+        --------
+        bytes : worksheet XML (pass to write)
+        """
+        sheet_xml, start, end = self._sheet(sheet_name)
+        if start is None:
+            raise RowPatchError(f"Worksheet '{sheet_name}' has no rows")
+        head = _DIMENSION_RE.sub(lambda m: m.group(1) + str(len(rows)).encode() + b'"', sheet_xml[:start], count=1)
+        return head + b''.join(rows) + sheet_xml[end:]
+
+    def write(self, output_path, sheets, custom_properties=None):
+        """
+        Write a copy of the workbook with new worksheets, then close
+
+        Parameters:
+        -----------
+        output_path : str
+            Destination workbook (may be the source file)
+        sheets : dict
+            Worksheet name -> XML from build_sheet (worksheets not given are
+            copied unchanged)
+        custom_properties : dict, optional
+            New values of existing custom document properties
+        """
+        parts = {self.sheet_parts[name]: sheet_xml for name, sheet_xml in sheets.items()}
+
+        if custom_properties:
+            custom_xml = self._zip.read(self.custom_part) if self.custom_part else b''
+            for name, value in custom_properties.items():
+                pattern = re.compile(
+                    rb'(<(?:\w+:)?property\b[^>]*?\bname="' + re.escape(escape(name).encode('utf-8'))
+                    + rb'"[^>]*>\s*<(?P<t>(?:\w+:)?lpwstr)>).*?(</(?P=t)>)', re.S
+                )
+                custom_xml, found = pattern.subn(
+                    lambda m: m.group(1) + escape(value).encode('utf-8') + m.group(3), custom_xml, count=1
+                )
+                if not found:
+                    raise RowPatchError(f"Custom property '{name}' not found")
+            parts[self.custom_part] = custom_xml
+
+        self.close()
+        write_patched_parts(self.xlsx_path, output_path, parts)